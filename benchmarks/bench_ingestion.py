@@ -0,0 +1,268 @@
+"""
+Ingestion throughput benchmark, stage by stage.
+
+Replicates the PDFs in data/test_docs to the requested volume and runs them through the
+stages of pipeline ingestion one after the other:
+  load    Pipeline.load_documents_async (SimpleDirectoryReader parsing)
+  split   SentenceSplitter
+  embed   the embedding model
+  upsert  BulkUpsertEngine into Qdrant, with the chunks already embedded
+For each stage it reports documents/s, chunks/s, bytes/s (file bytes for load, text bytes
+after) and the peak resident memory of the process and its workers while the stage ran.
+
+Every run is repeated per --workers value: 1 is the serial baseline, N loads and splits
+in N worker processes, embeds N batches concurrently and upserts over N streams.
+
+Embeddings and sparse vectors are feature-hashed (benchmarks/synthetic.py) unless
+--embed-model names a HuggingFace model; use a real model to measure the embed stage.
+The parsed-document cache is off unless --document-cache, replicas are identical files.
+
+Usage:
+    python -m benchmarks.bench_ingestion
+    python -m benchmarks.bench_ingestion --replicas 20 --workers 1 2 4 8 --embed-model BAAI/bge-small-en-v1.5
+"""
+import argparse
+import asyncio
+import json
+import os
+import shutil
+import tempfile
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from copy import deepcopy
+from typing import List
+
+import psutil
+from llama_index.core import Settings
+from llama_index.core.node_parser import SentenceSplitter
+from llama_index.core.schema import MetadataMode
+
+from benchmarks.synthetic import HashEmbedding, hash_sparse_vectors
+from llamasearch.bulk_indexer import BulkUpsertEngine
+from llamasearch.pipeline import ALLOWED_EXTS, Pipeline
+from llamasearch.qdrant_hybrid_search import QdrantHybridSearch
+from llamasearch.settings import config
+
+TEST_DOCS = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data", "test_docs")
+
+class PeakRSS:
+    """Samples the resident memory of this process and its children while the block runs."""
+    def __init__(self, interval: float = 0.05):
+        self.interval = interval
+        self.peak = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _rss(self) -> int:
+        process = psutil.Process()
+        rss = process.memory_info().rss
+        for child in process.children(recursive=True):
+            try:
+                rss += child.memory_info().rss
+            except psutil.NoSuchProcess:
+                pass
+        return rss
+
+    def _run(self):
+        while not self._stop.is_set():
+            self.peak = max(self.peak, self._rss())
+            self._stop.wait(self.interval)
+
+    def __enter__(self):
+        self.peak = self._rss()
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._stop.set()
+        self._thread.join()
+        self.peak = max(self.peak, self._rss())
+        return False
+
+class PreEmbeddedUpsertEngine(BulkUpsertEngine):
+    """BulkUpsertEngine for nodes that already carry their embedding, so only upserts are timed."""
+    async def _embed(self, batch):
+        return {node.node_id: node.embedding for node in batch}
+
+def replicate(source_dir: str, target_dir: str, replicas: int) -> List[str]:
+    sources = sorted(
+        os.path.join(source_dir, name) for name in os.listdir(source_dir)
+        if os.path.splitext(name)[1].lower() in ALLOWED_EXTS
+    )
+    paths = []
+    for replica in range(replicas):
+        for source in sources:
+            name, ext = os.path.splitext(os.path.basename(source))
+            path = os.path.join(target_dir, f"{name}-{replica}{ext}")
+            try:
+                os.link(source, path)
+            except OSError:
+                shutil.copyfile(source, path)
+            paths.append(path)
+    return paths
+
+def shards(items: list, count: int) -> List[list]:
+    return [items[i::count] for i in range(count) if items[i::count]]
+
+def stage_report(seconds: float, documents: int, chunks: int, size: int, peak_rss: int, **extra) -> dict:
+    return {
+        "seconds": round(seconds, 3),
+        **extra,
+        "documents": documents,
+        "chunks": chunks,
+        "bytes": size,
+        "documents_per_second": round(documents / seconds, 2) if seconds else None,
+        "chunks_per_second": round(chunks / seconds, 2) if seconds and chunks else None,
+        "bytes_per_second": round(size / seconds, 1) if seconds else None,
+        "peak_rss_mb": round(peak_rss / 2 ** 20, 1),
+    }
+
+def _load_shard(bench_config, files: List[str]):
+    # Runs in a worker process
+    pipeline = Pipeline(bench_config, "bench", None)
+    return asyncio.run(pipeline.load_documents_async(input_files=files))
+
+def _split_shard(documents, chunk_size: int, chunk_overlap: int):
+    return SentenceSplitter(chunk_size=chunk_size, chunk_overlap=chunk_overlap).get_nodes_from_documents(documents)
+
+def _text_bytes(items) -> int:
+    return sum(len(item.get_content(metadata_mode=MetadataMode.NONE).encode("utf-8")) for item in items)
+
+async def run_config(workers: int, files: List[str], args, embed_model) -> dict:
+    bench_config = deepcopy(config)
+    bench_config.cache.enable_document_cache = args.document_cache
+    bench_config.cache.enable_embedding_cache = False
+    bench_config.vector_store_config.multi_tenancy = False
+    bench_config.vector_store_config.upsert_parallelism = workers
+    bench_config.vector_store_config.collection_name = f"bench_ingestion_{workers}_{int(time.time())}"
+    bench_config.vector_store_config.vector_size = len(embed_model.get_text_embedding("dimension probe"))
+    if args.qdrant_url:
+        bench_config.qdrant_client_config.url = args.qdrant_url
+        bench_config.qdrant_client_config.location = None
+    else:
+        bench_config.qdrant_client_config.location = ":memory:"
+
+    stages = {}
+    loop = asyncio.get_running_loop()
+    executor = ProcessPoolExecutor(max_workers=workers) if workers > 1 else None
+    try:
+        file_bytes = sum(os.path.getsize(path) for path in files)
+        with PeakRSS() as rss:
+            start = time.perf_counter()
+            if executor is None:
+                documents = await Pipeline(bench_config, "bench", embed_model).load_documents_async(input_files=files)
+            else:
+                loaded = await asyncio.gather(*(
+                    loop.run_in_executor(executor, _load_shard, bench_config, shard) for shard in shards(files, workers)
+                ))
+                documents = [document for shard in loaded for document in shard]
+            seconds = time.perf_counter() - start
+        stages["load"] = stage_report(seconds, len(documents), 0, file_bytes, rss.peak, files=len(files))
+
+        document_bytes = _text_bytes(documents)
+        with PeakRSS() as rss:
+            start = time.perf_counter()
+            if executor is None:
+                nodes = _split_shard(documents, args.chunk_size, args.chunk_overlap)
+            else:
+                split = await asyncio.gather(*(
+                    loop.run_in_executor(executor, _split_shard, shard, args.chunk_size, args.chunk_overlap)
+                    for shard in shards(documents, workers)
+                ))
+                nodes = [node for shard in split for node in shard]
+            seconds = time.perf_counter() - start
+        stages["split"] = stage_report(seconds, len(documents), len(nodes), document_bytes, rss.peak)
+    finally:
+        if executor is not None:
+            executor.shutdown()
+
+    chunk_bytes = _text_bytes(nodes)
+    texts = [node.get_content(metadata_mode=MetadataMode.EMBED) for node in nodes]
+    batches = [texts[i:i + args.embed_batch_size] for i in range(0, len(texts), args.embed_batch_size)]
+    semaphore = asyncio.Semaphore(workers)
+
+    async def embed_batch(batch):
+        async with semaphore:
+            return await asyncio.to_thread(embed_model.get_text_embedding_batch, batch)
+
+    with PeakRSS() as rss:
+        start = time.perf_counter()
+        embedded = await asyncio.gather(*(embed_batch(batch) for batch in batches))
+        seconds = time.perf_counter() - start
+    for node, embedding in zip(nodes, (embedding for batch in embedded for embedding in batch)):
+        node.embedding = embedding
+    stages["embed"] = stage_report(seconds, len(documents), len(nodes), chunk_bytes, rss.peak)
+
+    sparse_fn = hash_sparse_vectors if args.sparse == "hash" else None
+    search = QdrantHybridSearch(bench_config, sparse_doc_fn=sparse_fn, sparse_query_fn=sparse_fn)
+    try:
+        await search.setup_index_async()
+        await search.create_index_async()
+        engine = PreEmbeddedUpsertEngine(search.index, search.vector_store, search.aclient, bench_config.vector_store_config)
+        with PeakRSS() as rss:
+            start = time.perf_counter()
+            await engine.run(nodes)
+            seconds = time.perf_counter() - start
+        # A throughput figure only means something if every chunk landed
+        points = (await search.aclient.count(bench_config.vector_store_config.collection_name, exact=True)).count
+        if points != len(nodes):
+            raise RuntimeError(f"Upsert stage wrote {points} points for {len(nodes)} chunks")
+        stages["upsert"] = stage_report(seconds, len(documents), len(nodes), chunk_bytes, rss.peak, points=points)
+    finally:
+        if args.qdrant_url and search._aclient is not None:
+            await search.aclient.delete_collection(bench_config.vector_store_config.collection_name)
+        await search.cleanup()
+
+    seconds = sum(stage["seconds"] for stage in stages.values())
+    return {
+        "workers": workers,
+        "stages": stages,
+        "total": {
+            "seconds": round(seconds, 3),
+            "files_per_second": round(len(files) / seconds, 2),
+            "chunks_per_second": round(len(nodes) / seconds, 2),
+            "bytes_per_second": round(file_bytes / seconds, 1),
+            "peak_rss_mb": max(stage["peak_rss_mb"] for stage in stages.values()),
+        },
+    }
+
+async def main(args):
+    if args.embed_model == "hash":
+        embed_model = HashEmbedding(dim=args.embedding_dim)
+    else:
+        from llama_index.embeddings.huggingface import HuggingFaceEmbedding
+        embed_model = HuggingFaceEmbedding(model_name=args.embed_model, cache_folder=config.embedding.local_model_path)
+    Settings.embed_model = embed_model
+
+    workdir = tempfile.mkdtemp(prefix="llamasearch-ingestion-")
+    try:
+        files = replicate(args.source_dir, workdir, args.replicas)
+        report = {
+            "files": len(files),
+            "replicas": args.replicas,
+            "embed_model": args.embed_model,
+            "qdrant": args.qdrant_url or "local :memory:",
+            "results": [await run_config(workers, files, args, embed_model) for workers in args.workers],
+        }
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+    print(json.dumps(report, indent=2))
+    return report
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark ingestion throughput per stage, serial vs parallel.")
+    parser.add_argument("--source-dir", default=TEST_DOCS)
+    parser.add_argument("--replicas", type=int, default=5, help="Copies of each source file.")
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 4], help="Configurations to compare, 1 is serial.")
+    parser.add_argument("--chunk-size", type=int, default=1024, help="SentenceSplitter chunk size, the pipeline default.")
+    parser.add_argument("--chunk-overlap", type=int, default=200)
+    parser.add_argument("--embed-batch-size", type=int, default=32)
+    parser.add_argument("--embed-model", default="hash",
+                        help='"hash" for the feature-hashed embedding, or a HuggingFace model such as BAAI/bge-small-en-v1.5.')
+    parser.add_argument("--embedding-dim", type=int, default=384, help="Dimension of the hash embedding.")
+    parser.add_argument("--sparse", choices=["hash", "model"], default="hash",
+                        help="Hashed term frequencies, or llama-index's default sparse model (downloaded).")
+    parser.add_argument("--document-cache", action="store_true", help="Reuse parsed documents of identical files.")
+    parser.add_argument("--qdrant-url", default=None, help="Upsert into a Qdrant server instead of in-process Qdrant.")
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,238 @@
+"""
+Retrieval benchmark for QdrantHybridSearch over synthetic corpora.
+
+For each corpus size, generates chunks of made-up text, indexes them through
+QdrantHybridSearch (the same bulk upsert path the pipeline uses) and runs a query set
+where every query is a handful of words taken from one known chunk. Reports:
+  - build time and points/s,
+  - dense, sparse and hybrid query latency through QdrantVectorStore.aquery,
+  - the cost of relative_score_fusion on its own,
+  - recall@k of the dense search against brute-force exact search over the same
+    embeddings (what HNSW and quantization settings trade away),
+  - hit rate@k: how often the source chunk of the query is returned, per mode and per
+    alpha. relative_score_fusion scales the dense and the sparse scores by the same
+    alpha, so alpha does not change the hybrid ordering; the sweep shows that and the
+    fusion cost.
+
+Embeddings and sparse vectors are feature-hashed (benchmarks/synthetic.py) unless
+--embed-model names a HuggingFace model. Qdrant runs in-process by default; local mode
+searches exhaustively, so HNSW and quantization settings only take effect with
+--qdrant-url pointing at a server.
+
+Usage:
+    python -m benchmarks.bench_retrieval
+    python -m benchmarks.bench_retrieval --sizes 10000 100000 1000000 --queries 500
+    python -m benchmarks.bench_retrieval --qdrant-url http://localhost:6333 --hnsw-m 16 --hnsw-ef 32 64 128 --quantization int8
+"""
+import argparse
+import asyncio
+import json
+import random
+import time
+import uuid
+from copy import deepcopy
+from typing import List, Optional
+
+import numpy as np
+from llama_index.core import Settings
+from llama_index.core.schema import TextNode
+from llama_index.core.vector_stores.types import VectorStoreQuery, VectorStoreQueryMode
+from qdrant_client import models
+
+from benchmarks.report import percentiles
+from benchmarks.synthetic import HashEmbedding, hash_sparse_vectors, make_vocabulary, synthetic_text
+from llamasearch.qdrant_hybrid_search import QdrantHybridSearch
+from llamasearch.settings import config
+
+def bench_config(args, collection_name: str, dim: int):
+    bench = deepcopy(config)
+    if args.qdrant_url:
+        bench.qdrant_client_config.url = args.qdrant_url
+        bench.qdrant_client_config.location = None
+    else:
+        bench.qdrant_client_config.location = ":memory:"
+    bench.vector_store_config.collection_name = collection_name
+    bench.vector_store_config.vector_size = dim
+    bench.vector_store_config.multi_tenancy = False
+    bench.vector_store_config.top_k = args.top_k
+    # Embeddings are cheap here and the cache needs Redis
+    bench.cache.enable_embedding_cache = False
+    return bench
+
+def exact_top_k(embeddings: np.ndarray, queries: np.ndarray, k: int, batch_size: int = 256) -> np.ndarray:
+    """Indices of the k most cosine-similar rows of embeddings for each query."""
+    embeddings = embeddings / np.maximum(np.linalg.norm(embeddings, axis=1, keepdims=True), 1e-12)
+    queries = queries / np.maximum(np.linalg.norm(queries, axis=1, keepdims=True), 1e-12)
+    result = []
+    for start in range(0, len(queries), batch_size):
+        scores = queries[start:start + batch_size] @ embeddings.T
+        top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+        result.append(top)
+    return np.concatenate(result)
+
+async def timed_queries(vector_store, query_texts, query_embeddings, mode, k: int, alpha: Optional[float] = None):
+    latencies, results = [], []
+    for text, embedding in zip(query_texts, query_embeddings):
+        query = VectorStoreQuery(
+            query_embedding=embedding, query_str=text, similarity_top_k=k, sparse_top_k=k,
+            hybrid_top_k=k, mode=mode, alpha=alpha,
+        )
+        start = time.perf_counter()
+        results.append(await vector_store.aquery(query))
+        latencies.append(time.perf_counter() - start)
+    return latencies, results
+
+def hit_rate(results, targets: List[str]) -> float:
+    return round(sum(target in (result.ids or []) for result, target in zip(results, targets)) / len(targets), 4)
+
+def recall(results, truth: List[set], k: int) -> float:
+    return round(sum(len(set(result.ids or []) & expected) for result, expected in zip(results, truth)) / (k * len(truth)), 4)
+
+async def tune_collection(search: QdrantHybridSearch, args):
+    """Applies HNSW and quantization settings before indexing, server mode only."""
+    if not args.qdrant_url or not (args.hnsw_m or args.hnsw_ef_construct or args.quantization):
+        return
+    quantization = None
+    if args.quantization == "int8":
+        quantization = models.ScalarQuantization(
+            scalar=models.ScalarQuantizationConfig(type=models.ScalarType.INT8, always_ram=True)
+        )
+    elif args.quantization == "binary":
+        quantization = models.BinaryQuantization(binary=models.BinaryQuantizationConfig(always_ram=True))
+    await search.aclient.update_collection(
+        collection_name=search.vectordb_config.collection_name,
+        hnsw_config=models.HnswConfigDiff(m=args.hnsw_m, ef_construct=args.hnsw_ef_construct),
+        quantization_config=quantization,
+    )
+
+async def ef_sweep(search: QdrantHybridSearch, query_embeddings, truth_ids: List[set], k: int, ef_values: List[int]) -> list:
+    """Dense search straight through the client, which exposes hnsw_ef and quantization rescoring."""
+    sweep = []
+    for ef in ef_values:
+        params = models.SearchParams(hnsw_ef=ef, quantization=models.QuantizationSearchParams(rescore=True))
+        latencies, found = [], 0
+        for embedding, expected in zip(query_embeddings, truth_ids):
+            start = time.perf_counter()
+            response = await search.aclient.query_points(
+                collection_name=search.vectordb_config.collection_name, query=embedding,
+                using="text-dense", limit=k, search_params=params, with_payload=False,
+            )
+            latencies.append(time.perf_counter() - start)
+            found += len({str(point.id) for point in response.points} & expected)
+        sweep.append({"hnsw_ef": ef, "latency_ms": percentiles(latencies), f"recall@{k}": round(found / (k * len(truth_ids)), 4)})
+    return sweep
+
+async def bench_corpus(size: int, args, embed_model) -> dict:
+    rng = random.Random(size)
+    vocabulary = make_vocabulary(args.vocabulary_size)
+    nodes = [TextNode(id_=str(uuid.uuid4()), text=synthetic_text(rng, vocabulary, args.chunk_words)) for _ in range(size)]
+
+    dim = len(embed_model.get_text_embedding("dimension probe"))
+    collection_name = f"bench_{size}_{uuid.uuid4().hex[:8]}"
+    sparse_fn = hash_sparse_vectors if args.sparse == "hash" else None
+    search = QdrantHybridSearch(bench_config(args, collection_name, dim), sparse_doc_fn=sparse_fn, sparse_query_fn=sparse_fn)
+    report = {"chunks": size, "embedding_dim": dim}
+    try:
+        await search.setup_index_async()
+        await tune_collection(search, args)
+        await search.create_index_async()
+        start = time.perf_counter()
+        await search.add_nodes_to_index_async(nodes)
+        build_seconds = time.perf_counter() - start
+        report["build_seconds"] = round(build_seconds, 3)
+        report["points_per_second"] = round(size / build_seconds, 1)
+
+        # Each query is a few words of a known chunk, that chunk should come back
+        targets = [rng.randrange(size) for _ in range(args.queries)]
+        query_texts = []
+        for target in targets:
+            words = nodes[target].text.replace(".", "").split()
+            query_texts.append(" ".join(rng.sample(words, min(args.query_words, len(words)))))
+        query_embeddings = [embed_model.get_query_embedding(text) for text in query_texts]
+        target_ids = [nodes[target].node_id for target in targets]
+
+        k = args.top_k
+        matrix = np.asarray([node.embedding for node in nodes], dtype=np.float32)
+        exact = exact_top_k(matrix, np.asarray(query_embeddings, dtype=np.float32), k)
+        truth_ids = [{nodes[i].node_id for i in row} for row in exact]
+        del matrix
+
+        vector_store = search.vector_store
+        dense_latencies, dense_results = await timed_queries(vector_store, query_texts, query_embeddings, VectorStoreQueryMode.DEFAULT, k)
+        sparse_latencies, sparse_results = await timed_queries(vector_store, query_texts, query_embeddings, VectorStoreQueryMode.SPARSE, k)
+        report["dense"] = {"latency_ms": percentiles(dense_latencies), f"recall@{k}": recall(dense_results, truth_ids, k),
+                           f"hit_rate@{k}": hit_rate(dense_results, target_ids)}
+        report["sparse"] = {"latency_ms": percentiles(sparse_latencies), f"hit_rate@{k}": hit_rate(sparse_results, target_ids)}
+
+        report["hybrid"] = []
+        for alpha in args.alphas:
+            latencies, results = await timed_queries(vector_store, query_texts, query_embeddings, VectorStoreQueryMode.HYBRID, k, alpha)
+            fusion = []
+            for dense, sparse in zip(dense_results, sparse_results):
+                start = time.perf_counter()
+                search.relative_score_fusion(dense, sparse, alpha=alpha, top_k=k)
+                fusion.append(time.perf_counter() - start)
+            report["hybrid"].append({
+                "alpha": alpha,
+                "latency_ms": percentiles(latencies),
+                "fusion_ms": percentiles(fusion),
+                f"hit_rate@{k}": hit_rate(results, target_ids),
+            })
+
+        if args.hnsw_ef:
+            if args.qdrant_url:
+                report["hnsw_ef_sweep"] = await ef_sweep(search, query_embeddings, truth_ids, k, args.hnsw_ef)
+            else:
+                report["hnsw_ef_sweep"] = "skipped: local mode searches exhaustively"
+    finally:
+        if search._aclient is not None:
+            if args.qdrant_url:
+                await search.aclient.delete_collection(collection_name)
+            await search.cleanup()
+    return report
+
+async def main(args):
+    if args.embed_model == "hash":
+        embed_model = HashEmbedding(dim=args.embedding_dim)
+    else:
+        from llama_index.embeddings.huggingface import HuggingFaceEmbedding
+        embed_model = HuggingFaceEmbedding(model_name=args.embed_model, cache_folder=config.embedding.local_model_path)
+    # QdrantHybridSearch builds its index with the global embedding model, as the pipeline does
+    Settings.embed_model = embed_model
+
+    report = {
+        "qdrant": args.qdrant_url or "local :memory:",
+        "embed_model": args.embed_model,
+        "sparse": args.sparse,
+        "top_k": args.top_k,
+        "queries": args.queries,
+        "hnsw_m": args.hnsw_m,
+        "hnsw_ef_construct": args.hnsw_ef_construct,
+        "quantization": args.quantization,
+        "results": [],
+    }
+    for size in args.sizes:
+        report["results"].append(await bench_corpus(size, args, embed_model))
+    print(json.dumps(report, indent=2))
+    return report
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark QdrantHybridSearch build time, query latency and recall.")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10_000], help="Corpus sizes in chunks.")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--top-k", type=int, default=10)
+    parser.add_argument("--alphas", type=float, nargs="+", default=[0.2, 0.4, 0.6, 0.8])
+    parser.add_argument("--chunk-words", type=int, default=60)
+    parser.add_argument("--query-words", type=int, default=6)
+    parser.add_argument("--vocabulary-size", type=int, default=20_000)
+    parser.add_argument("--embed-model", default="hash",
+                        help='"hash" for the feature-hashed embedding, or a HuggingFace model such as BAAI/bge-small-en-v1.5.')
+    parser.add_argument("--embedding-dim", type=int, default=384, help="Dimension of the hash embedding.")
+    parser.add_argument("--sparse", choices=["hash", "model"], default="hash",
+                        help="Hashed term frequencies, or llama-index's default sparse model (downloaded).")
+    parser.add_argument("--qdrant-url", default=None, help="Benchmark a Qdrant server instead of in-process Qdrant.")
+    parser.add_argument("--hnsw-m", type=int, default=None)
+    parser.add_argument("--hnsw-ef-construct", type=int, default=None)
+    parser.add_argument("--hnsw-ef", type=int, nargs="+", default=None, help="Search-time ef values to sweep (server only).")
+    parser.add_argument("--quantization", choices=["int8", "binary"], default=None)
+    asyncio.run(main(parser.parse_args()))
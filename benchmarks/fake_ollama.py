@@ -0,0 +1,108 @@
+"""
+Stand-in for an Ollama server, for load tests without a GPU.
+
+Answers /api/chat and /api/generate (streamed NDJSON or a single JSON body) with
+synthetic tokens at a fixed rate after a fixed prompt-processing delay, so the time to
+first token and the generation throughput of the "model" are known and configurable.
+
+Usage:
+    python -m benchmarks.fake_ollama --port 11435 --ttft-ms 200 --tokens-per-second 40
+    OLLAMA_SERVER_URL=http://localhost:11435 uvicorn llamasearch.api.main:app
+"""
+import argparse
+import asyncio
+import json
+import time
+from datetime import datetime, timezone
+
+import uvicorn
+from starlette.applications import Starlette
+from starlette.requests import Request
+from starlette.responses import JSONResponse, StreamingResponse
+from starlette.routing import Route
+
+WORDS = (
+    "the", "context", "states", "that", "this", "document", "describes", "a", "method", "for",
+    "retrieval", "with", "results", "reported", "in", "section", "and", "table", "of", "answer",
+)
+
+def _now() -> str:
+    return datetime.now(timezone.utc).isoformat()
+
+def create_app(ttft: float = 0.2, tokens_per_second: float = 40.0, num_tokens: int = 64) -> Starlette:
+    """ttft in seconds before the first token, then num_tokens at tokens_per_second."""
+    interval = 1.0 / tokens_per_second if tokens_per_second > 0 else 0.0
+
+    async def tokens(limit: int):
+        await asyncio.sleep(ttft)
+        for i in range(limit):
+            if i and interval:
+                await asyncio.sleep(interval)
+            yield WORDS[i % len(WORDS)] + " "
+
+    def final(body: dict, started: float, count: int) -> dict:
+        duration = int((time.perf_counter() - started) * 1e9)
+        return {
+            "model": body.get("model", "fake"),
+            "created_at": _now(),
+            "done": True,
+            "done_reason": "stop",
+            "total_duration": duration,
+            "load_duration": 0,
+            "prompt_eval_count": 0,
+            "prompt_eval_duration": int(ttft * 1e9),
+            "eval_count": count,
+            "eval_duration": max(duration - int(ttft * 1e9), 0),
+        }
+
+    def handler(content_key: str):
+        def content(text: str) -> dict:
+            if content_key == "message":
+                return {"message": {"role": "assistant", "content": text}}
+            return {"response": text}
+
+        async def endpoint(request: Request):
+            body = await request.json()
+            started = time.perf_counter()
+            limit = min(num_tokens, (body.get("options") or {}).get("num_predict") or num_tokens)
+            if limit < 0:
+                limit = num_tokens
+
+            if not body.get("stream", True):
+                text = "".join([token async for token in tokens(limit)])
+                return JSONResponse({**final(body, started, limit), **content(text)})
+
+            async def stream():
+                async for token in tokens(limit):
+                    line = {"model": body.get("model", "fake"), "created_at": _now(), "done": False, **content(token)}
+                    yield json.dumps(line) + "\n"
+                yield json.dumps({**final(body, started, limit), **content("")}) + "\n"
+
+            return StreamingResponse(stream(), media_type="application/x-ndjson")
+        return endpoint
+
+    async def tags(request: Request):
+        return JSONResponse({"models": []})
+
+    async def show(request: Request):
+        return JSONResponse({"modelfile": "", "parameters": "", "template": "", "details": {}, "model_info": {}})
+
+    return Starlette(routes=[
+        Route("/api/chat", handler("message"), methods=["POST"]),
+        Route("/api/generate", handler("response"), methods=["POST"]),
+        Route("/api/tags", tags, methods=["GET"]),
+        Route("/api/show", show, methods=["POST"]),
+    ])
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serve a fake Ollama API with a configurable token rate.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=11435)
+    parser.add_argument("--ttft-ms", type=float, default=200, help="Delay before the first token.")
+    parser.add_argument("--tokens-per-second", type=float, default=40)
+    parser.add_argument("--num-tokens", type=int, default=64, help="Tokens per answer, capped by num_predict.")
+    args = parser.parse_args()
+    uvicorn.run(
+        create_app(args.ttft_ms / 1000, args.tokens_per_second, args.num_tokens),
+        host=args.host, port=args.port, log_level="warning"
+    )
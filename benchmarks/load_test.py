@@ -0,0 +1,431 @@
+"""
+Load test for the API server, with every external service replaced by a stand-in.
+
+Boots the real app (llamasearch.api.main) in a subprocess against:
+  - a fake Ollama server with a configurable time to first token and token rate
+    (benchmarks/fake_ollama.py),
+  - Qdrant in-process (qdrant_client_config.location ":memory:"),
+  - fakeredis served over TCP,
+  - a temporary SQLite database,
+  - Firebase auth stubbed with a locally generated signing key, so ID tokens are minted
+    here and verified by the app's own token verifier,
+  - HashEmbedding and hash_sparse_vectors (benchmarks/synthetic.py) instead of the
+    configured embedding model and llama-index's sparse model (--sparse model keeps it).
+
+Each simulated user gets its own uid, a seeded corpus in its upload directory and a
+warm-up query (pipeline creation, reported separately), then issues queries back to back
+for --duration seconds over HTTP (POST /api/v1/query/) and/or the WebSocket (/ws).
+The report, printed as JSON, has throughput, latency percentiles, time to first answer
+chunk (WebSocket only) and the error rate per transport.
+
+The run fails if every warm-up query fails: nothing after it would be measured. Needs the
+benchmark dependencies of requirements.txt (fakeredis with TcpFakeServer, websockets).
+
+Usage:
+    python -m benchmarks.load_test --users 20 --duration 60
+    python -m benchmarks.load_test --mode ws --users 50 --ttft-ms 500 --tokens-per-second 20
+"""
+import argparse
+import asyncio
+import datetime
+import json
+import os
+import random
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import uuid
+from collections import Counter
+from typing import Dict, List, Optional
+
+import httpx
+import websockets
+import yaml
+
+from benchmarks.report import percentiles
+from benchmarks.synthetic import make_vocabulary, synthetic_text
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PROJECT_ID = "llamasearch-load-test"
+KEY_ID = "load-test-key"
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+# ---------------------------------------------------------------------------
+# Firebase stand-in: a self-signed certificate the app trusts, and tokens signed with its key
+
+def create_signing_key():
+    """Returns (private key PEM, self-signed certificate PEM)."""
+    from cryptography import x509
+    from cryptography.hazmat.primitives import hashes, serialization
+    from cryptography.hazmat.primitives.asymmetric import rsa
+    from cryptography.x509.oid import NameOID
+
+    key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    name = x509.Name([x509.NameAttribute(NameOID.COMMON_NAME, PROJECT_ID)])
+    now = datetime.datetime.now(datetime.timezone.utc)
+    cert = (
+        x509.CertificateBuilder()
+        .subject_name(name)
+        .issuer_name(name)
+        .public_key(key.public_key())
+        .serial_number(x509.random_serial_number())
+        .not_valid_before(now - datetime.timedelta(minutes=5))
+        .not_valid_after(now + datetime.timedelta(days=1))
+        .sign(key, hashes.SHA256())
+    )
+    private_pem = key.private_bytes(
+        serialization.Encoding.PEM, serialization.PrivateFormat.TraditionalOpenSSL, serialization.NoEncryption()
+    )
+    return private_pem.decode(), cert.public_bytes(serialization.Encoding.PEM).decode()
+
+def mint_id_token(private_pem: str, uid: str, lifetime: int = 6 * 3600) -> str:
+    """A Firebase-shaped ID token for uid, signed with the stand-in key."""
+    from google.auth import crypt, jwt
+
+    now = int(time.time())
+    claims = {
+        "iss": f"https://securetoken.google.com/{PROJECT_ID}",
+        "aud": PROJECT_ID,
+        "sub": uid,
+        "user_id": uid,
+        "auth_time": now,
+        "iat": now,
+        "exp": now + lifetime,
+        "email": f"{uid}@example.com",
+        "name": uid,
+    }
+    signer = crypt.RSASigner.from_string(private_pem, key_id=KEY_ID)
+    return jwt.encode(signer, claims).decode()
+
+# ---------------------------------------------------------------------------
+# Server side, run in the subprocesses
+
+def run_fake_redis(port: int):
+    from fakeredis import TcpFakeServer
+
+    server = TcpFakeServer(("127.0.0.1", port), server_type="redis")
+    server.serve_forever()
+
+def run_server(workdir: str, port: int, redis_port: int, ollama_url: str, sparse: str):
+    # Read by llamasearch.settings and llamasearch.api.core.config at import
+    os.environ.update({
+        "CONFIG_PATH": os.path.join(workdir, "config.yaml"),
+        "DATABASE_URL": f"sqlite+aiosqlite:///{os.path.join(workdir, 'load_test.db')}",
+        "REDIS_URL": f"redis://127.0.0.1:{redis_port}/0",
+        "OLLAMA_SERVER_URL": ollama_url,
+        "ENABLE_AUTH": "true",
+        "RATE_LIMIT_ENABLED": "false",
+        "LOGLEVEL": os.environ.get("LOGLEVEL", "WARNING"),
+    })
+
+    import firebase_admin
+    import google.auth.credentials
+    from firebase_admin import credentials
+
+    class StubCredential(credentials.Base):
+        def get_credential(self):
+            return google.auth.credentials.AnonymousCredentials()
+
+    # Before the app is imported, so it does not load a service account
+    firebase_admin.initialize_app(StubCredential(), {"projectId": PROJECT_ID})
+
+    import functools
+    import uvicorn
+    from llama_index.core import Settings
+    import llamasearch.pipeline as pipeline_module
+    from llamasearch.qdrant_hybrid_search import QdrantHybridSearch
+    from benchmarks.synthetic import HashEmbedding, hash_sparse_vectors
+
+    def setup_hash_embed_model(config):
+        embed_model = HashEmbedding(dim=config.vector_store_config.vector_size)
+        Settings.embed_model = embed_model
+        return embed_model
+
+    pipeline_module.setup_global_embed_model = setup_hash_embed_model
+    if sparse == "hash":
+        pipeline_module.QdrantHybridSearch = functools.partial(
+            QdrantHybridSearch, sparse_doc_fn=hash_sparse_vectors, sparse_query_fn=hash_sparse_vectors
+        )
+
+    from llamasearch.api.core.firebase_tokens import token_verifier
+    with open(os.path.join(workdir, "signing_cert.pem")) as f:
+        certs = {KEY_ID: f.read()}
+    token_verifier._fetch_certs = lambda: (certs, 86400)
+
+    from llamasearch.api.main import app
+    uvicorn.run(app, host="127.0.0.1", port=port, log_level="warning")
+
+# ---------------------------------------------------------------------------
+# Driver
+
+def write_config(workdir: str, redis_port: int, embedding_dim: int, enable_caches: bool) -> str:
+    with open(os.path.join(REPO_ROOT, "config", "config.dev.yaml")) as f:
+        config = yaml.safe_load(f)
+    config["application"].update(
+        data_path=os.path.join(workdir, "data"),
+        log_dir=os.path.join(workdir, "logs"),
+        enable_prometheus=False,
+    )
+    config["qdrant_client_config"]["location"] = ":memory:"
+    config["redis_config"] = {"host": "127.0.0.1", "port": redis_port}
+    config["vector_store_config"]["vector_size"] = embedding_dim
+    # Unique queries would still hit the semantic answer cache with a bag-of-words embedding
+    config["cache"].update(enable_answer_cache=enable_caches, enable_retrieval_cache=enable_caches)
+    config["tracing"]["enable"] = False
+    config["llm"]["modelfile"] = os.path.join(REPO_ROOT, config["llm"]["modelfile"])
+    path = os.path.join(workdir, "config.yaml")
+    with open(path, "w") as f:
+        yaml.safe_dump(config, f)
+    return path
+
+def seed_corpora(workdir: str, uids: List[str], docs_per_user: int, vocabulary: List[str]) -> List[str]:
+    """Writes a CSV corpus per user, returns query texts drawn from the same vocabulary."""
+    rng = random.Random(0)
+    upload_dir = os.path.join(workdir, "data", "uploads")
+    for uid in uids:
+        os.makedirs(os.path.join(upload_dir, uid), exist_ok=True)
+        with open(os.path.join(upload_dir, uid, "corpus.csv"), "w") as f:
+            f.write("id,text\n")
+            for i in range(docs_per_user):
+                f.write(f'{i},"{synthetic_text(rng, vocabulary, 120)}"\n')
+    return [synthetic_text(rng, vocabulary, 10).rstrip(".") + "?" for _ in range(200)]
+
+def start(*args: str, log_path: str) -> subprocess.Popen:
+    log = open(log_path, "w")
+    return subprocess.Popen([sys.executable, "-m", "benchmarks.load_test", *args], cwd=REPO_ROOT, stdout=log, stderr=subprocess.STDOUT)
+
+def wait_for(url: str, processes: List[subprocess.Popen], timeout: float):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        for process in processes:
+            if process.poll() is not None:
+                raise RuntimeError(f"{process.args} exited with {process.returncode}")
+        try:
+            if httpx.get(url, timeout=2).status_code < 500:
+                return
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.5)
+    raise TimeoutError(f"{url} did not come up within {timeout}s")
+
+class Stats:
+    def __init__(self):
+        self.latencies: List[float] = []
+        self.ttfts: List[float] = []
+        self.errors = Counter()
+
+    def record(self, latency: float, error: Optional[str] = None, ttft: Optional[float] = None):
+        if error:
+            self.errors[error[:120]] += 1
+            return
+        self.latencies.append(latency)
+        if ttft is not None:
+            self.ttfts.append(ttft)
+
+    def report(self, elapsed: float) -> dict:
+        errors = sum(self.errors.values())
+        total = len(self.latencies) + errors
+        return {
+            "requests": total,
+            "errors": errors,
+            "error_rate": round(errors / total, 4) if total else None,
+            "qps": round(len(self.latencies) / elapsed, 2) if elapsed else None,
+            "latency_ms": percentiles(self.latencies),
+            "ttft_ms": percentiles(self.ttfts),
+            "top_errors": dict(self.errors.most_common(5)),
+        }
+
+async def http_query(client: httpx.AsyncClient, token: str, query: str) -> Optional[str]:
+    """Returns an error description, None on success."""
+    try:
+        response = await client.post("/api/v1/query/", data={"query": query}, headers={"Authorization": f"Bearer {token}"})
+    except httpx.HTTPError as e:
+        return f"{type(e).__name__}: {e}"
+    if response.status_code != 200:
+        return f"HTTP {response.status_code}: {response.text[:80]}"
+    return None
+
+class WSUser:
+    def __init__(self, url: str, token: str, timeout: float):
+        self.url = url
+        self.token = token
+        self.timeout = timeout
+        self.connection = None
+        self.session_id = None
+
+    async def connect(self):
+        self.connection = await websockets.connect(self.url, max_size=None)
+        await self.connection.send(json.dumps({"type": "auth", "token": f"Bearer {self.token}"}))
+        while True:
+            frame = json.loads(await asyncio.wait_for(self.connection.recv(), self.timeout))
+            if frame.get("type") == "authentication_success":
+                self.session_id = frame.get("session_id") or ""
+                return
+            if frame.get("type") == "error":
+                raise RuntimeError(f"WebSocket authentication failed: {frame.get('content')}")
+
+    async def query(self, query: str):
+        """Returns (ttft, error): seconds to the first answer chunk, error description or None."""
+        query_id = uuid.uuid4().hex
+        start = time.perf_counter()
+        ttft = None
+        await self.connection.send(json.dumps({
+            "type": "query", "query": query, "session_id": self.session_id, "query_id": query_id
+        }))
+        while True:
+            frame = json.loads(await asyncio.wait_for(self.connection.recv(), self.timeout))
+            if frame.get("query_id") not in (None, query_id):
+                continue
+            kind = frame.get("type")
+            if kind == "chunk" and ttft is None:
+                ttft = time.perf_counter() - start
+            elif kind == "end_stream":
+                return ttft, None
+            elif kind in ("error", "cancelled"):
+                content = frame.get("content")
+                if isinstance(content, dict):
+                    content = content.get("error") or (content.get("metadata") or {}).get("error") or content
+                return ttft, f"{kind}: {content}"
+
+    async def close(self):
+        if self.connection is not None:
+            await self.connection.close()
+
+async def user_loop(run_query, queries: List[str], deadline: float, stats: Stats, rng: random.Random):
+    while time.perf_counter() < deadline:
+        start = time.perf_counter()
+        ttft = None
+        try:
+            result = await run_query(rng.choice(queries) + f" ({uuid.uuid4().hex[:6]})")
+            ttft, error = result if isinstance(result, tuple) else (None, result)
+        except Exception as e:
+            error = f"{type(e).__name__}: {e}"
+        stats.record(time.perf_counter() - start, error, ttft)
+
+async def drive(base_url: str, tokens: Dict[str, str], queries: List[str], modes: List[str], duration: float, timeout: float) -> dict:
+    report = {}
+    limits = httpx.Limits(max_connections=len(tokens), max_keepalive_connections=len(tokens))
+    async with httpx.AsyncClient(base_url=base_url, timeout=timeout, limits=limits) as client:
+        # First query per user builds its pipeline (index setup and ingestion of the seed corpus)
+        warmup = Stats()
+
+        async def warm(token):
+            start = time.perf_counter()
+            error = await http_query(client, token, queries[0])
+            warmup.record(time.perf_counter() - start, error)
+
+        start = time.perf_counter()
+        await asyncio.gather(*(warm(token) for token in tokens.values()))
+        report["warmup"] = warmup.report(time.perf_counter() - start)
+        if not warmup.latencies:
+            raise RuntimeError(f"Every warm-up query failed: {dict(warmup.errors.most_common(3))}")
+
+        for mode in modes:
+            stats = Stats()
+            rngs = [random.Random(i) for i in range(len(tokens))]
+            if mode == "http":
+                runners = [lambda query, token=token: http_query(client, token, query) for token in tokens.values()]
+                ws_users = []
+            else:
+                ws_users = [WSUser(base_url.replace("http", "ws", 1) + "/ws", token, timeout) for token in tokens.values()]
+                await asyncio.gather(*(user.connect() for user in ws_users))
+                runners = [user.query for user in ws_users]
+            start = time.perf_counter()
+            deadline = start + duration
+            await asyncio.gather(*(user_loop(run, queries, deadline, stats, rng) for run, rng in zip(runners, rngs)))
+            report[mode] = stats.report(time.perf_counter() - start)
+            await asyncio.gather(*(user.close() for user in ws_users), return_exceptions=True)
+    return report
+
+def main(args) -> dict:
+    workdir = tempfile.mkdtemp(prefix="llamasearch-load-")
+    port, redis_port, ollama_port = _free_port(), _free_port(), _free_port()
+    private_pem, cert_pem = create_signing_key()
+    with open(os.path.join(workdir, "signing_cert.pem"), "w") as f:
+        f.write(cert_pem)
+    write_config(workdir, redis_port, args.embedding_dim, args.enable_caches)
+    uids = [f"load-{i}-{uuid.uuid4().hex[:8]}" for i in range(args.users)]
+    queries = seed_corpora(workdir, uids, args.docs_per_user, make_vocabulary(2000))
+    tokens = {uid: mint_id_token(private_pem, uid) for uid in uids}
+
+    ollama_url = f"http://127.0.0.1:{ollama_port}"
+    processes = [
+        start("--role", "redis", "--port", str(redis_port), log_path=os.path.join(workdir, "redis.log")),
+        subprocess.Popen(
+            [sys.executable, "-m", "benchmarks.fake_ollama", "--port", str(ollama_port), "--ttft-ms", str(args.ttft_ms),
+             "--tokens-per-second", str(args.tokens_per_second), "--num-tokens", str(args.num_tokens)],
+            cwd=REPO_ROOT, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+        ),
+    ]
+    try:
+        wait_for(f"{ollama_url}/api/tags", processes, timeout=30)
+        processes.append(start(
+            "--role", "server", "--workdir", workdir, "--port", str(port), "--redis-port", str(redis_port), "--ollama-url", ollama_url,
+            "--sparse", args.sparse,
+            log_path=os.path.join(workdir, "server.log"),
+        ))
+        base_url = f"http://127.0.0.1:{port}"
+        wait_for(f"{base_url}/health", processes, timeout=args.startup_timeout)
+        modes = ["http", "ws"] if args.mode == "both" else [args.mode]
+        report = {
+            "users": args.users,
+            "duration_seconds": args.duration,
+            "llm": {"ttft_ms": args.ttft_ms, "tokens_per_second": args.tokens_per_second, "num_tokens": args.num_tokens},
+            "caches": args.enable_caches,
+            **asyncio.run(drive(base_url, tokens, queries, modes, args.duration, args.timeout)),
+        }
+    except BaseException:
+        print(f"Load test failed, server logs kept in {workdir}", file=sys.stderr)
+        raise
+    finally:
+        for process in processes:
+            process.terminate()
+        for process in processes:
+            try:
+                process.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                process.kill()
+    print(json.dumps(report, indent=2))
+    if args.keep_workdir:
+        print(f"Server logs and data kept in {workdir}", file=sys.stderr)
+    else:
+        shutil.rmtree(workdir, ignore_errors=True)
+    return report
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Load test the API server against stand-in services.")
+    parser.add_argument("--mode", choices=["http", "ws", "both"], default="both")
+    parser.add_argument("--users", type=int, default=10, help="Concurrent users, each with its own pipeline.")
+    parser.add_argument("--duration", type=float, default=30, help="Seconds of load per transport.")
+    parser.add_argument("--docs-per-user", type=int, default=50)
+    parser.add_argument("--ttft-ms", type=float, default=200, help="Fake LLM delay before the first token.")
+    parser.add_argument("--tokens-per-second", type=float, default=40, help="Fake LLM generation rate.")
+    parser.add_argument("--num-tokens", type=int, default=64, help="Fake LLM tokens per answer.")
+    parser.add_argument("--embedding-dim", type=int, default=384)
+    parser.add_argument("--sparse", choices=["hash", "model"], default="hash",
+                        help="Hashed term frequencies, or llama-index's default sparse model (downloaded).")
+    parser.add_argument("--enable-caches", action="store_true", help="Keep the answer and retrieval caches on.")
+    parser.add_argument("--timeout", type=float, default=120, help="Per-request timeout in seconds.")
+    parser.add_argument("--startup-timeout", type=float, default=300)
+    parser.add_argument("--keep-workdir", action="store_true")
+    # Internal: the stand-in processes started by the driver
+    parser.add_argument("--role", choices=["driver", "server", "redis"], default="driver", help=argparse.SUPPRESS)
+    parser.add_argument("--workdir", help=argparse.SUPPRESS)
+    parser.add_argument("--port", type=int, help=argparse.SUPPRESS)
+    parser.add_argument("--redis-port", type=int, help=argparse.SUPPRESS)
+    parser.add_argument("--ollama-url", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.role == "redis":
+        run_fake_redis(args.port)
+    elif args.role == "server":
+        run_server(args.workdir, args.port, args.redis_port, args.ollama_url, args.sparse)
+    else:
+        main(args)
@@ -0,0 +1,20 @@
+"""Summary statistics shared by the benchmark reports."""
+import math
+from typing import Dict, List, Optional
+
+def percentiles(values: List[float]) -> Optional[Dict[str, float]]:
+    """Mean and nearest-rank percentiles of latencies in seconds, reported in milliseconds."""
+    if not values:
+        return None
+    values = sorted(values)
+
+    def at(quantile: float) -> float:
+        return values[max(0, math.ceil(quantile * len(values)) - 1)]
+
+    return {
+        "mean": round(sum(values) / len(values) * 1000, 3),
+        "p50": round(at(0.50) * 1000, 3),
+        "p90": round(at(0.90) * 1000, 3),
+        "p99": round(at(0.99) * 1000, 3),
+        "max": round(values[-1] * 1000, 3),
+    }
@@ -0,0 +1,86 @@
+"""
+Synthetic corpora and a deterministic embedding model for the benchmarks.
+
+HashEmbedding stands in for the configured embedding model so benchmarks need neither a
+model download nor a GPU: it is a feature-hashed bag of words, so texts sharing words
+get similar vectors and retrieval results are meaningful, if not good. hash_sparse_vectors
+does the same for the sparse side of hybrid search.
+"""
+import hashlib
+import math
+import random
+import re
+from collections import Counter
+from functools import lru_cache
+from itertools import accumulate
+from typing import List, Tuple
+
+from llama_index.core.base.embeddings.base import BaseEmbedding
+
+_TOKEN = re.compile(r"\w+")
+SPARSE_DIM = 2 ** 20
+
+def _token_hash(token: str) -> int:
+    return int.from_bytes(hashlib.blake2b(token.encode("utf-8"), digest_size=8).digest(), "little")
+
+def make_vocabulary(size: int, seed: int = 0) -> List[str]:
+    """Pronounceable made-up words, distinct and deterministic for a seed."""
+    rng = random.Random(seed)
+    consonants, vowels = "bcdfghjklmnprstvz", "aeiou"
+    words = set()
+    while len(words) < size:
+        syllables = rng.randint(2, 4)
+        words.add("".join(rng.choice(consonants) + rng.choice(vowels) for _ in range(syllables)))
+    return sorted(words)
+
+@lru_cache(maxsize=None)
+def _zipf_cum_weights(size: int) -> List[float]:
+    return list(accumulate(1.0 / (rank + 1) for rank in range(size)))
+
+def synthetic_text(rng: random.Random, vocabulary: List[str], words: int) -> str:
+    """Sentences of words drawn from the vocabulary with a Zipf-like skew, like real text."""
+    drawn = rng.choices(vocabulary, cum_weights=_zipf_cum_weights(len(vocabulary)), k=words)
+    sentences = [drawn[i:i + 12] for i in range(0, len(drawn), 12)]
+    return " ".join(" ".join(sentence).capitalize() + "." for sentence in sentences)
+
+class HashEmbedding(BaseEmbedding):
+    model_name: str = "hash-embedding"
+    dim: int = 384
+
+    @classmethod
+    def class_name(cls) -> str:
+        return "HashEmbedding"
+
+    def _embed(self, text: str) -> List[float]:
+        vector = [0.0] * self.dim
+        for token in _TOKEN.findall(text.lower()):
+            value = _token_hash(token)
+            # The top bit picks the sign so colliding tokens cancel out rather than pile up
+            vector[value % self.dim] += 1.0 if value >> 63 else -1.0
+        norm = math.sqrt(sum(v * v for v in vector)) or 1.0
+        return [v / norm for v in vector]
+
+    def _get_query_embedding(self, query: str) -> List[float]:
+        return self._embed(query)
+
+    async def _aget_query_embedding(self, query: str) -> List[float]:
+        return self._embed(query)
+
+    def _get_text_embedding(self, text: str) -> List[float]:
+        return self._embed(text)
+
+    def _get_text_embeddings(self, texts: List[str]) -> List[List[float]]:
+        return [self._embed(text) for text in texts]
+
+def hash_sparse_vectors(texts: List[str]) -> Tuple[List[List[int]], List[List[float]]]:
+    """
+    Sparse encoder with the signature of QdrantVectorStore's sparse_doc_fn/sparse_query_fn:
+    hashed term ids weighted 1 + log(term frequency).
+    """
+    indices, values = [], []
+    for text in texts:
+        counts = Counter(_token_hash(token) % SPARSE_DIM for token in _TOKEN.findall(text.lower()))
+        ids = sorted(counts)
+        indices.append(ids)
+        values.append([1.0 + math.log(counts[i]) for i in ids])
+    return indices, values
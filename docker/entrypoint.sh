@@ -1,4 +1,9 @@
 #!/bin/bash
 echo "Config path: $CONFIG_PATH"
+# Prometheus multiprocess mode (several uvicorn workers via WEB_CONCURRENCY) needs an empty directory per start
+if [ -n "$PROMETHEUS_MULTIPROC_DIR" ]; then
+    rm -rf "$PROMETHEUS_MULTIPROC_DIR"
+    mkdir -p "$PROMETHEUS_MULTIPROC_DIR"
+fi
 exec uvicorn llamasearch.api.main:app --host 0.0.0.0 --port 8010
 #exec uvicorn llamasearch.main:app --host 0.0.0.0 --port 8000
\ No newline at end of file
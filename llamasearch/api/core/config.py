@@ -20,16 +20,47 @@ class Settings(BaseSettings):
 
     # Database Settings
     DATABASE_URL: str = Field(default='sqlite+aiosqlite:///./test.db', env="DATABASE_URL")
+    DB_ECHO: bool = Field(default=False, env="DB_ECHO")
+    # Connection pool, per worker process (ignored for in-memory SQLite)
+    DB_POOL_SIZE: int = Field(default=10, env="DB_POOL_SIZE")
+    DB_MAX_OVERFLOW: int = Field(default=20, env="DB_MAX_OVERFLOW")
+    DB_POOL_TIMEOUT: float = Field(default=30.0, env="DB_POOL_TIMEOUT")
+    DB_POOL_RECYCLE: int = Field(default=1800, env="DB_POOL_RECYCLE")
+    DB_POOL_PRE_PING: bool = Field(default=True, env="DB_POOL_PRE_PING")
+    # Compiled SQL cache size, and the per-connection prepared statement caches of asyncpg
+    # and SQLAlchemy's asyncpg adapter (set DB_STATEMENT_CACHE_SIZE=0 behind pgbouncer in
+    # transaction mode, which also gives every prepared statement a unique name)
+    DB_QUERY_CACHE_SIZE: int = Field(default=500, env="DB_QUERY_CACHE_SIZE")
+    DB_STATEMENT_CACHE_SIZE: int = Field(default=500, env="DB_STATEMENT_CACHE_SIZE")
+    # SQLite only: milliseconds a writer waits for the database lock before failing
+    SQLITE_BUSY_TIMEOUT: int = Field(default=5000, env="SQLITE_BUSY_TIMEOUT")
+
+    # Query logs are buffered and inserted in batches of up to QUERY_LOG_BATCH_SIZE rows,
+    # at most QUERY_LOG_FLUSH_INTERVAL seconds after the first row of a batch arrives
+    QUERY_LOG_BATCH_SIZE: int = Field(default=100, env="QUERY_LOG_BATCH_SIZE")
+    QUERY_LOG_FLUSH_INTERVAL: float = Field(default=0.5, env="QUERY_LOG_FLUSH_INTERVAL")
+    QUERY_LOG_QUEUE_SIZE: int = Field(default=10000, env="QUERY_LOG_QUEUE_SIZE")
 
     # Redis Settings
     REDIS_URL: str = Field(default="redis://localhost:6379/0", env="REDIS_URL")
+    REDIS_MAX_CONNECTIONS: int = Field(default=50, env="REDIS_MAX_CONNECTIONS")
 
     # Authentication Settings
     ENABLE_AUTH: bool = Field(default=True, env="ENABLE_AUTH")
     COOKIE_SECURE: bool = Field(default=False, env="COOKIE_SECURE")
+    # In-process session_id -> User cache; sessions ended on another worker stay valid here for up to the TTL
+    SESSION_CACHE_TTL: int = Field(default=30, env="SESSION_CACHE_TTL")
+    SESSION_CACHE_SIZE: int = Field(default=10000, env="SESSION_CACHE_SIZE")
+
+    # Comma-separated Firebase uids allowed to use admin endpoints (e.g. the profiler)
+    ADMIN_UIDS: str = Field(default="", env="ADMIN_UIDS")
+    PROFILER_MAX_SECONDS: float = Field(default=60.0, env="PROFILER_MAX_SECONDS")
 
     # Firebase Settings
     FIREBASE_CREDENTIALS_PATH: str = Field(default="/app/keys/firebase.json", env="FIREBASE_CREDENTIALS_PATH")
+    FIREBASE_TOKEN_CACHE_SIZE: int = Field(default=10000, env="FIREBASE_TOKEN_CACHE_SIZE")
+    FIREBASE_USER_CACHE_TTL: int = Field(default=600, env="FIREBASE_USER_CACHE_TTL")
+    FIREBASE_CERT_REFRESH_INTERVAL: int = Field(default=3600, env="FIREBASE_CERT_REFRESH_INTERVAL")
 
     # Application Paths
     APP_BASE_PATH: str = Field(default=".", env="APP_BASE_PATH")
@@ -43,6 +74,14 @@ class Settings(BaseSettings):
     MAX_FILES_PER_CHAT: int = Field(default=10)
     MAX_FILES: int = Field(default=10)
 
+    # WebSocket streaming
+    WS_STREAM_MAX_FRAME_BYTES: int = Field(default=1024, env="WS_STREAM_MAX_FRAME_BYTES")
+    WS_STREAM_FLUSH_INTERVAL: float = Field(default=0.05, env="WS_STREAM_FLUSH_INTERVAL")
+    WS_SEND_QUEUE_SIZE: int = Field(default=64, env="WS_SEND_QUEUE_SIZE")
+    WS_SEND_TIMEOUT: float = Field(default=10.0, env="WS_SEND_TIMEOUT")
+    WS_MAX_CONCURRENT_QUERIES: int = Field(default=3, env="WS_MAX_CONCURRENT_QUERIES")
+    WS_UPLOAD_QUEUE_SIZE: int = Field(default=16, env="WS_UPLOAD_QUEUE_SIZE")
+
     # Logging
     LOGLEVEL: str = Field(default="DEBUG", env="LOGLEVEL")
 
@@ -52,6 +91,10 @@ class Settings(BaseSettings):
     def BACKEND_CORS_ORIGINS_LIST(self) -> List[str]:
         return [origin.strip() for origin in self.BACKEND_CORS_ORIGINS.split(",")]
 
+    @property
+    def ADMIN_UIDS_LIST(self) -> List[str]:
+        return [uid.strip() for uid in self.ADMIN_UIDS.split(",") if uid.strip()]
+
 # @lru_cache()
 def get_settings():
     return Settings()
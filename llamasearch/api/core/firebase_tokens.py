@@ -0,0 +1,132 @@
+# app/core/firebase_tokens.py
+import asyncio
+import hashlib
+import re
+import time
+from typing import Dict, Optional
+
+import firebase_admin
+import requests
+from firebase_admin import auth
+from google.auth import jwt as google_jwt
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from llamasearch.api.core.config import settings
+from llamasearch.api.schemas.user import User, UserCreate
+from llamasearch.api.services.user import UserService
+from llamasearch.cache import LRUCache
+from llamasearch.logger import logger
+
+FIREBASE_CERTS_URL = "https://www.googleapis.com/robot/v1/metadata/x509/securetoken@system.gserviceaccount.com"
+
+class FirebaseTokenVerifier:
+    """
+    Verifies Firebase ID tokens locally and caches the results.
+
+    Google's signing certificates are prefetched and refreshed in the background ahead of
+    their expiry, so verification is a local signature check. Verified claims are cached by
+    token hash until the token expires, and the matching user record is cached by uid, so a
+    request with a known valid token touches neither the network nor the database.
+    """
+    def __init__(self, token_cache_size: int = settings.FIREBASE_TOKEN_CACHE_SIZE,
+                 user_cache_ttl: int = settings.FIREBASE_USER_CACHE_TTL,
+                 refresh_interval: int = settings.FIREBASE_CERT_REFRESH_INTERVAL):
+        self.token_cache = LRUCache(max_entries=token_cache_size, name="firebase_token")
+        self.user_cache = LRUCache(max_entries=token_cache_size, ttl=user_cache_ttl, name="firebase_user")
+        self.refresh_interval = refresh_interval
+        self._certs: Optional[Dict[str, str]] = None
+        self._certs_expire_at = 0.0
+        self._refresh_task: Optional[asyncio.Task] = None
+        # uid -> cached token hashes, so logout can drop them. Every token cache hit touches its
+        # uid, so with the same bound a uid is only evicted once none of its tokens is cached
+        self._user_tokens = LRUCache(max_entries=token_cache_size)
+
+    async def start(self):
+        await self.refresh_certs()
+        if self._refresh_task is None:
+            self._refresh_task = asyncio.create_task(self._refresh_loop())
+
+    async def stop(self):
+        if self._refresh_task is not None:
+            self._refresh_task.cancel()
+            await asyncio.gather(self._refresh_task, return_exceptions=True)
+            self._refresh_task = None
+
+    async def _refresh_loop(self):
+        while True:
+            # Refresh ahead of expiry so no request ever waits on a certificate download
+            delay = min(self.refresh_interval, self._certs_expire_at - time.time() - 300)
+            await asyncio.sleep(max(60, delay))
+            await self.refresh_certs()
+
+    async def refresh_certs(self):
+        try:
+            certs, max_age = await asyncio.to_thread(self._fetch_certs)
+            self._certs = certs
+            self._certs_expire_at = time.time() + max_age
+            logger.debug(f"Firebase signing certificates refreshed, valid for {max_age}s")
+        except Exception as e:
+            logger.warning(f"Unable to refresh Firebase signing certificates: {str(e)}")
+
+    @staticmethod
+    def _fetch_certs():
+        response = requests.get(FIREBASE_CERTS_URL, timeout=10)
+        response.raise_for_status()
+        max_age = re.search(r"max-age=(\d+)", response.headers.get("Cache-Control", ""))
+        return response.json(), int(max_age.group(1)) if max_age else 3600
+
+    def _decode_locally(self, token: str) -> dict:
+        project_id = firebase_admin.get_app().project_id
+        claims = google_jwt.decode(token, certs=self._certs, audience=project_id)
+        if claims.get("iss") != f"https://securetoken.google.com/{project_id}":
+            raise ValueError("Invalid token issuer")
+        if not claims.get("sub") or len(claims["sub"]) > 128:
+            raise ValueError("Invalid token subject")
+        claims["uid"] = claims["sub"]
+        return claims
+
+    async def verify(self, token: str) -> dict:
+        """Returns the decoded claims, from cache if this token was verified before and has not expired."""
+        key = hashlib.sha256(token.encode("utf-8")).hexdigest()
+        claims = self.token_cache.get(key)
+        if claims is not None:
+            self._user_tokens.get(claims["uid"])
+            return claims
+        if self._certs and time.time() < self._certs_expire_at:
+            claims = await asyncio.to_thread(self._decode_locally, token)
+        else:
+            # No fresh certificates (prefetch failed or not started), let the SDK fetch them
+            claims = await asyncio.to_thread(auth.verify_id_token, token)
+        ttl = claims["exp"] - time.time()
+        if ttl > 0:
+            self.token_cache.set(key, claims, ttl=ttl)
+            uid = claims["uid"]
+            tokens = self._user_tokens.get(uid) or set()
+            self._user_tokens.set(uid, {k for k in tokens if k in self.token_cache} | {key})
+        return claims
+
+    async def get_user(self, claims: dict, db: AsyncSession) -> User:
+        uid = claims["uid"]
+        user = self.user_cache.get(uid)
+        if user is not None:
+            return user
+        email, display_name = claims.get("email"), claims.get("name")
+        if not email:
+            # Not every sign-in provider puts the email in the token
+            firebase_user = await asyncio.to_thread(auth.get_user, uid)
+            email, display_name = firebase_user.email, firebase_user.display_name
+        user = await UserService.create_or_get_user(db, UserCreate(
+            firebase_uid=uid,
+            email=email,
+            display_name=display_name or ""
+        ))
+        self.user_cache.set(uid, user)
+        return user
+
+    def invalidate_user(self, uid: str):
+        self.user_cache.pop(uid)
+        for key in self._user_tokens.get(uid) or ():
+            self.token_cache.pop(key)
+        self._user_tokens.pop(uid)
+
+token_verifier = FirebaseTokenVerifier()
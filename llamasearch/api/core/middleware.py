@@ -3,10 +3,14 @@
 from fastapi import UploadFile, Request, Response, HTTPException, WebSocketDisconnect
 from fastapi.responses import PlainTextResponse
 from starlette.middleware.base import BaseHTTPMiddleware
+from starlette.routing import Match
 import time
+import uuid
+from llamasearch import tracing
+from llamasearch.settings import config
+from llamasearch.prometheus_metrics import HTTP_REQUESTS, HTTP_REQUEST_LATENCY, HTTP_REQUESTS_IN_PROGRESS
 from llamasearch.api.services.session import session_service
 from llamasearch.api.db.session import get_db
-from llamasearch.api.core.config import settings
 from llamasearch.logger import logger
 from llamasearch.api.core.security  import get_current_user_ws
 from llamasearch.api.core.config import settings
@@ -19,14 +23,18 @@ class SessionMiddleware(BaseHTTPMiddleware):
         request.state.user = None
         request.state.session_id = None
         if settings.ENABLE_AUTH and session_id:
-            async for db in get_db():
-                user = await session_service.validate_session(db, session_id)
-                if user:
-                    request.state.user = user
-                    request.state.session_id = session_id
-                    logger.debug(f"SessionMiddleware: User authenticated via session: {user.email}")
-                else:
-                    logger.debug("SessionMiddleware: Invalid session")
+            # Hot path: recently validated sessions need no DB session or Redis round trip
+            user = session_service.get_cached_user(session_id)
+            if user is None:
+                with tracing.span("auth.session"):
+                    async for db in get_db():
+                        user = await session_service.validate_session(db, session_id)
+            if user:
+                request.state.user = user
+                request.state.session_id = session_id
+                logger.debug(f"SessionMiddleware: User authenticated via session: {user.email}")
+            else:
+                logger.debug("SessionMiddleware: Invalid session")
         else:
             logger.debug(f"No session ID or session auth not enabled. ENABLE_AUTH: {settings.ENABLE_AUTH}")
 
@@ -52,6 +60,52 @@ class SessionMiddleware(BaseHTTPMiddleware):
         logger.info(f"Request processed: {response.status_code}")
         return response
 
+# Strings FastAPI (pydantic) parses as True for a bool query parameter
+_TRUE_VALUES = {"1", "true", "t", "yes", "y", "on"}
+
+class TracingMiddleware(BaseHTTPMiddleware):
+    """
+    Opens a trace per HTTP request, when tracing is enabled or the request asks for
+    ?debug_timing=1. Spans opened further down (auth, pipeline, retrieval, LLM) attach to it.
+    """
+    async def dispatch(self, request: Request, call_next):
+        debug_timing = request.query_params.get("debug_timing", "").strip().lower() in _TRUE_VALUES
+        if not (config.tracing.enable or debug_timing):
+            return await call_next(request)
+        request_id = request.headers.get("X-Request-ID") or uuid.uuid4().hex
+        with tracing.start_trace(f"{request.method} {request.url.path}", request_id=request_id) as trace:
+            request.state.trace = trace
+            response = await call_next(request)
+            response.headers["X-Request-ID"] = request_id
+            response.headers["X-Trace-ID"] = trace.trace_id
+            return response
+
+class MetricsMiddleware(BaseHTTPMiddleware):
+    """Request count, latency and in-flight requests per route template."""
+    @staticmethod
+    def _route(request: Request) -> str:
+        # Label by template (/chats/{chat_id}), raw paths would give one series per id
+        for route in request.app.routes:
+            match, _ = route.matches(request.scope)
+            if match == Match.FULL:
+                return route.path
+        return "unmatched"
+
+    async def dispatch(self, request: Request, call_next):
+        method, route = request.method, self._route(request)
+        in_progress = HTTP_REQUESTS_IN_PROGRESS.labels(method=method, route=route)
+        in_progress.inc()
+        status_code = 500
+        start_time = time.perf_counter()
+        try:
+            response = await call_next(request)
+            status_code = response.status_code
+            return response
+        finally:
+            HTTP_REQUEST_LATENCY.labels(method=method, route=route).observe(time.perf_counter() - start_time)
+            HTTP_REQUESTS.labels(method=method, route=route, status=str(status_code)).inc()
+            in_progress.dec()
+
 async def session_middleware(request: Request, call_next):
     middleware = SessionMiddleware(app=None)
     return await middleware.dispatch(request, call_next)
@@ -1,30 +1,45 @@
-import redis
+import redis.asyncio as aioredis
 from llamasearch.api.core.config import settings
 
-redis_client = redis.Redis.from_url(settings.REDIS_URL)
+# Increments a counter unless the result would exceed the limit, in a single round trip
+_INCREMENT_WITH_LIMIT = """
+local count = redis.call('INCRBY', KEYS[1], ARGV[1])
+if count > tonumber(ARGV[2]) then
+    redis.call('DECRBY', KEYS[1], ARGV[1])
+    return 0
+end
+return 1
+"""
+
+def create_redis_client(url: str = settings.REDIS_URL, max_connections: int = settings.REDIS_MAX_CONNECTIONS) -> aioredis.Redis:
+    pool = aioredis.ConnectionPool.from_url(url, max_connections=max_connections)
+    return aioredis.Redis(connection_pool=pool)
+
+redis_client = create_redis_client()
 
 def get_redis():
     return redis_client
 
-def set_session(session_id: str, user_id: str, expiry: int = 3600):
-    redis_client.setex(f"session:{session_id}", expiry, user_id)
+async def close_redis():
+    await redis_client.close()
+    await redis_client.connection_pool.disconnect()
+
+async def set_session(session_id: str, user_id: str, expiry: int = 3600):
+    await redis_client.setex(f"session:{session_id}", expiry, user_id)
 
-def get_session(session_id: str) -> str:
-    return redis_client.get(f"session:{session_id}")
+async def get_session(session_id: str) -> str:
+    return await redis_client.get(f"session:{session_id}")
 
-def delete_session(session_id: str):
-    redis_client.delete(f"session:{session_id}")
+async def delete_session(session_id: str):
+    await redis_client.delete(f"session:{session_id}")
 
-def get_file_count(user_id: str) -> int:
-    return int(redis_client.get(f"file_count:{user_id}") or 0)
+async def get_file_count(user_id: str) -> int:
+    return int(await redis_client.get(f"file_count:{user_id}") or 0)
 
-def update_file_count(user_id: str, count: int):
-    redis_client.set(f"file_count:{user_id}", count)
+async def update_file_count(user_id: str, count: int):
+    await redis_client.set(f"file_count:{user_id}", count)
 
-def increment_file_count(user_id: str, increment: int = 1) -> bool:
-    current_count = redis_client.incrby(f"file_count:{user_id}", increment)
-    if current_count > settings.MAX_FILES:
-        # If limit is exceeded, decrement back and return False
-        redis_client.decrby(f"file_count:{user_id}", increment)
-        return False
-    return True
\ No newline at end of file
+async def increment_file_count(user_id: str, increment: int = 1) -> bool:
+    # If limit would be exceeded, the script leaves the count unchanged and returns 0
+    allowed = await redis_client.eval(_INCREMENT_WITH_LIMIT, 1, f"file_count:{user_id}", increment, settings.MAX_FILES)
+    return bool(allowed)
@@ -9,11 +9,12 @@ import firebase_admin
 from typing import Optional, Tuple
 import time
 from llamasearch.api.core.config import settings
-from llamasearch.api.services.user import UserService
 from llamasearch.api.db.session import get_db
-from llamasearch.api.schemas.user import User, UserCreate
+from llamasearch.api.schemas.user import User
 from llamasearch.api.services.session import session_service
+from llamasearch.api.core.firebase_tokens import token_verifier
 from llamasearch.logger import logger
+from llamasearch import tracing
 
 if not firebase_admin._apps:
     cred = credentials.Certificate(settings.FIREBASE_CREDENTIALS_PATH)
@@ -22,14 +23,8 @@ security = HTTPBearer(auto_error=False)
 
 async def verify_token_and_get_user(token: str, db: AsyncSession) -> User:
     try:
-        decoded_token = auth.verify_id_token(token)
-        firebase_user = auth.get_user(decoded_token['uid'])
-        user_data = UserCreate(
-            firebase_uid=firebase_user.uid,
-            email=firebase_user.email,
-            display_name=firebase_user.display_name or ""
-        )
-        user = await UserService.create_or_get_user(db, user_data)
+        decoded_token = await token_verifier.verify(token)
+        user = await token_verifier.get_user(decoded_token, db)
         return user
     except Exception as e:
         logger.error(f"Token verification failed: {str(e)}")
@@ -44,6 +39,10 @@ async def get_current_user(
     credentials: Optional[HTTPAuthorizationCredentials] = None,
     db: AsyncSession = Depends(get_db),
 ) -> User:
+    with tracing.span("auth"):
+        return await _resolve_current_user(request, db)
+
+async def _resolve_current_user(request: Request, db: AsyncSession) -> User:
     logger.debug(f"Checking authentication for request to {request.url}")
     # Check for session-based authentication
     if hasattr(request.state, 'user') and request.state.user is not None:
@@ -109,6 +108,14 @@ def verify_and_refresh_token(token: str):
     except auth.RevokedIdTokenError:
         raise HTTPException(status_code=401, detail="Token revoked")
 
+def is_admin(user: User) -> bool:
+    return user.firebase_uid in settings.ADMIN_UIDS_LIST
+
+async def get_admin_user(user: User = Depends(get_current_user)) -> User:
+    if not is_admin(user):
+        raise HTTPException(status_code=403, detail="Admin access required")
+    return user
+
 async def get_optional_user(
     request: Request,
     response: Response,
@@ -141,6 +148,7 @@ async def logout_user(
             except Exception as e:
                 logger.error(f"Error revoking refresh tokens for user {user.id}: {str(e)}")
             await session_service.end_all_sessions(db, user.id)
+            token_verifier.invalidate_user(user.firebase_uid)
         response.delete_cookie(key="firebase_token", path="/", domain=None)
         response.delete_cookie(key="session_id", path="/", domain=None)
     except Exception as e:
@@ -1,6 +1,6 @@
 # app/db/models.py
 
-from sqlalchemy import Column, String, DateTime, ForeignKey, Integer, Enum, Text, JSON
+from sqlalchemy import Column, String, DateTime, ForeignKey, Integer, Enum, Text, JSON, Index
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 from typing import Optional
@@ -74,6 +74,11 @@ class Message(Base):
 
     chat = relationship("Chat", back_populates="messages")
 
+    __table_args__ = (
+        # Serves "latest message per chat" lookups and ordered message listing
+        Index("ix_messages_chat_id_sequence_number", "chat_id", "sequence_number"),
+    )
+
 class Session(Base):
     __tablename__ = "sessions"
     
@@ -1,7 +1,9 @@
-from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine, async_sessionmaker
+import uuid
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession, create_async_engine, async_sessionmaker
+from sqlalchemy.engine import make_url
 from sqlalchemy.orm import DeclarativeBase
 from llamasearch.api.core.config import settings
-from sqlalchemy import MetaData
+from sqlalchemy import MetaData, event
 
 class Base(DeclarativeBase):
     metadata = MetaData(
@@ -14,13 +16,60 @@ class Base(DeclarativeBase):
         }
     )
 
+def _is_memory_sqlite(url) -> bool:
+    return url.get_backend_name() == "sqlite" and (
+        url.database in (None, "", ":memory:") or url.query.get("mode") == "memory"
+    )
+
+def engine_options(db_url: str) -> dict:
+    """Keyword arguments for create_async_engine, from settings and the database backend."""
+    url = make_url(db_url)
+    options = {
+        "echo": settings.DB_ECHO,
+        "query_cache_size": settings.DB_QUERY_CACHE_SIZE,
+        "pool_pre_ping": settings.DB_POOL_PRE_PING,
+    }
+    if not _is_memory_sqlite(url):
+        # In-memory SQLite uses a single shared connection, there is no pool to size
+        options.update(
+            pool_size=settings.DB_POOL_SIZE,
+            max_overflow=settings.DB_MAX_OVERFLOW,
+            pool_timeout=settings.DB_POOL_TIMEOUT,
+            pool_recycle=settings.DB_POOL_RECYCLE,
+        )
+    if url.get_driver_name() == "asyncpg":
+        # SQLAlchemy's adapter and asyncpg itself each keep a prepared statement cache
+        connect_args = {
+            "prepared_statement_cache_size": settings.DB_STATEMENT_CACHE_SIZE,
+            "statement_cache_size": settings.DB_STATEMENT_CACHE_SIZE,
+        }
+        if not settings.DB_STATEMENT_CACHE_SIZE:
+            # Behind pgbouncer, statements from different clients can share a server connection
+            connect_args["prepared_statement_name_func"] = lambda: f"__asyncpg_{uuid.uuid4()}__"
+        options["connect_args"] = connect_args
+    return options
+
+def _set_sqlite_pragmas(dbapi_connection, connection_record):
+    cursor = dbapi_connection.cursor()
+    # WAL lets readers run alongside the single writer; NORMAL sync is safe in WAL mode
+    cursor.execute("PRAGMA journal_mode=WAL")
+    cursor.execute("PRAGMA synchronous=NORMAL")
+    cursor.execute(f"PRAGMA busy_timeout={int(settings.SQLITE_BUSY_TIMEOUT)}")
+    cursor.close()
+
+def create_engine(db_url: str, **overrides) -> AsyncEngine:
+    engine = create_async_engine(db_url, **{**engine_options(db_url), **overrides})
+    if engine.dialect.name == "sqlite" and not _is_memory_sqlite(engine.url):
+        event.listen(engine.sync_engine, "connect", _set_sqlite_pragmas)
+    return engine
+
 class AsyncDatabaseSession:
     def __init__(self):
         self._engine = None
         self._session_factory = None
 
-    def init(self, db_url: str):
-        self._engine = create_async_engine(db_url, echo=True)
+    def init(self, db_url: str, **engine_overrides):
+        self._engine = create_engine(db_url, **engine_overrides)
         self._session_factory = async_sessionmaker(self._engine, expire_on_commit=False)
 
     async def close(self):
@@ -1,27 +1,35 @@
 # app/main.py
 from fastapi import FastAPI, Request, Depends, WebSocket, WebSocketDisconnect, status
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, Response
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.exceptions import RequestValidationError
 from contextlib import asynccontextmanager
 from dependency_injector.wiring import inject, Provide
 from sqlalchemy.ext.asyncio import AsyncSession
 import uvicorn
-from llamasearch.api.core.middleware import SessionMiddleware, FileUploadMiddleware
+from llamasearch.api.core.middleware import SessionMiddleware, FileUploadMiddleware, TracingMiddleware, MetricsMiddleware
 from llamasearch.api.routes import router, document_router
 from llamasearch.api.core.config import settings
-from llamasearch.api.core.redis import get_redis
+from llamasearch.api.core.redis import close_redis
 from llamasearch.api.services.session import session_service
 from llamasearch.api.core.container import Container
 from llamasearch.logger import logger
 from llamasearch.api.db.session import init_db, close_db
+from llamasearch.api.tasks import query_log_writer
 from llamasearch.api.websocket_manager import websocket_manager
-from llamasearch.api.core.security import get_current_user_ws
+from llamasearch.api.core.security import get_current_user_ws, get_admin_user
+from llamasearch.api.schemas.user import User
+from llamasearch.api.core.firebase_tokens import token_verifier
 from llamasearch.api.db.session import get_db
 from llamasearch.api.query_processor import process_query
 from llamasearch.pipeline import PipelineFactory
 from llamasearch.api.ws_routes import ws_router
 from llamasearch.api.db.session import sessionmanager, Base
+from llamasearch.latency import LatencyTracker
+from llamasearch.cache import corpus_versions, embedding_cache
+from llamasearch import prometheus_metrics
+from llamasearch.tracing import instrument_llama_index
+from llamasearch.settings import config
 import logging
 
 logging.getLogger("websockets").setLevel(logging.WARNING)
@@ -33,15 +41,21 @@ container = Container()
 async def lifespan(app: FastAPI):
     # Startup Logic
     await init_db()
+    query_log_writer.start()
+    # Corpus versions and cached embeddings share the pooled client with sessions
+    corpus_versions.init_redis(container.redis_client())
+    embedding_cache.init_redis(container.redis_client())
     if settings.ENABLE_AUTH:
-        redis_client = get_redis()
+        redis_client = container.redis_client()
         session_service.init_redis(redis_client)
         print(redis_client)
         print("Session authentication initialized with Redis")
+        await token_verifier.start()
     pipeline_factory = container.pipeline_factory()
     pipeline_factory.is_api_server = True
     await pipeline_factory.initialize_common_resources()
     logger.info("Pipeline factory initialized")
+    instrument_llama_index()
     logger.info("WebSocket manager initialized")
 
     yield
@@ -51,7 +65,13 @@ async def lifespan(app: FastAPI):
     for client_id in list(app.state.websocket_manager.active_connections.keys()):
         await app.state.websocket_manager.disconnect(client_id)
     logger.info("All WebSocket connections closed")
+    await query_log_writer.stop()
     await close_db()
+    await corpus_versions.close()
+    await embedding_cache.close()
+    await close_redis()
+    await token_verifier.stop()
+    prometheus_metrics.mark_process_dead()
 
 app = FastAPI(
     lifespan=lifespan,
@@ -75,6 +95,12 @@ if settings.ENABLE_AUTH:
     print("Session authentication enabled")
     app.add_middleware(SessionMiddleware)
 
+# Middleware added last runs first. Metrics wrap session validation so it counts in the
+# request latency, and tracing is outermost so both are part of the request trace
+if config.application.enable_prometheus:
+    app.add_middleware(MetricsMiddleware)
+app.add_middleware(TracingMiddleware)
+
 # Initialize ConnectionManager
 app.state.websocket_manager = websocket_manager
 
@@ -94,6 +120,17 @@ async def root():
 async def health_check():
     return {"status": "healthy"}
 
+@app.get("/metrics/latency")
+async def latency_metrics(admin: User = Depends(get_admin_user)):
+    """Per-method call counts and rolling-window latency percentiles, in seconds. Admins only."""
+    return LatencyTracker().snapshot()
+
+if config.application.enable_prometheus:
+    @app.get("/metrics")
+    async def metrics():
+        content, content_type = prometheus_metrics.render()
+        return Response(content=content, media_type=content_type)
+
 @app.exception_handler(Exception)
 async def universal_exception_handler(request: Request, exc: Exception):
     return JSONResponse(
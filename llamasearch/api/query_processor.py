@@ -1,20 +1,21 @@
 # query_processor.py
 from llamasearch.api.schemas.user import User
 from llamasearch.api.core.container import Container
-from llamasearch.api.tasks import log_query_task
-from llamasearch.pipeline import PipelineFactory
+from llamasearch.api.tasks import log_query_task, query_log_writer
+from llamasearch.pipeline import PipelineFactory, Pipeline
 from sqlalchemy.ext.asyncio import AsyncSession
 from llamasearch.logger import logger
 from llamasearch.api.utils import handle_file_upload
-from typing import List, Union, Dict
+from llamasearch.cache import answer_cache, corpus_versions
+from typing import Any, AsyncIterator, List, Optional, Tuple, Union, Dict
 from fastapi import File, UploadFile, Form
-# from cachetools import TTLCache
 import json
 import os
 import asyncio
 
-# query_cache = TTLCache(maxsize=100, ttl=3600)
 QUERY_TIMEOUT = 60 # 60 seconds
+STREAM_TIMEOUT = 300 # Whole token stream of an answer
+TOKEN_TIMEOUT = 60 # Between two tokens
 
 async def process_query(
     query: str,
@@ -27,40 +28,29 @@ async def process_query(
         pipeline = await pipeline_factory.get_or_create_pipeline_async(user.firebase_uid, user.tenant_id)
         user_upload_dir = pipeline.config.application.data_path
         logger.debug(f"User Upload Dir: {user_upload_dir}")
-        # cache_key = f"{user.firebase_uid}:{query}"
-        # if cache_key in query_cache:
-        #     logger.info(f"Query cache hit for {cache_key}")
-        #     return query_cache[cache_key]
-        file_upload_response = []
-        if file_paths:
-            logger.info(f"{len(file_paths)} file(s) received")
-            logger.info("Inserting file paths : {}".format(file_paths))
-            await pipeline.insert_documents(file_paths)
-            file_upload_response = [{"filename": os.path.basename(path), "status": "success"} for path in file_paths]
-        else:
-            logger.info("No files received")
-
-        response = await asyncio.wait_for(pipeline.perform_query_async(query), timeout=QUERY_TIMEOUT)
+        file_upload_response = await _insert_files(pipeline, file_paths)
+
+        cached, corpus_version, query_embedding = await _lookup_cached_answer(pipeline, query)
+        if cached is not None:
+            await _log_query(db, user, query, cached["context"], cached["response"])
+            return {
+                "response": cached["response"],
+                "context": cached["context"],
+                "query": query,
+                "file_upload": file_upload_response
+            }
+
+        response = await asyncio.wait_for(
+            pipeline.perform_query_async(query, query_embedding=query_embedding), timeout=QUERY_TIMEOUT
+        )
         logger.debug(f"Raw response from query_app: {response}")
 
         if response is None or not hasattr(response, 'response'):
             raise ValueError(f"Invalid response from query processing {response}.")
 
-        document_info, retrieval_context = pipeline.get_context_from_response(response)
-        context_details = [
-            {
-                #"file_path": path,
-                "file_name": details['file_name'],
-                "last_modified": details['last_modified_date'],
-                "document_id": details['doc_id']
-            }
-            for path, details in document_info.items()
-        ]
-        logger.debug("Context details: " + str(context_details))
-        try:
-            await log_query_task(db, user.firebase_uid, query, context_details, response.response)
-        except Exception as e:
-            logger.error(f"Failed to log query for user {user.firebase_uid}: {str(e)}")
+        context_details = _context_details(pipeline, response)
+        await _log_query(db, user, query, context_details, response.response)
+        _cache_answer(pipeline, corpus_version, query, query_embedding, response.response, context_details)
 
         result = {
             "response": response.response,
@@ -68,7 +58,6 @@ async def process_query(
             "query": query,
             "file_upload": file_upload_response
         }
-        # query_cache[cache_key] = result
         return result
     except asyncio.TimeoutError:
         logger.error("Query processing timed out")
@@ -85,4 +74,128 @@ async def process_query(
             "context": [],
             "query": query,
             "file_upload": file_upload_response if 'file_upload_response' in locals() else []
-        }
\ No newline at end of file
+        }
+
+async def stream_query(
+    query: str,
+    user: User,
+    db: AsyncSession,
+    pipeline_factory: PipelineFactory,
+    file_paths: List[str] = None
+) -> Tuple[Dict[str, Any], AsyncIterator[str]]:
+    """
+    Streaming counterpart of process_query.
+
+    Retrieval runs before returning, so the metadata (context, file upload results) is
+    available up front. The returned iterator yields answer tokens as the LLM generates
+    them; the query is logged and cached once the iterator is exhausted.
+
+    Raises:
+        asyncio.TimeoutError: If retrieval and synthesis setup exceed QUERY_TIMEOUT. The
+            iterator raises it if the LLM stalls for TOKEN_TIMEOUT or the whole answer takes
+            longer than STREAM_TIMEOUT.
+    """
+    pipeline = await pipeline_factory.get_or_create_pipeline_async(user.firebase_uid, user.tenant_id)
+    file_upload_response = await _insert_files(pipeline, file_paths)
+
+    cached, corpus_version, query_embedding = await _lookup_cached_answer(pipeline, query)
+    if cached is not None:
+        async def cached_tokens():
+            yield cached["response"]
+            await _log_query(db, user, query, cached["context"], cached["response"])
+        metadata = {"query": query, "context": cached["context"], "file_upload": file_upload_response}
+        return metadata, cached_tokens()
+
+    response = await asyncio.wait_for(
+        pipeline.astream_query_async(query, query_embedding=query_embedding), timeout=QUERY_TIMEOUT
+    )
+    context_details = _context_details(pipeline, response)
+
+    async def tokens():
+        answer = []
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + STREAM_TIMEOUT
+        iterator = Pipeline.aiter_response_tokens(response)
+        try:
+            while True:
+                timeout = min(TOKEN_TIMEOUT, deadline - loop.time())
+                try:
+                    token = await asyncio.wait_for(iterator.__anext__(), timeout=max(timeout, 0))
+                except StopAsyncIteration:
+                    break
+                answer.append(token)
+                yield token
+        finally:
+            await iterator.aclose()
+        answer = "".join(answer)
+        await _log_query(db, user, query, context_details, answer)
+        _cache_answer(pipeline, corpus_version, query, query_embedding, answer, context_details)
+
+    metadata = {"query": query, "context": context_details, "file_upload": file_upload_response}
+    return metadata, tokens()
+
+async def _insert_files(pipeline: Pipeline, file_paths: Optional[List[str]]) -> List[Dict[str, str]]:
+    if not file_paths:
+        logger.info("No files received")
+        return []
+    logger.info(f"{len(file_paths)} file(s) received")
+    logger.info("Inserting file paths : {}".format(file_paths))
+    await pipeline.insert_documents(file_paths)
+    return [{"filename": os.path.basename(path), "status": "success"} for path in file_paths]
+
+async def _lookup_cached_answer(pipeline: Pipeline, query: str) -> Tuple[Optional[Dict], Optional[int], Optional[List[float]]]:
+    """
+    Returns (cached answer, corpus version, query embedding).
+
+    Must run after any document insert, which bumps the corpus version. The query
+    embedding is only computed on an exact-match miss and is reused for retrieval.
+    """
+    if not pipeline.config.cache.enable_answer_cache:
+        return None, None, None
+    corpus_version = await corpus_versions.get(pipeline.corpus_id)
+    if corpus_version is None:
+        return None, None, None
+    cached = answer_cache.get_exact(pipeline.tenant_id, corpus_version, query)
+    query_embedding = None
+    if cached is None:
+        query_embedding = await pipeline.aget_query_embedding(query)
+        cached = answer_cache.get_similar(pipeline.tenant_id, corpus_version, query_embedding)
+    if cached is not None:
+        logger.info(f"Answer cache hit for tenant {pipeline.tenant_id} ({answer_cache.stats()})")
+    return cached, corpus_version, query_embedding
+
+def _cache_answer(pipeline: Pipeline, corpus_version: Optional[int], query: str,
+                  query_embedding: Optional[List[float]], answer: str, context_details: List[Dict]):
+    if corpus_version is None:
+        return
+    answer_cache.set(
+        pipeline.tenant_id, corpus_version, query,
+        {"response": answer, "context": context_details},
+        embedding=query_embedding
+    )
+
+def _context_details(pipeline: Pipeline, response) -> List[Dict[str, Any]]:
+    document_info, retrieval_context = pipeline.get_context_from_response(response)
+    context_details = [
+        {
+            #"file_path": path,
+            "file_name": details['file_name'],
+            "last_modified": details['last_modified_date'],
+            "document_id": details['doc_id']
+        }
+        for path, details in document_info.items()
+    ]
+    logger.debug("Context details: " + str(context_details))
+    return context_details
+
+async def _log_query(db: AsyncSession, user: User, query: str, context_details: List[Dict], answer: str):
+    if query_log_writer.submit(user.firebase_uid, query, context_details, answer):
+        return
+    if query_log_writer.running:
+        # Queue is full, the row was dropped rather than adding a commit to this request
+        return
+    try:
+        # No background writer (e.g. outside the API server), write synchronously
+        await log_query_task(db, user.firebase_uid, query, context_details, answer)
+    except Exception as e:
+        logger.error(f"Failed to log query for user {user.firebase_uid}: {str(e)}")
@@ -1,14 +1,16 @@
 # app/api/routes.py
 from fastapi import APIRouter, Depends, HTTPException, Request, Response, File, UploadFile, Form, BackgroundTasks, WebSocket, WebSocketDisconnect, Body, status
 from fastapi.security import APIKeyCookie, HTTPAuthorizationCredentials, HTTPBearer
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, PlainTextResponse
 from dependency_injector.wiring import inject, Provide
 from sqlalchemy.ext.asyncio import AsyncSession
 from typing import List, Optional, Tuple, Union, Dict, Any
+from contextlib import nullcontext
 from functools import wraps
+import asyncio
 import json, os
 # API Imports
-from llamasearch.api.core.security import get_current_user, get_current_user_ws, get_optional_user, logout_user
+from llamasearch.api.core.security import get_current_user, get_current_user_ws, get_optional_user, logout_user, get_admin_user, is_admin
 from llamasearch.api.db.session import get_db
 from llamasearch.api.schemas.user import UserInDB, User
 from llamasearch.api.schemas.chat import ChatCreate, ChatResponse, ChatListResponse, MessageCreate, MessageResponse
@@ -19,6 +21,8 @@ from llamasearch.api.services.session import session_service
 from llamasearch.api.core.config import settings
 # Pipeline imports
 from llamasearch.logger import logger
+from llamasearch import tracing
+from llamasearch.profiling import ProfilerBusy, RequestProfile, collapsed, sample_stacks
 from llamasearch.api.core.container import Container
 from llamasearch.api.core.redis import get_file_count, update_file_count
 from llamasearch.pipeline import PipelineFactory, Pipeline
@@ -121,7 +125,7 @@ async def read_chats(
     skip: int = 0,
     limit: int = 10
 ):
-    return await ChatService.get_user_chats(db, user.id, skip, limit)
+    return await ChatService.get_user_chats(db, user.firebase_uid, skip, limit)
 
 @router.get("/optional-auth")
 async def optional_auth_route(request: Request, user: Optional[User] = Depends(get_optional_user)):
@@ -139,12 +143,17 @@ async def query_endpoint(
     files: List[UploadFile] = File(None),
     db: AsyncSession = Depends(get_db),
     pipeline_factory: PipelineFactory = Depends(Provide[Container.pipeline_factory]),
-    current_user: User = Depends(get_current_user)
+    current_user: User = Depends(get_current_user),
+    debug_timing: bool = False,
+    profile: bool = False
 ):
     # Check for empty query
     if not query.strip():
         raise HTTPException(status_code=422, detail="Empty query string is not allowed")
+    if profile and not is_admin(current_user):
+        raise HTTPException(status_code=403, detail="Admin access required for profiling")
     logger.info(f"Query endpoint called by user: {current_user.email}")
+    tracing.tag(tenant_id=current_user.tenant_id, user_id=current_user.firebase_uid)
     try:
         pipeline = await pipeline_factory.get_or_create_pipeline_async(current_user.firebase_uid, current_user.tenant_id)
         user_upload_dir = pipeline.config.application.data_path
@@ -155,17 +164,26 @@ async def query_endpoint(
             file_paths = [result['location'] for result in upload_results if result['status'] == "success"]
             logger.info(f"Uploaded {len(file_paths)} files for query processing")
 
-        result = await process_query(
-            query=query,
-            user=current_user,
-            db=db,
-            pipeline_factory=pipeline_factory,
-            file_paths=file_paths
-        )
+        request_profile = RequestProfile() if profile else None
+        with request_profile or nullcontext():
+            result = await process_query(
+                query=query,
+                user=current_user,
+                db=db,
+                pipeline_factory=pipeline_factory,
+                file_paths=file_paths
+            )
 
         # Update file count in Redis
-        update_file_count(current_user.firebase_uid, len(file_paths))
+        await update_file_count(current_user.firebase_uid, len(file_paths))
 
+        if request_profile is not None:
+            result["profile"] = request_profile.report()
+
+        trace = tracing.current_trace()
+        if debug_timing and trace is not None:
+            # The root span is still open here, its duration is the time so far
+            result["timing"] = trace.to_dict()
         return JSONResponse(content=result, status_code=200)
     except ValueError as ve:
         logger.error(f"Validation error in query processing: {str(ve)}")
@@ -174,6 +192,26 @@ async def query_endpoint(
         logger.error(f"Error processing query: {str(e)}", exc_info=True)
         raise HTTPException(status_code=500, detail=f"An error occurred during processing the query: {query}")
 
+@router.get("/admin/profile", response_class=PlainTextResponse)
+async def profile_process(
+    seconds: float = 10.0,
+    interval: float = 0.005,
+    include_idle: bool = False,
+    admin: User = Depends(get_admin_user)
+):
+    """
+    Samples every thread of this worker for the given time and returns collapsed stacks,
+    ready for flamegraph.pl or speedscope.
+    """
+    seconds = min(max(seconds, 0.1), settings.PROFILER_MAX_SECONDS)
+    logger.info(f"Sampling profile of {seconds}s requested by {admin.email}")
+    try:
+        # The sampler runs in a worker thread, so the event loop shows up in the samples
+        stacks = await asyncio.to_thread(sample_stacks, seconds, max(interval, 0.001), include_idle)
+    except ProfilerBusy as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    return PlainTextResponse(collapsed(stacks))
+
 @router.post("/uploadfile")
 @inject
 async def upload_files(
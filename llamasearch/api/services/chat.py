@@ -8,7 +8,8 @@ from typing import List
 from sqlalchemy.exc import SQLAlchemyError
 from fastapi import HTTPException
 from pydantic import parse_obj_as
-from sqlalchemy import select, desc
+from sqlalchemy import select, desc, func, and_
+from sqlalchemy.orm import aliased
 
 class ChatService:
     @staticmethod
@@ -46,37 +47,49 @@ class ChatService:
             raise HTTPException(status_code=500, detail="An unexpected error occurred")
 
     @staticmethod
-    async def get_user_chats(db: DBSession, uid: str, skip: int = 0, limit: int = 10) -> List[ChatListResponse]:
-        result = await db.execute(select(User).filter(User.id == uid))
-        user = result.scalar_one_or_none()
-        if not user:
-            raise ValueError("User not found")
+    async def get_user_chats(db: DBSession, firebase_uid: str, skip: int = 0, limit: int = 10) -> List[ChatListResponse]:
+        """
+        Returns a page of the user's chats, most recently updated first, each with its last message.
 
-        result = await db.execute(
+        Runs as a single query: the page of chats is outer joined to the messages of those chats
+        ranked by sequence_number with a window function, keeping only the latest per chat.
+        """
+        page = (
             select(Chat)
-            .filter(Chat.user_id == user.id)
+            .filter(Chat.user_id == firebase_uid)
             .order_by(desc(Chat.updated_at))
             .offset(skip)
             .limit(limit)
+            .subquery()
         )
-        chats = result.scalars().all()
-        chat_responses = []
-        for chat in chats:
-            result = await db.execute(
-                select(Message)
-                .filter(Message.chat_id == chat.id)
-                .order_by(desc(Message.sequence_number))
-                .limit(1)
+        ranked = (
+            select(
+                Message,
+                func.row_number().over(
+                    partition_by=Message.chat_id,
+                    order_by=desc(Message.sequence_number)
+                ).label("rank")
             )
-            last_message = result.scalar_one_or_none()
-            chat_responses.append(ChatListResponse(
+            .filter(Message.chat_id.in_(select(page.c.id)))
+            .subquery()
+        )
+        chat = aliased(Chat, page)
+        last_message = aliased(Message, ranked)
+        result = await db.execute(
+            select(chat, last_message)
+            .outerjoin(last_message, and_(last_message.chat_id == chat.id, ranked.c.rank == 1))
+            .order_by(desc(chat.updated_at))
+        )
+        return [
+            ChatListResponse(
                 id=chat.id,
                 user_id=chat.user_id,
                 created_at=chat.created_at,
                 updated_at=chat.updated_at,
-                last_message=MessageResponse.from_orm(last_message) if last_message else None
-            ))
-        return chat_responses
+                last_message=MessageResponse.from_orm(message) if message else None
+            )
+            for chat, message in result.all()
+        ]
 
     @staticmethod
     async def get_chat(db: DBSession, chat_id: str) -> ChatResponse:
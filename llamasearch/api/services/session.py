@@ -1,6 +1,9 @@
 # app/services/session.py
 from llamasearch.api.db.models import Session, User
 from llamasearch.api.services.user import user_to_pydantic, UserService
+from llamasearch.api.core.config import settings
+from llamasearch.api.schemas.user import User as UserSchema
+from llamasearch.cache import LRUCache
 from llamasearch.logger import logger
 from sqlalchemy.ext.asyncio import AsyncSession as DBSession
 from sqlalchemy.sql import func
@@ -11,6 +14,8 @@ from typing import Optional
 class SessionService:
     def __init__(self):
         self.redis_client = None
+        # Shared by SessionMiddleware and the auth dependencies, so a request validates its session once
+        self.session_cache = LRUCache(max_entries=settings.SESSION_CACHE_SIZE, ttl=settings.SESSION_CACHE_TTL, name="session")
 
     def init_redis(self, redis_client):
         self.redis_client = redis_client
@@ -21,7 +26,7 @@ class SessionService:
         db.add(session)
         await db.commit()
         if self.redis_client:
-            self.redis_client.setex(f"session:{session_id}", 3600, str(user_id))  # 1 hour expiry
+            await self.redis_client.setex(f"session:{session_id}", 3600, str(user_id))  # 1 hour expiry
         return session_id
 
     async def get_user_session(self, db: DBSession, session_id: str) -> Optional[User]:
@@ -34,9 +39,15 @@ class SessionService:
                 return user_to_pydantic(user)
         return None
 
+    def get_cached_user(self, session_id: str) -> Optional[UserSchema]:
+        return self.session_cache.get(session_id)
+
     async def validate_session(self, db: DBSession, session_id: str) -> Optional[User]:
+        cached_user = self.get_cached_user(session_id)
+        if cached_user is not None:
+            return cached_user
         if self.redis_client:
-            user_id = self.redis_client.get(f"session:{session_id}")
+            user_id = await self.redis_client.get(f"session:{session_id}")
             if not user_id:
                 return None
             user = await db.execute(select(User).filter(User.id == user_id.decode()))
@@ -55,12 +66,15 @@ class SessionService:
                 db_session.last_activity = func.now()
                 await db.commit()
             logger.info(f"Session validated and refreshed: {session_id}")
-            return user_to_pydantic(user)
+            user = user_to_pydantic(user)
+            self.session_cache.set(session_id, user)
+            return user
         return None
 
     async def end_session(self, db: DBSession, session_id: str):
+        self.session_cache.pop(session_id)
         if self.redis_client:
-            self.redis_client.delete(f"session:{session_id}")
+            await self.redis_client.delete(f"session:{session_id}")
         result = await db.execute(select(Session).filter(Session.id == session_id))
         db_session = result.scalar_one_or_none()
         if db_session:
@@ -72,8 +86,10 @@ class SessionService:
         db_sessions = result.scalars().all()
         for session in db_sessions:
             session.ended_at = func.now()
-            if self.redis_client:
-                self.redis_client.delete(f"session:{session.id}")
+            self.session_cache.pop(session.id)
+        if self.redis_client and db_sessions:
+            # One round trip for all of the user's sessions
+            await self.redis_client.delete(*(f"session:{session.id}" for session in db_sessions))
         await db.commit()
 
 session_service = SessionService()
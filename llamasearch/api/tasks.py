@@ -1,9 +1,14 @@
 # tasks.py
+from sqlalchemy import insert
 from sqlalchemy.ext.asyncio import AsyncSession
+import asyncio
+import time
 import traceback
+from llamasearch.api.core.config import settings
 from llamasearch.api.db.models import QueryLog
+from llamasearch.api.db.session import sessionmanager
 from llamasearch.logger import logger
-from typing import Dict, Any
+from typing import Dict, Any, List, Optional
 
 async def log_query_task(db: AsyncSession, firebase_uid: str, query: str, context: Dict[str, Any], response: str):
     try:
@@ -21,4 +26,107 @@ async def log_query_task(db: AsyncSession, firebase_uid: str, query: str, contex
         await db.rollback()
         logger.error(f"Error logging query for user {firebase_uid}: {str(e)}")
         logger.exception("Traceback:")
-        raise
\ No newline at end of file
+        raise
+
+_STOP = object()
+
+class QueryLogWriter:
+    """
+    Writes query logs in batches from a background task.
+
+    Requests only enqueue a row. The writer inserts whatever has accumulated once
+    batch_size rows are waiting or flush_interval seconds have passed since the first one,
+    in a single statement on its own DB session. The queue is bounded: when the database
+    falls that far behind, new rows are dropped with a warning rather than held in memory.
+    """
+    def __init__(self, batch_size: int = settings.QUERY_LOG_BATCH_SIZE,
+                 flush_interval: float = settings.QUERY_LOG_FLUSH_INTERVAL,
+                 max_queue_size: int = settings.QUERY_LOG_QUEUE_SIZE):
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_queue_size = max_queue_size
+        self.dropped = 0
+        self._queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+        self._accepting = False
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    def start(self):
+        if self.running:
+            return
+        self._queue = asyncio.Queue(maxsize=self.max_queue_size)
+        self._task = asyncio.create_task(self._run())
+        self._accepting = True
+        logger.info("Query log writer started")
+
+    async def stop(self):
+        """Writes everything still queued, then stops the background task."""
+        if not self.running:
+            return
+        self._accepting = False
+        await self._queue.put(_STOP)
+        await self._task
+        self._task = None
+        logger.info(f"Query log writer stopped ({self.dropped} rows dropped since start)")
+
+    def submit(self, firebase_uid: str, query: str, context: Any, response: str) -> bool:
+        """Queues a row without waiting. Returns False if the writer is stopped or full."""
+        if not self._accepting:
+            return False
+        try:
+            self._queue.put_nowait({
+                "firebase_uid": firebase_uid,
+                "query": query,
+                "context": context,
+                "response": response,
+            })
+            return True
+        except asyncio.QueueFull:
+            self.dropped += 1
+            logger.warning(f"Query log queue full, dropping log for user {firebase_uid}")
+            return False
+
+    async def _run(self):
+        stopping = False
+        while not stopping:
+            row = await self._queue_get(None)
+            if row is _STOP:
+                break
+            batch = [row]
+            deadline = time.monotonic() + self.flush_interval
+            while len(batch) < self.batch_size:
+                row = await self._queue_get(deadline - time.monotonic())
+                if row is None:
+                    break
+                if row is _STOP:
+                    stopping = True
+                    break
+                batch.append(row)
+            await self._write(batch)
+
+    async def _queue_get(self, timeout: Optional[float]):
+        try:
+            return self._queue.get_nowait()
+        except asyncio.QueueEmpty:
+            pass
+        if timeout is None:
+            return await self._queue.get()
+        try:
+            return await asyncio.wait_for(self._queue.get(), max(timeout, 0))
+        except asyncio.TimeoutError:
+            return None
+
+    async def _write(self, rows: List[Dict[str, Any]]):
+        try:
+            async with sessionmanager.session_factory() as db:
+                await db.execute(insert(QueryLog), rows)
+                await db.commit()
+            logger.debug(f"Wrote {len(rows)} query logs")
+        except Exception as e:
+            logger.error(f"Error writing {len(rows)} query logs: {str(e)}")
+            logger.debug(traceback.format_exc())
+
+query_log_writer = QueryLogWriter()
@@ -6,38 +6,54 @@ from typing import Dict, List, Union
 from fastapi import HTTPException
 from llamasearch.logger import logger
 from llamasearch.settings import config
+from llamasearch.content_store import content_store
 from starlette.datastructures import UploadFile
 import base64
+import uuid
 
 CHUNK_SIZE = 64 * 1024  # 64KB chunks
 PARTIAL_MD5_SIZE = 8 * 1024  # 8KB for partial MD5
+# Uploads in progress live in a hidden subdirectory so the document reader never picks them up
+UPLOAD_TMP_SUBDIR = ".uploads"
 
 async def handle_file_upload(files: List[Union[UploadFile, Dict[str, Union[str, bytes]]]], user_upload_dir: str) -> List[Dict[str, str]]:
     if not files:
         raise ValueError("No files provided for upload")
 
     async def process_file(file: Union[UploadFile, Dict[str, Union[str, bytes]]]):
+        tmp_path = None
         try:
             if isinstance(file, dict):
                 original_filename = file.get('name')
                 content = base64.b64decode(file.get('content')) if isinstance(file.get('content'), str) else file.get('content')
+                if not content:
+                    raise ValueError("Invalid file data: empty content")
             elif isinstance(file, UploadFile):
                 original_filename = file.filename
-                content = await file.read()
+                content = None
             else:
                 raise ValueError(f"Unsupported file type: {type(file)}")
 
-            if not content:
-                raise ValueError("Invalid file data: empty content")
             if not original_filename:
                 raise ValueError("Filename is missing")
 
             file_location = os.path.join(user_upload_dir, original_filename)
             logger.info(f"Uploading file {original_filename} to {file_location}")
 
+            # Stream into a temp file next to the destination so the final rename is atomic
+            tmp_dir = os.path.join(user_upload_dir, UPLOAD_TMP_SUBDIR)
+            os.makedirs(tmp_dir, exist_ok=True)
+            hasher = hashlib.sha256()
+            tmp_path = await handle_chunked_file_upload(
+                _iter_upload_chunks(file if content is None else content),
+                f"{uuid.uuid4().hex}.part", tmp_dir, hasher=hasher
+            )
+            if os.path.getsize(tmp_path) == 0:
+                raise ValueError("Invalid file data: empty content")
+
             if os.path.exists(file_location):
                 existing_size, existing_md5 = await get_file_size_and_partial_md5(file_location)
-                new_size, new_md5 = len(content), hashlib.md5(content).hexdigest()
+                new_size, new_md5 = await get_file_size_and_partial_md5(tmp_path)
                 if existing_size == new_size and existing_md5 == new_md5:
                     logger.info(f"File {original_filename} already exists and content is identical")
                     return {
@@ -55,15 +71,17 @@ async def handle_file_upload(files: List[Union[UploadFile, Dict[str, Union[str,
                         "location": file_location
                     }
 
-            async with aiofiles.open(file_location, "wb") as file_object:
-                await file_object.write(content)
+            digest = hasher.hexdigest()
+            await store_upload(tmp_path, digest, file_location)
+            tmp_path = None
 
             logger.info(f"File {original_filename} uploaded successfully to {file_location}")
             return {
                 "filename": original_filename,
                 "status": "success",
                 "info": "File uploaded successfully",
-                "location": file_location
+                "location": file_location,
+                "sha256": digest
             }
         except ValueError as e:
             logger.error(f"Error processing file {original_filename if 'original_filename' in locals() else 'unknown'}: {str(e)}")
@@ -81,6 +99,9 @@ async def handle_file_upload(files: List[Union[UploadFile, Dict[str, Union[str,
                 "info": f"Error uploading file: {str(e)}",
                 "location": None
             }
+        finally:
+            if tmp_path is not None and os.path.exists(tmp_path):
+                os.remove(tmp_path)
 
     try:
         tasks = [process_file(file) for file in files]
@@ -90,55 +111,93 @@ async def handle_file_upload(files: List[Union[UploadFile, Dict[str, Union[str,
         logger.error(f"Error in file upload process: {str(e)}")
         raise HTTPException(status_code=500, detail=f"An error occurred during the file upload process: {str(e)}")
 
-async def handle_chunked_file_upload(chunk_generator, filename, user_upload_dir):
+async def store_upload(tmp_path: str, digest: str, file_location: str):
+    """Moves a fully written upload into the content store and links it at file_location."""
+    await asyncio.to_thread(content_store.store, tmp_path, digest, file_location)
+
+async def handle_chunked_file_upload(chunk_generator, filename, user_upload_dir, offset: int = 0, hasher=None):
+    """
+    Writes chunks to disk as they arrive instead of buffering the whole file.
+
+    Bytes before offset are kept, so an interrupted upload can be resumed by calling this
+    again with the number of bytes already on disk. Each chunk is fed to hasher if given.
+    """
     file_path = os.path.join(user_upload_dir, filename)
-    async with aiofiles.open(file_path, 'wb') as f:
+    mode = 'r+b' if offset and os.path.exists(file_path) else 'wb'
+    async with aiofiles.open(file_path, mode) as f:
+        if mode == 'r+b':
+            await f.seek(offset)
+            await f.truncate()
         async for chunk in chunk_generator:
             await f.write(chunk)
+            if hasher is not None:
+                hasher.update(chunk)
     return file_path
 
-async def get_file_size_and_partial_md5(file: Union[str, UploadFile, Dict[str, Union[str, bytes]]]) -> tuple:
-    if isinstance(file, str):
-        file_size = os.path.getsize(file)
-        async with aiofiles.open(file, mode='rb') as f:
-            content = await f.read()
-    elif isinstance(file, UploadFile):
-        content = await file.read()
-        file_size = len(content)
-        await file.seek(0)
-    elif isinstance(file, dict):
-        content = file['content']
-        file_size = len(content)
+async def _iter_upload_chunks(source: Union[UploadFile, bytes]):
+    """Yields CHUNK_SIZE blocks, reading an UploadFile incrementally instead of all at once."""
+    if isinstance(source, UploadFile):
+        while True:
+            chunk = await source.read(CHUNK_SIZE)
+            if not chunk:
+                break
+            yield chunk
     else:
-        raise ValueError(f"Unsupported file type: {type(file)}")
+        view = memoryview(source)
+        for start in range(0, len(view), CHUNK_SIZE):
+            yield view[start:start + CHUNK_SIZE]
 
+def _partial_md5(f, file_size: int) -> str:
+    """MD5 of the first and last PARTIAL_MD5_SIZE bytes, read with seeks from a binary file object."""
     md5 = hashlib.md5()
+    f.seek(0)
     if file_size <= 2 * PARTIAL_MD5_SIZE:
+        md5.update(f.read(file_size))
+    else:
+        md5.update(f.read(PARTIAL_MD5_SIZE))
+        f.seek(file_size - PARTIAL_MD5_SIZE)
+        md5.update(f.read(PARTIAL_MD5_SIZE))
+    return md5.hexdigest()
+
+def _partial_md5_of_bytes(content: bytes) -> str:
+    md5 = hashlib.md5()
+    if len(content) <= 2 * PARTIAL_MD5_SIZE:
         md5.update(content)
     else:
         md5.update(content[:PARTIAL_MD5_SIZE])
         md5.update(content[-PARTIAL_MD5_SIZE:])
+    return md5.hexdigest()
+
+def _path_size_and_partial_md5(path: str) -> tuple:
+    file_size = os.path.getsize(path)
+    with open(path, 'rb') as f:
+        return file_size, _partial_md5(f, file_size)
+
+def _fileobj_size_and_partial_md5(f) -> tuple:
+    f.seek(0, os.SEEK_END)
+    file_size = f.tell()
+    partial_md5 = _partial_md5(f, file_size)
+    f.seek(0)
+    return file_size, partial_md5
 
-    return file_size, md5.hexdigest()
+async def get_file_size_and_partial_md5(file: Union[str, UploadFile, Dict[str, Union[str, bytes]]]) -> tuple:
+    if isinstance(file, str):
+        return await asyncio.to_thread(_path_size_and_partial_md5, file)
+    elif isinstance(file, UploadFile):
+        return await asyncio.to_thread(_fileobj_size_and_partial_md5, file.file)
+    elif isinstance(file, dict):
+        content = file['content']
+        return len(content), _partial_md5_of_bytes(content)
+    else:
+        raise ValueError(f"Unsupported file type: {type(file)}")
 
 async def get_upload_file_size_and_partial_md5(file: Union[UploadFile, Dict[str, Union[str, bytes]]]) -> tuple:
     if isinstance(file, UploadFile):
-        content = await file.read()
-        await file.seek(0)
+        return await asyncio.to_thread(_fileobj_size_and_partial_md5, file.file)
     elif isinstance(file, dict):
         content = file['content']
         if isinstance(content, str):
             content = content.encode()
+        return len(content), _partial_md5_of_bytes(content)
     else:
         raise ValueError(f"Unsupported file type: {type(file)}")
-
-    file_size = len(content)
-    md5 = hashlib.md5()
-
-    if file_size <= 2 * PARTIAL_MD5_SIZE:
-        md5.update(content)
-    else:
-        md5.update(content[:PARTIAL_MD5_SIZE])
-        md5.update(content[-PARTIAL_MD5_SIZE:])
-
-    return file_size, md5.hexdigest()
\ No newline at end of file
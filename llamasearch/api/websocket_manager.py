@@ -1,12 +1,23 @@
 # websocket_manager.py
-from fastapi import WebSocket, WebSocketDisconnect
-from typing import Dict, Any, Callable, Optional, Tuple
+from fastapi import WebSocket, WebSocketDisconnect, status
+from typing import Dict, Any, AsyncIterator, Callable, Optional, Tuple, Union
 from pydantic import BaseModel
 import asyncio
 import uuid
 import json
 from llamasearch.api.schemas.user import User
+from llamasearch.api.core.config import settings
 from llamasearch.logger import logger
+from llamasearch.prometheus_metrics import WEBSOCKET_CONNECTIONS
+
+try:
+    import orjson
+
+    def dumps(payload: Dict[str, Any]) -> str:
+        return orjson.dumps(payload).decode("utf-8")
+except ImportError:
+    def dumps(payload: Dict[str, Any]) -> str:
+        return json.dumps(payload, ensure_ascii=False, separators=(",", ":"))
 
 #------------------------------------------
 class WSMessage(BaseModel):
@@ -16,42 +27,224 @@ class WSMessage(BaseModel):
 class WSStreamChunk(BaseModel):
     type: str = "chunk"
     content: str
+    query_id: Optional[str] = None
 
 class WSMetadata(BaseModel):
     type: str = "metadata"
     content: Dict[str, Any]
+    query_id: Optional[str] = None
 
 class WSEndStream(BaseModel):
     type: str = "end_stream"
+    query_id: Optional[str] = None
 #------------------------------------------
 
+async def coalesce_tokens(
+    tokens: AsyncIterator[str],
+    max_bytes: int = settings.WS_STREAM_MAX_FRAME_BYTES,
+    max_interval: float = settings.WS_STREAM_FLUSH_INTERVAL,
+) -> AsyncIterator[str]:
+    """
+    Groups streamed tokens into larger text chunks.
+
+    The first token is emitted immediately so time-to-first-token is not delayed. After
+    that a chunk is emitted once it reaches max_bytes, or max_interval seconds after its
+    first token arrived, even if the LLM stalls in between.
+    """
+    loop = asyncio.get_running_loop()
+    iterator = tokens.__aiter__()
+    buffer, size, deadline, first = [], 0, None, True
+    next_token = asyncio.ensure_future(iterator.__anext__())
+    try:
+        while True:
+            timeout = max(0.0, deadline - loop.time()) if buffer else None
+            done, _ = await asyncio.wait({next_token}, timeout=timeout)
+            if not done:
+                yield "".join(buffer)
+                buffer, size = [], 0
+                continue
+            try:
+                token = next_token.result()
+            except StopAsyncIteration:
+                break
+            next_token = asyncio.ensure_future(iterator.__anext__())
+            if first:
+                first = False
+                yield token
+                continue
+            if not buffer:
+                deadline = loop.time() + max_interval
+            buffer.append(token)
+            size += len(token.encode("utf-8"))
+            if size >= max_bytes:
+                yield "".join(buffer)
+                buffer, size = [], 0
+        if buffer:
+            yield "".join(buffer)
+    finally:
+        # Propagate early exit (client gone, query cancelled) to the token producer
+        if not next_token.done():
+            next_token.cancel()
+            await asyncio.gather(next_token, return_exceptions=True)
+        if hasattr(iterator, "aclose"):
+            await iterator.aclose()
+
+# Sentinel telling a writer's sender task to stop after flushing queued frames
+_CLOSE_WRITER = object()
+
+class WebSocketStreamWriter:
+    """
+    Serialises frames for one connection and sends them from a dedicated task.
+
+    Frames go through a bounded queue, so a slow client blocks only the producers writing
+    to it (backpressure) rather than the event loop. A client that does not drain a frame
+    within send_timeout is treated as gone and the connection is closed.
+    """
+    def __init__(self, websocket: WebSocket,
+                 max_queued_frames: int = settings.WS_SEND_QUEUE_SIZE,
+                 send_timeout: float = settings.WS_SEND_TIMEOUT):
+        self.websocket = websocket
+        self.send_timeout = send_timeout
+        self._queue: asyncio.Queue = asyncio.Queue(maxsize=max_queued_frames)
+        self._sender: Optional[asyncio.Task] = None
+        self.closed = False
+
+    def start(self):
+        if self._sender is None:
+            self._sender = asyncio.create_task(self._run())
+
+    async def send(self, payload: Union[BaseModel, Dict[str, Any]]):
+        if self.closed:
+            raise WebSocketDisconnect(code=status.WS_1011_INTERNAL_ERROR)
+        if isinstance(payload, BaseModel):
+            payload = payload.dict()
+        try:
+            await asyncio.wait_for(self._queue.put(dumps(payload)), timeout=self.send_timeout)
+        except asyncio.TimeoutError:
+            logger.warning("WebSocket send queue stayed full, dropping slow client")
+            await self.close()
+            raise WebSocketDisconnect(code=status.WS_1011_INTERNAL_ERROR)
+
+    def send_nowait(self, payload: Dict[str, Any]) -> bool:
+        """Best-effort send for frames that may be dropped (e.g. pings), returns False if dropped."""
+        if self.closed:
+            return False
+        try:
+            self._queue.put_nowait(dumps(payload))
+            return True
+        except asyncio.QueueFull:
+            return False
+
+    async def stream(self, tokens: AsyncIterator[str], query_id: Optional[str] = None):
+        """Sends tokens as coalesced chunk frames followed by an end_stream frame."""
+        async for chunk in coalesce_tokens(tokens):
+            await self.send({"type": "chunk", "content": chunk, "query_id": query_id})
+        await self.send(WSEndStream(query_id=query_id))
+
+    async def _run(self):
+        try:
+            while True:
+                frame = await self._queue.get()
+                if frame is _CLOSE_WRITER:
+                    return
+                await asyncio.wait_for(self.websocket.send_text(frame), timeout=self.send_timeout)
+        except asyncio.TimeoutError:
+            logger.warning("WebSocket send timed out, closing connection")
+            await self._close_socket(status.WS_1011_INTERNAL_ERROR)
+        except asyncio.CancelledError:
+            pass
+        except Exception as e:
+            logger.debug(f"WebSocket sender stopped: {e}")
+        finally:
+            self.closed = True
+
+    async def _close_socket(self, code: int):
+        try:
+            await self.websocket.close(code=code)
+        except Exception:
+            pass
+
+    async def close(self):
+        if self._sender is None or self._sender.done():
+            self.closed = True
+            return
+        self.closed = True
+        try:
+            self._queue.put_nowait(_CLOSE_WRITER)
+        except asyncio.QueueFull:
+            # Pending frames cannot be delivered in time anyway
+            self._sender.cancel()
+        await asyncio.gather(self._sender, return_exceptions=True)
+
 class ConnectionManager:
     def __init__(self):
+        # Keyed by client_id, one per socket, so a user's tabs never share a writer or queue
         self.active_connections: Dict[str, Tuple[WebSocket, User]] = {}
         self.message_queues: Dict[str, asyncio.Queue] = {}
         self.users: Dict[str, User] = {}
+        self.writers: Dict[str, WebSocketStreamWriter] = {}
+        # Keyed by firebase_uid: the user's open connections and in-flight queries across all of them
+        self.user_connections: Dict[str, Dict[str, None]] = {}
+        self.query_slots: Dict[str, int] = {}
+
+    async def connect(self, websocket: WebSocket, user: User, client_id: Optional[str] = None) -> str:
+        """
+        Registers an authenticated socket and returns its client_id.
 
-    async def connect(self, websocket: WebSocket, user: User) -> str:
-        client_id = user.firebase_uid
-        #client_id = str(uuid.uuid4())
+        Passing the client_id of a socket that re-authenticates keeps its id and writer, so
+        queries already streaming on it are not cut off.
+        """
+        connection = self.active_connections.get(client_id) if client_id else None
+        if connection is None or connection[0] is not websocket:
+            client_id = str(uuid.uuid4())
+            writer = WebSocketStreamWriter(websocket)
+            writer.start()
+            self.writers[client_id] = writer
+            self.message_queues[client_id] = asyncio.Queue()
+        else:
+            self._forget_user_connection(connection[1].firebase_uid, client_id)
         self.active_connections[client_id] = (websocket, user)
-        self.message_queues[client_id] = asyncio.Queue()
         self.users[client_id] = user
+        self.user_connections.setdefault(user.firebase_uid, {})[client_id] = None
+        WEBSOCKET_CONNECTIONS.set(len(self.active_connections))
         return client_id
 
+    def _forget_user_connection(self, firebase_uid: str, client_id: str):
+        client_ids = self.user_connections.get(firebase_uid)
+        if client_ids is not None:
+            client_ids.pop(client_id, None)
+            if not client_ids:
+                del self.user_connections[firebase_uid]
+
+    def get_writer(self, client_id: str) -> Optional[WebSocketStreamWriter]:
+        return self.writers.get(client_id)
+
+    def try_acquire_query_slot(self, firebase_uid: str) -> bool:
+        """Reserves a slot for a new query, False if the user is at WS_MAX_CONCURRENT_QUERIES."""
+        in_flight = self.query_slots.get(firebase_uid, 0)
+        if in_flight >= settings.WS_MAX_CONCURRENT_QUERIES:
+            return False
+        self.query_slots[firebase_uid] = in_flight + 1
+        return True
+
+    def release_query_slot(self, firebase_uid: str):
+        in_flight = self.query_slots.get(firebase_uid, 0) - 1
+        if in_flight > 0:
+            self.query_slots[firebase_uid] = in_flight
+        else:
+            self.query_slots.pop(firebase_uid, None)
+
     async def heartbeat(self):
         while True:
-            for client_id, (websocket, _) in self.active_connections.items():
-                try:
-                    await websocket.send_json({"type": "ping"})
-                except Exception:
+            for client_id, writer in list(self.writers.items()):
+                if not writer.send_nowait({"type": "ping"}) and writer.closed:
                     await self.disconnect(client_id)
             await asyncio.sleep(30)  # Send heartbeat every 30 seconds
 
     async def send_upload_progress(self, client_id: str, filename: str, progress: float):
-        if client_id in self.active_connections:
-            websocket, _ = self.active_connections[client_id]
-            await websocket.send_json({
+        writer = self.writers.get(client_id)
+        if writer is not None:
+            await writer.send({
                 "type": "upload_progress",
                 "filename": filename,
                 "progress": progress
@@ -62,40 +255,56 @@ class ConnectionManager:
         return connection[1] if connection else None
     
     def get_connection(self, firebase_uid: str) -> Optional[Tuple[WebSocket, User]]:
-        return self.active_connections.get(firebase_uid)
+        """The user's most recently opened connection, if any."""
+        client_ids = self.user_connections.get(firebase_uid)
+        if not client_ids:
+            return None
+        return self.active_connections.get(next(reversed(client_ids)))
 
-    async def disconnect(self, client_id: str):
+    async def disconnect(self, client_id: str, websocket: Optional[WebSocket] = None):
+        connection = self.active_connections.get(client_id)
+        if websocket is not None and connection is not None and connection[0] is not websocket:
+            return
         self.active_connections.pop(client_id, None)
+        WEBSOCKET_CONNECTIONS.set(len(self.active_connections))
+        if connection is not None:
+            self._forget_user_connection(connection[1].firebase_uid, client_id)
         self.message_queues.pop(client_id, None)
         self.users.pop(client_id, None)
+        writer = self.writers.pop(client_id, None)
+        if writer is not None:
+            await writer.close()
         logger.info(f"Client {client_id} disconnected")
 
     async def broadcast(self, message: str):
+        # Non-blocking per client, a slow connection drops the message instead of stalling the rest
         disconnected_clients = []
-        for client_id, connection in self.active_connections.items():
-            try:
-                await connection.send_text(message)
-            except WebSocketDisconnect:
+        for client_id, writer in list(self.writers.items()):
+            if not writer.send_nowait({"type": "broadcast", "content": message}) and writer.closed:
                 disconnected_clients.append(client_id)
-        
+
         for client_id in disconnected_clients:
             await self.handle_disconnect(client_id)
 
-    async def stream_response(self, response: str, client_id: str):
-        if client_id not in self.active_connections:
+    async def stream_response(self, response: Union[str, AsyncIterator[str]], client_id: str):
+        writer = self.writers.get(client_id)
+        if writer is None:
             logger.error(f"Client {client_id} not found in active connections")
             return
 
-        websocket, _ = self.active_connections[client_id]
+        if isinstance(response, str):
+            response = self._single_chunk(response)
         try:
-            for chunk in response.split():  # Split response into words for demonstration
-                await websocket.send_json(WSStreamChunk(content=chunk).dict())
-            await websocket.send_json(WSEndStream().dict())
+            await writer.stream(response)
         except WebSocketDisconnect:
             await self.disconnect(client_id)
         except Exception as e:
             logger.error(f"Error streaming response for client {client_id}: {e}")
-            await websocket.send_json(WSMessage(type="error", content={"error": str(e)}).dict())
+            writer.send_nowait(WSMessage(type="error", content={"error": str(e)}).dict())
+
+    @staticmethod
+    async def _single_chunk(response: str) -> AsyncIterator[str]:
+        yield response
 
     def _default_streamer(self, response: Any):
         if isinstance(response, str):
@@ -132,8 +341,7 @@ class ConnectionManager:
             await self.handle_disconnect(client_id)
 
     async def handle_disconnect(self, client_id: str):
-        self.disconnect(client_id)
-        logger.info(f"Client {client_id} disconnected")
+        await self.disconnect(client_id)
 
 websocket_manager = ConnectionManager()
 
@@ -2,14 +2,18 @@
 from fastapi import APIRouter, Depends, HTTPException, Request, Response, File, UploadFile, Form, BackgroundTasks, WebSocket, WebSocketDisconnect, status
 from sqlalchemy.ext.asyncio import AsyncSession
 from dependency_injector.wiring import inject, Provide
-from llamasearch.api.websocket_manager import get_websocket_manager, WSMessage, WSStreamChunk, WSMetadata, WSEndStream
+from llamasearch.api.websocket_manager import get_websocket_manager, WebSocketStreamWriter, WSMessage, WSMetadata
 from llamasearch.api.core.security import get_current_user_ws
 from llamasearch.api.core.container import Container
-from llamasearch.api.db.session import get_db
-from llamasearch.api.query_processor import process_query
+from llamasearch.api.db.session import get_db, sessionmanager
+from llamasearch.api.core.config import settings
+from llamasearch.api.query_processor import stream_query
 from llamasearch.logger import logger
 from llamasearch.api.utils import handle_file_upload
+from llamasearch.api.ws_uploads import ChunkedUploadManager
 import asyncio
+import uuid
+from functools import partial
 import os, re
 import json
 from pydantic import BaseModel
@@ -22,10 +26,14 @@ class WSQueryRequest(BaseModel):
     query: str
     files: Optional[List[Dict[str, Union[str, bytes]]]] = None
     session_id: str
+    query_id: Optional[str] = None
+    # Ids of files sent beforehand with the binary chunked upload protocol
+    upload_ids: Optional[List[str]] = None
 
 class WSQueryResponse(BaseModel):
     type: str
     content: Union[str, Dict[str, Any]]
+    query_id: Optional[str] = None
 
 @ws_router.websocket("/ws")
 @inject
@@ -34,11 +42,16 @@ async def websocket_endpoint(
     db: AsyncSession = Depends(get_db),
     pipeline_factory = Depends(Provide[Container.pipeline_factory])
 ):
+    websocket_manager = get_websocket_manager()
+    user = None
+    client_id = None
+    # This connection's writer, looked up once so every frame goes to this socket
+    writer: Optional[WebSocketStreamWriter] = None
+    # Queries run as their own tasks so the receive loop stays free for new queries and cancels
+    query_tasks: Dict[str, asyncio.Task] = {}
+    uploads: Optional[ChunkedUploadManager] = None
     try:
-        websocket_manager = get_websocket_manager()
         await websocket.accept()
-        user = None
-        client_id = None
 
         while True:
             message = await websocket.receive()
@@ -47,12 +60,47 @@ async def websocket_endpoint(
             if message["type"] == "websocket.disconnect":
                 break
 
-            if message["type"] == "websocket.receive":
+            if message["type"] == "websocket.receive" and message.get("bytes") is not None:
+                if uploads is None:
+                    await websocket.send_json({"type": "error", "content": "Not authenticated"})
+                    continue
+                try:
+                    await uploads.receive_chunk(message["bytes"])
+                except ValueError as e:
+                    logger.error(f"Upload chunk rejected for client {client_id}: {str(e)}")
+                    await writer.send({"type": "upload_error", "content": {"error": str(e)}})
+
+            elif message["type"] == "websocket.receive":
                 data = json.loads(message["text"])
 
                 if data['type'] == 'auth':
                     user, session_id = await handle_auth(websocket, db, data)
-                    client_id = await websocket_manager.connect(websocket, user)
+                    client_id = await websocket_manager.connect(websocket, user, client_id)
+                    writer = websocket_manager.get_writer(client_id)
+                    if uploads is not None:
+                        await uploads.suspend_all()
+                    uploads = ChunkedUploadManager(
+                        send=writer.send,
+                        on_progress=partial(websocket_manager.send_upload_progress, client_id)
+                    )
+
+                elif data['type'] in ('upload_begin', 'upload_end', 'upload_abort'):
+                    if uploads is None:
+                        await websocket.send_json({"type": "error", "content": "Not authenticated"})
+                        continue
+                    try:
+                        if data['type'] == 'upload_begin':
+                            pipeline = await pipeline_factory.get_or_create_pipeline_async(user.firebase_uid, user.tenant_id)
+                            await uploads.begin(data, pipeline.config.application.data_path)
+                        elif data['type'] == 'upload_end':
+                            await uploads.end(data)
+                        else:
+                            await uploads.abort(data)
+                    except (ValueError, KeyError) as e:
+                        logger.error(f"Upload {data.get('upload_id')} failed for client {client_id}: {str(e)}")
+                        await writer.send({
+                            "type": "upload_error", "upload_id": data.get('upload_id'), "content": {"error": str(e)}
+                        })
 
                 elif data['type'] == 'query':
                     if not user or not client_id:
@@ -72,37 +120,89 @@ async def websocket_endpoint(
                                 "invalid_files": [file['name'] for file in invalid_files]
                             }
                         }
-                        await websocket.send_json(error_response)
+                        await writer.send(error_response)
                         continue
 
-                    result = await process_query_request(websocket, user, query_data, files, db, pipeline_factory, client_id)
+                    query_id = query_data.query_id or str(uuid.uuid4())
+                    if query_id in query_tasks:
+                        await writer.send({"type": "error", "query_id": query_id, "content": {"error": "Duplicate query_id"}})
+                        continue
+                    if not websocket_manager.try_acquire_query_slot(user.firebase_uid):
+                        await writer.send({
+                            "type": "error",
+                            "query_id": query_id,
+                            "content": {"error": f"Too many concurrent queries (limit {settings.WS_MAX_CONCURRENT_QUERIES})"}
+                        })
+                        continue
+                    try:
+                        uploaded = uploads.claim(query_data.upload_ids)
+                    except ValueError as e:
+                        websocket_manager.release_query_slot(user.firebase_uid)
+                        await writer.send({"type": "error", "query_id": query_id, "content": {"error": str(e)}})
+                        continue
+                    query_data.query_id = query_id
+                    await writer.send({"type": "query_accepted", "query_id": query_id})
+                    task = asyncio.create_task(
+                        run_query_task(writer, user, query_data, files, pipeline_factory, client_id, uploaded)
+                    )
+                    query_tasks[query_id] = task
+                    task.add_done_callback(
+                        lambda _, query_id=query_id, uid=user.firebase_uid: (
+                            query_tasks.pop(query_id, None), websocket_manager.release_query_slot(uid)
+                        )
+                    )
 
-                    # Send metadata
-                    await websocket.send_json(WSMetadata(content=result.content["metadata"]).dict()) 
-                    # Stream response
-                    response = result.content["response"]
-                    for char in response:
-                        await websocket.send_json(WSStreamChunk(content=char).dict())
-                    # Send end of stream
-                    await websocket.send_json(WSEndStream().dict())
+                elif data['type'] == 'cancel':
+                    if not client_id:
+                        await websocket.send_json({"type": "error", "content": "Not authenticated"})
+                        continue
+                    task = query_tasks.get(data.get('query_id'))
+                    if task is None:
+                        await writer.send({
+                            "type": "error", "query_id": data.get('query_id'), "content": {"error": "Unknown query_id"}
+                        })
+                        continue
+                    logger.info(f"Cancelling query {data['query_id']} for client {client_id}")
+                    task.cancel()
 
     except WebSocketDisconnect:
         logger.info(f"WebSocket disconnected for client: {client_id if client_id else 'Unknown'}")
     except Exception as e:
         logger.error(f"WebSocket error: {str(e)}", exc_info=True)
         await websocket.close(code=status.WS_1011_INTERNAL_ERROR)
+    finally:
+        # Abort in-flight generation, nobody is left to read it
+        tasks = list(query_tasks.values())
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        if uploads is not None:
+            await uploads.suspend_all()
+        if client_id:
+            await websocket_manager.disconnect(client_id, websocket)
 
 async def handle_auth(websocket, db, data):
     user, session_id = await get_current_user_ws(websocket, db, data.get('token'))
     await websocket.send_json({"type": "authentication_success", "session_id": session_id})
     return user, session_id
 
-async def process_query_request(websocket, user, query_data: WSQueryRequest, files, db, pipeline_factory, client_id):
+async def run_query_task(writer: WebSocketStreamWriter, user, query_data: WSQueryRequest, files, pipeline_factory, client_id, uploaded=None):
+    # Concurrent queries cannot share the connection's AsyncSession
+    async with sessionmanager.session_factory() as db:
+        await stream_query_request(writer, user, query_data, files, db, pipeline_factory, client_id, uploaded)
+
+async def stream_query_request(writer: WebSocketStreamWriter, user, query_data: WSQueryRequest, files, db, pipeline_factory, client_id, uploaded=None):
+    """
+    Runs a query and streams the answer to the client as it is generated.
+
+    Sends one metadata frame, then answer chunks coalesced from LLM tokens, then an
+    end_stream frame. Failures are reported as a single error frame.
+    """
     logger.info(f"Processing query request for client {client_id}: {query_data.query}")
+    file_upload_results = []
     try:
         pipeline = await pipeline_factory.get_or_create_pipeline_async(user.firebase_uid, user.tenant_id)
         user_upload_dir = pipeline.config.application.data_path
-        file_upload_results = []
         file_paths = []
         if files:
             logger.info(f"{len(files)} file(s) received for client {client_id}")
@@ -112,36 +212,45 @@ async def process_query_request(websocket, user, query_data: WSQueryRequest, fil
             logger.debug(f"Files uploaded for client {client_id}: {file_paths}")
         else:
             logger.info(f"No files received for client {client_id}")
-        result = await process_query(
+        if uploaded:
+            # Already on disk via the chunked upload protocol
+            file_paths.extend(result['location'] for result in uploaded)
+            file_upload_results = file_upload_results + uploaded
+        metadata, tokens = await stream_query(
             query=query_data.query,
             user=user,
             db=db,
             pipeline_factory=pipeline_factory,
             file_paths=file_paths
         )
-        response = WSQueryResponse(
-            type="query_response",
-            content={
-                "response": result.get('response', ''),
-                "metadata": {
-                    "query": query_data.query,
-                    "context": result.get('context', []),
-                    "file_upload": file_upload_results
-                }
-            }
-        )
-        return response
+        metadata["file_upload"] = file_upload_results
+        await writer.send(WSMetadata(content=metadata, query_id=query_data.query_id))
+        await writer.stream(tokens, query_id=query_data.query_id)
+    except asyncio.CancelledError:
+        logger.info(f"Query {query_data.query_id} cancelled for client {client_id}")
+        writer.send_nowait({"type": "cancelled", "query_id": query_data.query_id})
+        raise
+    except asyncio.TimeoutError:
+        logger.error(f"Query processing timed out for client {client_id}")
+        await send_query_error(writer, query_data, "Query processing timed out", file_upload_results)
+    except WebSocketDisconnect:
+        raise
     except Exception as e:
-        logger.error(f"Query processing error for client {client_id}: {str(e)}")
-        return WSQueryResponse(
-            type="error",
-            content={
-                "response": '',
-                "metadata": {
-                    "error": str(e),
-                    "query": query_data.query,
-                    "context": result.get('context', []),
-                    "file_upload": []
-                }
+        logger.error(f"Query processing error for client {client_id}: {str(e)}", exc_info=True)
+        await send_query_error(writer, query_data, str(e), file_upload_results)
+
+async def send_query_error(writer: WebSocketStreamWriter, query_data: WSQueryRequest, error: str, file_upload_results):
+    response = WSQueryResponse(
+        type="error",
+        query_id=query_data.query_id,
+        content={
+            "response": '',
+            "metadata": {
+                "error": error,
+                "query": query_data.query,
+                "context": [],
+                "file_upload": file_upload_results
             }
-        )
+        }
+    )
+    await writer.send(response)
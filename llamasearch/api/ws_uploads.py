@@ -0,0 +1,241 @@
+# ws_uploads.py
+import asyncio
+import hashlib
+import os
+import struct
+import uuid
+from typing import Awaitable, Callable, Dict, Optional
+
+from llamasearch.api.core.config import settings
+from llamasearch.api.utils import CHUNK_SIZE, UPLOAD_TMP_SUBDIR, handle_chunked_file_upload, store_upload
+from llamasearch.logger import logger
+from llamasearch.pipeline import ALLOWED_EXTS
+
+# Binary chunk frame: 16-byte upload id (UUID bytes), 8-byte big-endian offset, then the payload
+CHUNK_HEADER = struct.Struct(">16sQ")
+
+# Sentinels telling an upload's writer task to stop
+_END_OF_UPLOAD = object()
+_SUSPEND_UPLOAD = object()
+
+def parse_chunk_frame(frame: bytes):
+    """Splits a binary chunk frame into (upload_id, offset, payload)."""
+    if len(frame) < CHUNK_HEADER.size:
+        raise ValueError("Chunk frame too short")
+    upload_id, offset = CHUNK_HEADER.unpack_from(frame)
+    return str(uuid.UUID(bytes=upload_id)), offset, memoryview(frame)[CHUNK_HEADER.size:]
+
+class ChunkedUpload:
+    """
+    A single file upload received as binary chunk frames.
+
+    Chunks are handed to a writer task running handle_chunked_file_upload through a bounded
+    queue, so the receive loop applies backpressure instead of buffering the file in memory.
+    Bytes land in <upload_dir>/.uploads/<upload_id>.part; a client that reconnects and begins
+    the same upload_id again resumes from the bytes already on disk.
+    """
+    def __init__(self, upload_id: str, filename: str, size: int, upload_dir: str,
+                 sha256: Optional[str] = None,
+                 on_progress: Optional[Callable[[str, float], Awaitable[None]]] = None):
+        self.upload_id = upload_id
+        self.filename = filename
+        self.size = size
+        self.expected_sha256 = sha256.lower() if sha256 else None
+        self.upload_dir = upload_dir
+        self.tmp_dir = os.path.join(upload_dir, UPLOAD_TMP_SUBDIR)
+        self.part_name = f"{upload_id}.part"
+        self.offset = 0
+        self.hasher = hashlib.sha256()
+        self._on_progress = on_progress
+        self._reported_percent = -1
+        self._chunks: asyncio.Queue = asyncio.Queue(maxsize=settings.WS_UPLOAD_QUEUE_SIZE)
+        self._writer: Optional[asyncio.Task] = None
+
+    @property
+    def part_path(self) -> str:
+        return os.path.join(self.tmp_dir, self.part_name)
+
+    async def open(self) -> int:
+        """Starts the writer and returns the offset the client should continue from."""
+        os.makedirs(self.tmp_dir, exist_ok=True)
+        if os.path.exists(self.part_path):
+            existing = min(os.path.getsize(self.part_path), self.size)
+            # The hash state is not persisted, rebuild it from the bytes already received
+            self.offset = await asyncio.to_thread(self._rehash, existing)
+            logger.info(f"Resuming upload {self.upload_id} ({self.filename}) at offset {self.offset}")
+        self._writer = asyncio.create_task(handle_chunked_file_upload(
+            self._iter_chunks(), self.part_name, self.tmp_dir, offset=self.offset, hasher=self.hasher
+        ))
+        return self.offset
+
+    def _rehash(self, length: int) -> int:
+        remaining = length
+        with open(self.part_path, "rb") as f:
+            while remaining:
+                block = f.read(min(CHUNK_SIZE, remaining))
+                if not block:
+                    break
+                self.hasher.update(block)
+                remaining -= len(block)
+        return length - remaining
+
+    async def _iter_chunks(self):
+        while True:
+            chunk = await self._chunks.get()
+            if chunk is _END_OF_UPLOAD or chunk is _SUSPEND_UPLOAD:
+                return
+            yield chunk
+
+    async def write(self, offset: int, payload) -> bool:
+        """Queues a chunk for writing. Returns False if offset is not where the upload stands."""
+        if offset != self.offset:
+            return False
+        if self.offset + len(payload) > self.size:
+            raise ValueError(f"Upload {self.upload_id} exceeds its declared size of {self.size} bytes")
+        if self._writer.done():
+            # Surface the write error, if any
+            self._writer.result()
+            raise ValueError(f"Upload {self.upload_id} is no longer accepting data")
+        await self._chunks.put(bytes(payload))
+        self.offset += len(payload)
+        await self._report_progress()
+        return True
+
+    async def _report_progress(self):
+        percent = int(self.offset * 100 / self.size) if self.size else 100
+        if self._on_progress is not None and percent != self._reported_percent:
+            self._reported_percent = percent
+            await self._on_progress(self.filename, percent)
+
+    async def finish(self) -> Dict[str, str]:
+        """Flushes, verifies size and checksum, and links the stored content into the upload directory."""
+        if self.offset != self.size:
+            raise ValueError(f"Upload {self.upload_id} incomplete: received {self.offset} of {self.size} bytes")
+        await self._chunks.put(_END_OF_UPLOAD)
+        await self._writer
+        digest = self.hasher.hexdigest()
+        if self.expected_sha256 and digest != self.expected_sha256:
+            os.remove(self.part_path)
+            raise ValueError(f"Checksum mismatch for {self.filename}")
+        location = os.path.join(self.upload_dir, self.filename)
+        await store_upload(self.part_path, digest, location)
+        logger.info(f"File {self.filename} uploaded successfully to {location}")
+        return {
+            "filename": self.filename,
+            "status": "success",
+            "info": "File uploaded successfully",
+            "location": location,
+            "sha256": digest,
+        }
+
+    async def suspend(self):
+        """Stops writing but keeps the partial file so the upload can be resumed."""
+        if self._writer is None or self._writer.done():
+            return
+        try:
+            self._chunks.put_nowait(_SUSPEND_UPLOAD)
+        except asyncio.QueueFull:
+            self._writer.cancel()
+        await asyncio.gather(self._writer, return_exceptions=True)
+
+    async def abort(self):
+        await self.suspend()
+        if os.path.exists(self.part_path):
+            os.remove(self.part_path)
+
+class ChunkedUploadManager:
+    """
+    Tracks the chunked uploads of one WebSocket connection.
+
+    Protocol:
+        {"type": "upload_begin", "filename", "size", ["sha256"], ["upload_id"]}
+            -> {"type": "upload_ready", "upload_id", "offset"}
+        binary frames, see CHUNK_HEADER; a frame at the wrong offset is dropped and
+            answered with upload_ready carrying the offset to continue from
+        {"type": "upload_end", "upload_id"}
+            -> {"type": "upload_complete", "upload_id", "result"}
+        {"type": "upload_abort", "upload_id"}
+
+    Completed uploads can then be attached to a query by listing their ids in upload_ids.
+    """
+    def __init__(self, send: Callable[[Dict], Awaitable[None]],
+                 on_progress: Optional[Callable[[str, float], Awaitable[None]]] = None):
+        self._send = send
+        self._on_progress = on_progress
+        self.active: Dict[str, ChunkedUpload] = {}
+        self.completed: Dict[str, Dict[str, str]] = {}
+
+    async def begin(self, data: Dict, upload_dir: str):
+        filename = os.path.basename(data.get('filename') or '')
+        size = data.get('size')
+        if not filename:
+            raise ValueError("Filename is missing")
+        if not isinstance(size, int) or size <= 0:
+            raise ValueError("Invalid file data: size must be a positive integer")
+        if size > settings.FILE_SIZE_LIMIT:
+            raise ValueError(f"File {filename} exceeds the size limit of {settings.FILE_SIZE_LIMIT} bytes")
+        if os.path.splitext(filename)[1].lower() not in ALLOWED_EXTS:
+            raise ValueError(f"File type of {filename} is not supported, allowed types: {', '.join(ALLOWED_EXTS)}")
+        # Client supplied ids must be UUIDs, they are used in file names and frame headers
+        upload_id = str(uuid.UUID(data['upload_id'])) if data.get('upload_id') else str(uuid.uuid4())
+        # Same limit as a multipart upload: uploads not yet attached to a query count against it
+        pending = (set(self.active) | set(self.completed)) - {upload_id}
+        if len(pending) >= settings.MAX_FILES:
+            raise ValueError(f"Number of files exceeds the allowed limit of {settings.MAX_FILES} files")
+
+        previous = self.active.pop(upload_id, None)
+        if previous is not None:
+            await previous.suspend()
+        upload = ChunkedUpload(upload_id, filename, size, upload_dir,
+                               sha256=data.get('sha256'), on_progress=self._on_progress)
+        offset = await upload.open()
+        self.active[upload_id] = upload
+        await self._send({"type": "upload_ready", "upload_id": upload_id, "offset": offset})
+
+    async def receive_chunk(self, frame: bytes):
+        upload_id, offset, payload = parse_chunk_frame(frame)
+        upload = self._get(upload_id)
+        if not await upload.write(offset, payload):
+            logger.debug(f"Out of order chunk for upload {upload_id} at {offset}, expected {upload.offset}")
+            await self._send({"type": "upload_ready", "upload_id": upload_id, "offset": upload.offset})
+
+    async def end(self, data: Dict):
+        upload = self._get(data.get('upload_id'))
+        try:
+            result = await upload.finish()
+        except ValueError:
+            if not os.path.exists(upload.part_path):
+                # Checksum failure, the upload has to start over
+                self.active.pop(upload.upload_id, None)
+            raise
+        self.active.pop(upload.upload_id, None)
+        self.completed[upload.upload_id] = result
+        await self._send({"type": "upload_complete", "upload_id": upload.upload_id, "result": result})
+
+    async def abort(self, data: Dict):
+        upload = self.active.pop(data.get('upload_id'), None)
+        if upload is not None:
+            await upload.abort()
+
+    def claim(self, upload_ids) -> list:
+        """Returns the results of completed uploads, which can only be attached to one query."""
+        upload_ids = list(upload_ids or [])
+        # Check every id before popping any, so a bad id leaves the others claimable
+        for upload_id in upload_ids:
+            if upload_id not in self.completed:
+                raise ValueError(f"Unknown or incomplete upload {upload_id}")
+        if len(set(upload_ids)) != len(upload_ids):
+            raise ValueError("Duplicate upload ids")
+        return [self.completed.pop(upload_id) for upload_id in upload_ids]
+
+    def _get(self, upload_id: Optional[str]) -> ChunkedUpload:
+        upload = self.active.get(upload_id)
+        if upload is None:
+            raise ValueError(f"Unknown upload {upload_id}")
+        return upload
+
+    async def suspend_all(self):
+        """Called on disconnect; partial files stay on disk for a later resume."""
+        uploads = list(self.active.values())
+        self.active.clear()
+        await asyncio.gather(*(upload.suspend() for upload in uploads), return_exceptions=True)
@@ -0,0 +1,179 @@
+import asyncio
+import time
+from typing import Dict, List, Optional, Tuple
+
+from llama_index.core import Settings
+from llama_index.core.indices.utils import async_embed_nodes
+from llama_index.core.schema import BaseNode, MetadataMode
+
+from llamasearch.logger import logger
+from llamasearch.prometheus_metrics import INGESTION_QUEUE_DEPTH
+
+# Sentinel pushed onto the upsert queue once per stream to signal shutdown
+_END_OF_STREAM = object()
+
+class AdaptiveBatchSizer:
+    """
+    Adjusts the embed/upsert batch size from observed batch latency.
+
+    Batches finishing well under the target latency double the size (up to max_size),
+    batches above the target halve it (down to min_size).
+    """
+    def __init__(self, initial_size: int, min_size: int, max_size: int, target_latency: float, enabled: bool = True):
+        self.min_size = max(1, min_size)
+        self.max_size = max(self.min_size, max_size)
+        self.size = min(max(initial_size, self.min_size), self.max_size)
+        self.target_latency = target_latency
+        self.enabled = enabled
+
+    def observe(self, batch_size: int, latency: float):
+        if not self.enabled or batch_size < self.size:
+            # Partial (tail) batches say nothing about the current size
+            return
+        if latency > self.target_latency:
+            self.size = max(self.min_size, self.size // 2)
+        elif latency < self.target_latency / 2:
+            self.size = min(self.max_size, self.size * 2)
+
+class BulkUpsertEngine:
+    """
+    Embeds and upserts nodes into Qdrant with overlapping stages.
+
+    A single producer embeds batch N+1 while `parallelism` upsert streams write earlier
+    batches with `wait=False`. Once every stream has drained, the last batch is re-upserted
+    with `wait=True` as a consistency barrier: Qdrant applies updates to a shard in order,
+    so an acknowledged-and-applied write implies all earlier writes are visible.
+    """
+    def __init__(self, index, vector_store, aclient, vectordb_config, embedding_cache=None):
+        self.index = index
+        self.vector_store = vector_store
+        self.aclient = aclient
+        self.embedding_cache = embedding_cache
+        self.parallelism = max(1, vectordb_config.upsert_parallelism)
+        self.sizer = AdaptiveBatchSizer(
+            initial_size=vectordb_config.batch_size,
+            min_size=vectordb_config.min_batch_size,
+            max_size=vectordb_config.max_batch_size,
+            target_latency=vectordb_config.target_batch_latency,
+            enabled=vectordb_config.adaptive_batch_size,
+        )
+        self._last_points = None
+
+    async def run(self, nodes: List[BaseNode]) -> int:
+        """Index all nodes and return the number of points written."""
+        if not nodes:
+            return 0
+        queue: asyncio.Queue = asyncio.Queue(maxsize=self.parallelism * 2)
+        start_time = time.time()
+        producer = asyncio.create_task(self._produce(nodes, queue))
+        streams = [asyncio.create_task(self._upsert_stream(queue)) for _ in range(self.parallelism)]
+        try:
+            _, *written = await asyncio.gather(producer, *streams)
+        except Exception:
+            # A failed stream would leave the producer blocked on a full queue
+            for task in (producer, *streams):
+                task.cancel()
+            await asyncio.gather(producer, *streams, return_exceptions=True)
+            while not queue.empty():
+                if queue.get_nowait() is not _END_OF_STREAM:
+                    INGESTION_QUEUE_DEPTH.dec()
+            raise
+        written = sum(written)
+        await self._consistency_barrier()
+        elapsed = time.time() - start_time
+        logger.info(f"Bulk upsert wrote {written} points in {elapsed:.2f}s "
+                    f"({written / elapsed if elapsed else 0:.1f} points/s, final batch size {self.sizer.size})")
+        return written
+
+    async def _produce(self, nodes: List[BaseNode], queue: asyncio.Queue):
+        offset = 0
+        while offset < len(nodes):
+            batch = nodes[offset:offset + self.sizer.size]
+            offset += len(batch)
+            embed_start = time.time()
+            id_to_embed_map = await self._embed(batch)
+            for node in batch:
+                node.embedding = id_to_embed_map[node.node_id]
+            if offset == len(batch):
+                await self._prepare_collection(batch)
+            # Blocks when all streams are busy, bounding memory held in embedded batches
+            await queue.put((batch, time.time() - embed_start))
+            INGESTION_QUEUE_DEPTH.inc()
+            logger.debug(f"Embedded {offset}/{len(nodes)} nodes")
+        for _ in range(self.parallelism):
+            await queue.put(_END_OF_STREAM)
+
+    async def _prepare_collection(self, batch: List[BaseNode]):
+        """
+        Does what QdrantVectorStore.async_add does before its first upsert: creates the
+        collection if missing and detects its vector names. A store built on an async-only
+        client (local location mode) cannot detect them in its constructor and assumes the
+        newer sparse vector name.
+        """
+        collection_name = self.vector_store.collection_name
+        if not await self.vector_store._acollection_exists(collection_name):
+            await self.vector_store._acreate_collection(
+                collection_name=collection_name, vector_size=len(batch[0].get_embedding())
+            )
+        await self.vector_store._adetect_vector_format(collection_name)
+
+    async def _embed(self, batch: List[BaseNode]) -> Dict[str, List[float]]:
+        """Embeds a batch, computing only the chunks missing from the embedding cache."""
+        if self.embedding_cache is None:
+            return await async_embed_nodes(batch, Settings.embed_model)
+        model_name = Settings.embed_model.model_name
+        texts = [node.get_content(metadata_mode=MetadataMode.EMBED) for node in batch]
+        cached = await self.embedding_cache.get_many(model_name, texts)
+        id_to_embed_map = {node.node_id: embedding for node, embedding in zip(batch, cached) if embedding is not None}
+        misses = [(node, text) for node, text, embedding in zip(batch, texts, cached) if embedding is None]
+        if misses:
+            computed = await async_embed_nodes([node for node, _ in misses], Settings.embed_model)
+            id_to_embed_map.update(computed)
+            await self.embedding_cache.set_many(
+                model_name, [text for _, text in misses], [computed[node.node_id] for node, _ in misses]
+            )
+        return id_to_embed_map
+
+    async def _upsert_stream(self, queue: asyncio.Queue) -> int:
+        written = 0
+        while True:
+            item = await queue.get()
+            if item is _END_OF_STREAM:
+                return written
+            INGESTION_QUEUE_DEPTH.dec()
+            batch, embed_latency = item
+            upsert_start = time.time()
+            points, ids = await self._build_points(batch)
+            await self.aclient.upsert(
+                collection_name=self.vector_store.collection_name,
+                points=points,
+                wait=False,
+            )
+            self._last_points = points
+            self._add_to_docstore(batch, ids)
+            self.sizer.observe(len(batch), embed_latency + time.time() - upsert_start)
+            written += len(points)
+
+    async def _build_points(self, batch: List[BaseNode]) -> Tuple[List, List[str]]:
+        # Sparse encoding in _build_points is CPU bound, keep it off the event loop
+        return await asyncio.to_thread(
+            self.vector_store._build_points, batch, self.vector_store.sparse_vector_name
+        )
+
+    def _add_to_docstore(self, batch: List[BaseNode], ids: List[str]):
+        """Mirror VectorStoreIndex bookkeeping for store_nodes_override indexes."""
+        for node, new_id in zip(batch, ids):
+            node_without_embedding = node.model_copy()
+            node_without_embedding.embedding = None
+            self.index.index_struct.add_node(node_without_embedding, text_id=new_id)
+            self.index.docstore.add_documents([node_without_embedding], allow_update=True)
+
+    async def _consistency_barrier(self, points: Optional[List] = None):
+        points = points or self._last_points
+        if not points:
+            return
+        await self.aclient.upsert(
+            collection_name=self.vector_store.collection_name,
+            points=points,
+            wait=True,
+        )
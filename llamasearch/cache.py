@@ -0,0 +1,324 @@
+import hashlib
+import time
+from collections import OrderedDict, defaultdict
+from typing import Any, Dict, Hashable, List, Optional
+
+import numpy as np
+import redis.asyncio as aioredis
+from redis.exceptions import RedisError
+
+from llamasearch.settings import config
+from llamasearch.logger import logger
+from llamasearch.prometheus_metrics import CACHE_REQUESTS
+
+def normalize_query(query: str) -> str:
+    """Case-fold and collapse whitespace so trivially different spellings share a cache entry."""
+    return " ".join(query.lower().split())
+
+class LRUCache:
+    """
+    Bounded in-process LRU cache with an optional per-entry TTL and hit/miss counters.
+
+    Named caches also report lookups to the cache_requests_total Prometheus counter.
+    """
+    def __init__(self, max_entries: int = 1024, ttl: Optional[float] = None, name: Optional[str] = None):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self._hit_counter = CACHE_REQUESTS.labels(cache=name, result="hit") if name else None
+        self._miss_counter = CACHE_REQUESTS.labels(cache=name, result="miss") if name else None
+
+    def _miss(self):
+        self.misses += 1
+        if self._miss_counter is not None:
+            self._miss_counter.inc()
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        entry = self._entries.get(key)
+        if entry is None:
+            self._miss()
+            return None
+        value, expires_at = entry
+        if expires_at is not None and expires_at < time.time():
+            del self._entries[key]
+            self._miss()
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        if self._hit_counter is not None:
+            self._hit_counter.inc()
+        return value
+
+    def set(self, key: Hashable, value: Any, ttl: Optional[float] = None):
+        """Stores value, ttl overrides the cache-wide TTL for this entry."""
+        ttl = ttl if ttl is not None else self.ttl
+        expires_at = time.time() + ttl if ttl else None
+        self._entries[key] = (value, expires_at)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def pop(self, key: Hashable):
+        self._entries.pop(key, None)
+
+    def __contains__(self, key: Hashable) -> bool:
+        entry = self._entries.get(key)
+        return entry is not None and (entry[1] is None or entry[1] >= time.time())
+
+    def clear(self):
+        self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+    @property
+    def hit_rate(self) -> float:
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    def stats(self) -> dict:
+        return {"entries": len(self), "hits": self.hits, "misses": self.misses, "hit_rate": round(self.hit_rate, 4)}
+
+class RedisBacked:
+    """
+    Lazily connects to Redis unless a shared client is injected with init_redis.
+
+    The API server injects its pooled client at startup; scripts that run the pipeline
+    directly (evaluation, benchmarks) fall back to a private client built from redis_config.
+    """
+    def __init__(self, redis_config):
+        self.redis_config = redis_config
+        self._client = None
+        self._owns_client = False
+
+    def init_redis(self, redis_client):
+        self._client = redis_client
+        self._owns_client = False
+
+    @property
+    def client(self):
+        if self._client is None:
+            self._client = aioredis.Redis(host=self.redis_config.host, port=self.redis_config.port)
+            self._owns_client = True
+        return self._client
+
+    async def close(self):
+        """Closes a private client; a shared one is closed by its owner."""
+        if self._client is not None and self._owns_client:
+            await self._client.close()
+        self._client = None
+        self._owns_client = False
+
+class CorpusVersionTracker(RedisBacked):
+    """
+    Per-tenant corpus version counter kept in Redis so every worker sees the same value.
+
+    Caches include the version in their keys; bumping it on insert/delete makes every
+    earlier entry for the tenant unreachable without having to scan for them. A tenant_id
+    of None is the single version of a corpus all tenants share (no multi-tenancy).
+    """
+    @staticmethod
+    def _key(tenant_id: Optional[str]) -> str:
+        return "corpus_version" if tenant_id is None else f"corpus_version:{tenant_id}"
+
+    async def get(self, tenant_id: Optional[str]) -> Optional[int]:
+        """Returns the current version, or None if it cannot be read (callers should bypass caches)."""
+        try:
+            return int(await self.client.get(self._key(tenant_id)) or 0)
+        except RedisError as e:
+            logger.warning(f"Unable to read {self._key(tenant_id)}: {e}")
+            return None
+
+    async def bump(self, tenant_id: Optional[str]) -> Optional[int]:
+        try:
+            version = await self.client.incr(self._key(tenant_id))
+            logger.debug(f"{self._key(tenant_id)} bumped to {version}")
+            return version
+        except RedisError as e:
+            logger.error(f"Unable to bump {self._key(tenant_id)}: {e}")
+            return None
+
+class EmbeddingCache(RedisBacked):
+    """
+    Chunk embeddings in Redis keyed by embedding model and a hash of the embedded text.
+
+    Identical chunks (e.g. the same document uploaded by several users) are embedded once
+    and shared by every worker. Vectors are stored as packed float32.
+    """
+    def __init__(self, redis_config, ttl: Optional[int] = None):
+        super().__init__(redis_config)
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def _key(model: str, text: str) -> str:
+        return f"embedding:{model}:{hashlib.sha256(text.encode('utf-8')).hexdigest()}"
+
+    async def get_many(self, model: str, texts: List[str]) -> List[Optional[List[float]]]:
+        """Returns an embedding or None per text, all None if Redis is unavailable."""
+        if not texts:
+            return []
+        try:
+            values = await self.client.mget([self._key(model, text) for text in texts])
+        except RedisError as e:
+            logger.warning(f"Unable to read embedding cache: {e}")
+            return [None] * len(texts)
+        embeddings = [np.frombuffer(value, dtype=np.float32).tolist() if value else None for value in values]
+        hits = sum(embedding is not None for embedding in embeddings)
+        self.hits += hits
+        self.misses += len(texts) - hits
+        CACHE_REQUESTS.labels(cache="embedding", result="hit").inc(hits)
+        CACHE_REQUESTS.labels(cache="embedding", result="miss").inc(len(texts) - hits)
+        return embeddings
+
+    async def set_many(self, model: str, texts: List[str], embeddings: List[List[float]]):
+        try:
+            async with self.client.pipeline(transaction=False) as pipe:
+                for text, embedding in zip(texts, embeddings):
+                    pipe.set(self._key(model, text), np.asarray(embedding, dtype=np.float32).tobytes(), ex=self.ttl)
+                await pipe.execute()
+        except RedisError as e:
+            logger.warning(f"Unable to write embedding cache: {e}")
+
+    @property
+    def hit_rate(self) -> float:
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    def stats(self) -> dict:
+        return {"hits": self.hits, "misses": self.misses, "hit_rate": round(self.hit_rate, 4)}
+
+class SemanticAnswerCache:
+    """
+    Per-tenant cache of final answers with exact and embedding-similarity lookup.
+
+    Entries are keyed by (tenant, corpus version, normalized query). A query that misses
+    the exact key is compared against the cached query embeddings of the same tenant and
+    corpus version, and served if the best cosine similarity reaches the threshold.
+    """
+    def __init__(self, max_entries: int = 1024, max_entries_per_tenant: int = 256,
+                 ttl: Optional[float] = None, similarity_threshold: float = 0.95):
+        self.max_entries = max_entries
+        self.max_entries_per_tenant = max_entries_per_tenant
+        self.ttl = ttl
+        self.similarity_threshold = similarity_threshold
+        # key -> (unit query embedding or None, value, expires_at)
+        self._entries: "OrderedDict[tuple, tuple]" = OrderedDict()
+        self._tenant_keys: Dict[str, "OrderedDict[tuple, None]"] = defaultdict(OrderedDict)
+        self.exact_hits = 0
+        self.semantic_hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def _unit(embedding: List[float]) -> np.ndarray:
+        vector = np.asarray(embedding, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def _lookup(self, key: tuple) -> Optional[Any]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        _, value, expires_at = entry
+        if expires_at is not None and expires_at < time.time():
+            self._evict(key)
+            return None
+        self._entries.move_to_end(key)
+        self._tenant_keys[key[0]].move_to_end(key)
+        return value
+
+    def _evict(self, key: tuple):
+        self._entries.pop(key, None)
+        tenant_keys = self._tenant_keys.get(key[0])
+        if tenant_keys is not None:
+            tenant_keys.pop(key, None)
+            if not tenant_keys:
+                del self._tenant_keys[key[0]]
+
+    def get_exact(self, tenant_id: str, version: int, query: str) -> Optional[Any]:
+        value = self._lookup((tenant_id, version, normalize_query(query)))
+        if value is not None:
+            self.exact_hits += 1
+            CACHE_REQUESTS.labels(cache="answer", result="exact_hit").inc()
+        return value
+
+    def get_similar(self, tenant_id: str, version: int, embedding: List[float]) -> Optional[Any]:
+        """Returns the answer of the most similar cached query, counting a miss if none qualifies."""
+        now = time.time()
+        keys, expired = [], []
+        for key in self._tenant_keys.get(tenant_id, ()):
+            _, _, expires_at = self._entries[key]
+            if expires_at is not None and expires_at < now:
+                expired.append(key)
+            elif key[1] == version and self._entries[key][0] is not None:
+                keys.append(key)
+        # Expired entries must not win the argmax over a fresh one
+        for key in expired:
+            self._evict(key)
+        if keys:
+            scores = np.stack([self._entries[key][0] for key in keys]) @ self._unit(embedding)
+            best = int(np.argmax(scores))
+            if scores[best] >= self.similarity_threshold:
+                value = self._lookup(keys[best])
+                if value is not None:
+                    self.semantic_hits += 1
+                    CACHE_REQUESTS.labels(cache="answer", result="semantic_hit").inc()
+                    return value
+        self.misses += 1
+        CACHE_REQUESTS.labels(cache="answer", result="miss").inc()
+        return None
+
+    def set(self, tenant_id: str, version: int, query: str, value: Any, embedding: Optional[List[float]] = None):
+        tenant_keys = self._tenant_keys[tenant_id]
+        # Entries from older corpus versions can never match again
+        for stale_key in [key for key in tenant_keys if key[1] != version]:
+            self._evict(stale_key)
+        tenant_keys = self._tenant_keys[tenant_id]
+
+        key = (tenant_id, version, normalize_query(query))
+        expires_at = time.time() + self.ttl if self.ttl else None
+        unit = self._unit(embedding) if embedding is not None else None
+        self._entries[key] = (unit, value, expires_at)
+        self._entries.move_to_end(key)
+        tenant_keys[key] = None
+        tenant_keys.move_to_end(key)
+
+        while len(tenant_keys) > self.max_entries_per_tenant:
+            self._evict(next(iter(tenant_keys)))
+        while len(self._entries) > self.max_entries:
+            self._evict(next(iter(self._entries)))
+
+    def clear(self):
+        self._entries.clear()
+        self._tenant_keys.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+    @property
+    def hit_rate(self) -> float:
+        total = self.exact_hits + self.semantic_hits + self.misses
+        return (self.exact_hits + self.semantic_hits) / total if total else 0.0
+
+    def stats(self) -> dict:
+        return {
+            "entries": len(self),
+            "tenants": len(self._tenant_keys),
+            "exact_hits": self.exact_hits,
+            "semantic_hits": self.semantic_hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hit_rate, 4),
+        }
+
+corpus_versions = CorpusVersionTracker(config.redis_config)
+retrieval_cache = LRUCache(max_entries=config.cache.retrieval_cache_size, ttl=config.cache.retrieval_cache_ttl, name="retrieval")
+answer_cache = SemanticAnswerCache(
+    max_entries=config.cache.answer_cache_size,
+    max_entries_per_tenant=config.cache.answer_cache_size_per_tenant,
+    ttl=config.cache.answer_cache_ttl,
+    similarity_threshold=config.cache.answer_similarity_threshold,
+)
+embedding_cache = EmbeddingCache(config.redis_config, ttl=config.cache.embedding_cache_ttl)
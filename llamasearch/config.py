@@ -8,6 +8,8 @@ class ConfigLoader:
     def __init__(self, config_path: str):
         self.config_path = config_path
         self.config = self.load_config()
+        # One instance for every custom metric, so its connection pool and concurrency limit are shared
+        self._custom_model = None
 
     def load_config(self) -> Dict[str, Any]:
         """Load configuration from a YAML file."""
@@ -18,7 +20,9 @@ class ConfigLoader:
     def get_model(self, model_type, model_name):
         # Return custom model instance
         if model_type == 'custom':
-            return CustomModel()
+            if self._custom_model is None:
+                self._custom_model = CustomModel()
+            return self._custom_model
         else:
             # For API models, return the model_name as deepeval internally creates the model instance
             return model_name
@@ -0,0 +1,190 @@
+import hashlib
+import json
+import os
+import shutil
+import threading
+import uuid
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import List, Optional
+
+from llama_index.core import Document
+from llama_index.core.readers.file.base import default_file_metadata_func
+
+from llamasearch.settings import config
+from llamasearch.logger import logger
+
+try:
+    import fcntl
+except ImportError:
+    # Windows, blobs are then only guarded within one process
+    fcntl = None
+
+HASH_BLOCK_SIZE = 1024 * 1024
+
+class ContentStore:
+    """
+    Content-addressed file store keyed by SHA-256.
+
+    Each distinct upload is stored once under <root>/<digest[:2]>/<digest>. A user's copy
+    at their upload path is a hard link to the blob, so identical uploads from many users
+    share storage and the blob's link count is its reference count. Parsed documents are
+    cached next to the blob, so an identical file is only parsed once.
+
+    release() removes a user's link and collects the blob, with its parsed documents,
+    once no other link remains. Users whose copy fell back to a plain copy do not hold
+    a reference, and a blob without links is only collected by a release. Both run under
+    a file lock on the blob's directory, since every API worker process shares the store.
+    """
+    def __init__(self, root: str, max_known_paths: int = 4096):
+        self.root = root
+        self.max_known_paths = max_known_paths
+        # (path, device, inode, size, mtime) -> digest, for files linked or hashed by this process
+        self._known_digests: "OrderedDict[tuple, str]" = OrderedDict()
+        # Keeps release() from collecting a blob between add() and link() of another upload,
+        # where fcntl is missing
+        self._lock = threading.Lock()
+
+    def blob_path(self, digest: str) -> str:
+        return os.path.join(self.root, digest[:2], digest)
+
+    def _documents_path(self, digest: str) -> str:
+        return self.blob_path(digest) + ".documents.json"
+
+    def add(self, tmp_path: str, digest: str) -> str:
+        """Moves tmp_path into the store, or drops it if the content is already stored."""
+        blob_path = self.blob_path(digest)
+        if os.path.exists(blob_path):
+            os.remove(tmp_path)
+            logger.info(f"Content {digest[:12]} already stored, deduplicated upload")
+            return blob_path
+        os.makedirs(os.path.dirname(blob_path), exist_ok=True)
+        try:
+            os.replace(tmp_path, blob_path)
+        except OSError:
+            # tmp_path is on another filesystem
+            shutil.move(tmp_path, blob_path)
+        return blob_path
+
+    def link(self, digest: str, location: str):
+        """Atomically points location at the stored blob."""
+        if os.path.exists(location) and os.path.samefile(location, self.blob_path(digest)):
+            # rename() onto another link of the same file is a no-op that would leave the temporary link behind
+            self.remember(location, digest)
+            return
+        tmp_location = os.path.join(os.path.dirname(location), f".{uuid.uuid4().hex}.link")
+        try:
+            os.link(self.blob_path(digest), tmp_location)
+        except OSError:
+            # No hard links across filesystems (or on this filesystem), fall back to a copy
+            shutil.copyfile(self.blob_path(digest), tmp_location)
+        os.replace(tmp_location, location)
+        self.remember(location, digest)
+
+    @contextmanager
+    def _locked(self, digest: str):
+        if fcntl is None:
+            with self._lock:
+                yield
+            return
+        blob_dir = os.path.dirname(self.blob_path(digest))
+        os.makedirs(blob_dir, exist_ok=True)
+        # flock is held per open file, so this also excludes other threads of this process
+        with open(os.path.join(blob_dir, ".lock"), "a") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def store(self, tmp_path: str, digest: str, location: str):
+        """Adds tmp_path to the store and links it at location."""
+        with self._locked(digest):
+            self.add(tmp_path, digest)
+            self.link(digest, location)
+
+    def release(self, path: str) -> bool:
+        """
+        Removes a user's link to a blob, and the blob once it has no other link.
+
+        Returns False, leaving the file alone, if path is not linked into the store.
+        """
+        if not os.path.exists(path):
+            return False
+        digest = self.digest_for(path)
+        with self._locked(digest):
+            if not os.path.exists(path):
+                return False
+            blob_path = self.blob_path(digest)
+            if not os.path.exists(blob_path) or not os.path.samefile(path, blob_path):
+                return False
+            os.remove(path)
+            if os.stat(blob_path).st_nlink == 1:
+                os.remove(blob_path)
+                if os.path.exists(self._documents_path(digest)):
+                    os.remove(self._documents_path(digest))
+                logger.info(f"Content {digest[:12]} has no more references, removed from the store")
+            return True
+
+    @staticmethod
+    def _stat_key(path: str) -> tuple:
+        stat = os.stat(path)
+        return (os.path.abspath(path), stat.st_dev, stat.st_ino, stat.st_size, stat.st_mtime_ns)
+
+    def remember(self, path: str, digest: str):
+        key = self._stat_key(path)
+        self._known_digests[key] = digest
+        self._known_digests.move_to_end(key)
+        while len(self._known_digests) > self.max_known_paths:
+            self._known_digests.popitem(last=False)
+
+    def digest_for(self, path: str) -> str:
+        """Returns the SHA-256 of a file, without rereading files this process already hashed."""
+        key = self._stat_key(path)
+        digest = self._known_digests.get(key)
+        if digest is not None:
+            return digest
+        sha256 = hashlib.sha256()
+        with open(path, "rb") as f:
+            for block in iter(lambda: f.read(HASH_BLOCK_SIZE), b""):
+                sha256.update(block)
+        digest = sha256.hexdigest()
+        self.remember(path, digest)
+        return digest
+
+    def load_documents(self, digest: str, file_path: str) -> Optional[List[Document]]:
+        """
+        Returns the cached parse of the content, re-pointed at file_path.
+
+        Document ids and file metadata are rewritten to what SimpleDirectoryReader
+        (filename_as_id=True) would have produced for file_path.
+        """
+        documents_path = self._documents_path(digest)
+        if not os.path.exists(documents_path):
+            return None
+        try:
+            with open(documents_path, "r") as f:
+                payload = json.load(f)
+        except (OSError, ValueError) as e:
+            logger.warning(f"Ignoring unreadable document cache for {digest[:12]}: {e}")
+            return None
+        file_metadata = default_file_metadata_func(file_path)
+        documents = []
+        for i, data in enumerate(payload):
+            document = Document.from_dict(data)
+            document.metadata.update(file_metadata)
+            document.id_ = f"{file_path}_part_{i}"
+            documents.append(document)
+        return documents
+
+    def save_documents(self, digest: str, documents: List[Document]):
+        documents_path = self._documents_path(digest)
+        os.makedirs(os.path.dirname(documents_path), exist_ok=True)
+        tmp_path = f"{documents_path}.{uuid.uuid4().hex}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump([document.to_dict() for document in documents], f)
+        os.replace(tmp_path, documents_path)
+
+content_store = ContentStore(
+    os.path.join(config.application.data_path, config.application.upload_subdir, config.application.blob_subdir)
+)
@@ -1,6 +1,11 @@
 from deepeval.models.base_model import DeepEvalBaseLLM
-from typing import Any, Dict, Optional
-import requests
+from typing import Any, AsyncIterator, Dict, Optional, Tuple
+import asyncio
+import json
+import random
+import time
+import httpx
+from llamasearch.logger import logger
 
 # Model options
 model_params = {
@@ -34,22 +39,52 @@ model_params = {
     "num_thread": 64
 }
 
+RETRY_STATUS_CODES = {429, 500, 502, 503, 504}
+
 class CustomModel(DeepEvalBaseLLM):
     """
     A custom model class to interact with an LLM based on the Llama3:70b model,
     providing functionalities to load the model, generate responses, and manage model settings.
+
+    Requests go through pooled httpx clients (one sync, one async) that keep connections to
+    the server alive across calls. Async calls are bounded by a semaphore, so a concurrent
+    evaluation does not overload the server, and stream the answer so the read timeout
+    applies between tokens rather than to the whole generation. Connection errors,
+    timeouts, 429 and 5xx responses are retried with exponential backoff.
     """
 
-    def __init__(self, model: str = "llama3:70b", base_url: str = 'http://localhost:11435') -> None:
+    def __init__(self, model: str = "llama3:70b", base_url: str = 'http://localhost:11435',
+                 timeout: float = 120.0, connect_timeout: float = 10.0, max_retries: int = 3,
+                 max_concurrency: int = 8, max_connections: int = 16,
+                 transport: Optional[httpx.MockTransport] = None) -> None:
         """
         Initializes the CustomModel with a specific LLM model and API base URL.
 
         Args:
             model (str): The model identifier, default is "llama3:70b".
             base_url (str): The base URL for the API endpoint, default is 'http://localhost:11435'.
+            timeout (float): Seconds to wait for data from the server (between streamed chunks for async calls).
+            connect_timeout (float): Seconds to wait for a connection.
+            max_retries (int): Retries of a request that failed with a connection error, a timeout, 429 or 5xx.
+            max_concurrency (int): Maximum number of async requests in flight on this instance.
+                ConfigLoader shares one instance between all custom metrics, so this bounds the
+                load a whole evaluation puts on the server.
+            max_connections (int): Size of each connection pool.
+            transport (httpx.MockTransport): Answers the requests of both clients instead of the
+                server, for tests.
         """
         self.base_url = base_url
         self.model = model
+        self.max_retries = max_retries
+        self.max_concurrency = max_concurrency
+        self.timeout = httpx.Timeout(timeout, connect=connect_timeout)
+        self.limits = httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections)
+        self.transport = transport
+        self._client: Optional[httpx.Client] = None
+        # The async client and semaphore belong to the event loop they were created on
+        self._aclient: Optional[httpx.AsyncClient] = None
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
 
     def load_model(self) -> str:
         """
@@ -60,59 +95,142 @@ class CustomModel(DeepEvalBaseLLM):
         """
         return self.model
 
-    def generate(self, user_message: str, only_message: bool = True, model_params: Optional[Dict[str, Any]] = None) -> Optional[str]:
-        """
-        Generates a response from the model based on the user's message.
+    @property
+    def client(self) -> httpx.Client:
+        if self._client is None:
+            self._client = httpx.Client(base_url=self.base_url, timeout=self.timeout, limits=self.limits,
+                                        transport=self.transport)
+        return self._client
 
-        Args:
-            user_message (str): The message from the user to which the model should respond.
-            only_message (bool): Flag to determine if only the message content should be returned, default is True.
-            model_params (Optional[Dict[str, Any]]): Additional model parameters to be sent to the API.
+    async def _async_resources(self) -> Tuple[httpx.AsyncClient, asyncio.Semaphore]:
+        loop = asyncio.get_running_loop()
+        if self._aclient is None or self._loop is not loop:
+            if self._aclient is not None:
+                try:
+                    await self._aclient.aclose()
+                except Exception as e:
+                    # Connections opened on a closed event loop cannot be shut down cleanly
+                    logger.debug(f"Error closing the previous connection pool: {e}")
+            self._aclient = httpx.AsyncClient(base_url=self.base_url, timeout=self.timeout, limits=self.limits,
+                                              transport=self.transport)
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+            self._loop = loop
+        return self._aclient, self._semaphore
 
-        Returns:
-            Optional[str]: The generated response or None if an error occurs.
-        """
-        url = f"{self.base_url}/api/chat"
+    def _payload(self, user_message: str, stream: bool, model_params: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
         data = {
             "model": self.model,
             "messages": [
                 {"role": "system", "content": "You are a helpful AI assistant that strictly follows the given instructions"},
                 {"role": "user", "content": user_message}
             ],
-            "stream": False,
+            "stream": stream,
             "format": "json",
             #"grammar": "./model_files/json_arr.gbnf",
             "keep_alive": "30m"
         }
-
         if model_params:
-            print("Using model params ", model_params)
+            logger.debug(f"Using model params {model_params}")
             data.update(model_params)
+        return data
 
-        try:
-            response = requests.post(url, json=data)
-            response.raise_for_status()  # Raises HTTPError for bad requests (4XX, 5XX)
-            response_data = response.json()
-            if only_message:
-                return response_data.get('message', {}).get('content', 'Empty response from LLM')
-        except requests.exceptions.RequestException as e:
-            print(f"Request failed: {str(e)}")
-            return None
-        except ValueError:
-            print("Failed to decode JSON response")
-            return None
+    @staticmethod
+    def _is_retryable(error: Exception) -> bool:
+        if isinstance(error, httpx.HTTPStatusError):
+            return error.response.status_code in RETRY_STATUS_CODES
+        return isinstance(error, httpx.TransportError)
+
+    @staticmethod
+    def _backoff(attempt: int, base: float = 1.0, cap: float = 30.0) -> float:
+        return min(cap, base * 2 ** attempt) * random.uniform(0.5, 1.0)
 
-    async def a_generate(self, prompt: str) -> Optional[str]:
+    def generate(self, user_message: str, only_message: bool = True, model_params: Optional[Dict[str, Any]] = None) -> Optional[Any]:
         """
-        Asynchronous wrapper for the generate method.
+        Generates a response from the model based on the user's message.
+
+        Args:
+            user_message (str): The message from the user to which the model should respond.
+            only_message (bool): Flag to determine if only the message content should be returned, default is True.
+            model_params (Optional[Dict[str, Any]]): Additional model parameters to be sent to the API.
+
+        Returns:
+            Optional[Any]: The generated response (the whole response body if not only_message) or None if an error occurs.
+        """
+        data = self._payload(user_message, stream=False, model_params=model_params)
+        for attempt in range(self.max_retries + 1):
+            try:
+                response = self.client.post("/api/chat", json=data)
+                response.raise_for_status()  # Raises HTTPError for bad requests (4XX, 5XX)
+                response_data = response.json()
+                if only_message:
+                    return response_data.get('message', {}).get('content', 'Empty response from LLM')
+                return response_data
+            except httpx.HTTPError as e:
+                if attempt < self.max_retries and self._is_retryable(e):
+                    time.sleep(self._backoff(attempt))
+                    continue
+                logger.error(f"Request failed: {str(e)}")
+                return None
+            except ValueError:
+                logger.error("Failed to decode JSON response")
+                return None
+
+    async def astream(self, user_message: str, model_params: Optional[Dict[str, Any]] = None) -> AsyncIterator[str]:
+        """
+        Streams the response content as the model generates it.
+
+        A failed request is retried only if nothing was yielded yet.
+
+        Args:
+            user_message (str): The message from the user to which the model should respond.
+            model_params (Optional[Dict[str, Any]]): Additional model parameters to be sent to the API.
+        """
+        client, semaphore = await self._async_resources()
+        data = self._payload(user_message, stream=True, model_params=model_params)
+        for attempt in range(self.max_retries + 1):
+            yielded = False
+            try:
+                async with semaphore:
+                    async with client.stream("POST", "/api/chat", json=data) as response:
+                        response.raise_for_status()
+                        async for line in response.aiter_lines():
+                            if not line:
+                                continue
+                            chunk = json.loads(line)
+                            if chunk.get("error"):
+                                raise ValueError(chunk["error"])
+                            content = chunk.get("message", {}).get("content")
+                            if content:
+                                yielded = True
+                                yield content
+                            if chunk.get("done"):
+                                return
+                return
+            except httpx.HTTPError as e:
+                if yielded or attempt == self.max_retries or not self._is_retryable(e):
+                    raise
+                await asyncio.sleep(self._backoff(attempt))
+
+    async def a_generate(self, prompt: str, model_params: Optional[Dict[str, Any]] = None) -> Optional[str]:
+        """
+        Generates a response without blocking the event loop.
 
         Args:
             prompt (str): The user's prompt for which a response is generated.
+            model_params (Optional[Dict[str, Any]]): Additional model parameters to be sent to the API.
 
         Returns:
             Optional[str]: The generated response or None if an error occurs.
         """
-        return self.generate(prompt)
+        try:
+            parts = [content async for content in self.astream(prompt, model_params=model_params)]
+        except httpx.HTTPError as e:
+            logger.error(f"Request failed: {str(e)}")
+            return None
+        except ValueError as e:
+            logger.error(f"Failed to decode response: {str(e)}")
+            return None
+        return "".join(parts) if parts else 'Empty response from LLM'
 
     def get_model_name(self) -> str:
         """
@@ -123,6 +241,19 @@ class CustomModel(DeepEvalBaseLLM):
         """
         return self.model
 
+    def close(self) -> None:
+        """Closes the sync connection pool."""
+        if self._client is not None:
+            self._client.close()
+            self._client = None
+
+    async def aclose(self) -> None:
+        """Closes the connection pools."""
+        self.close()
+        if self._aclient is not None:
+            await self._aclient.aclose()
+            self._aclient = None
+
 def main():
     # Create an instance of the model
     model = CustomModel()
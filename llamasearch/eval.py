@@ -1,12 +1,16 @@
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional
+import deepeval
 from deepeval.test_case import LLMTestCase
 import csv
+import hashlib
 import json
+import uuid
 import os
 import signal
 from datetime import datetime
 import argparse
 import asyncio
+import random
 import warnings
 
 from llamasearch.settings import config
@@ -22,21 +26,83 @@ os.environ["TOKENIZERS_PARALLELISM"] = "false"
 
 metrics_to_evaluate = ['contextual_precision','contextual_recall','faithfulness', 'answer_relevancy', 'contextual_relevancy', 'coherence']
 
+class JudgeCache:
+    """
+    On-disk cache of metric results, keyed by the SHA-256 of the metric configuration and
+    the test case.
+
+    Re-running an evaluation only pays for judge calls on test cases whose answer, context
+    or ground truth changed, or whose metric configuration did. Entries are stored as
+    <root>/<key[:2]>/<key>.json, written atomically so concurrent runs can share a root.
+    """
+    def __init__(self, root: str):
+        self.root = root
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def key(metric_fingerprint: Dict[str, Any], test_case: LLMTestCase) -> str:
+        payload = {
+            "metric": metric_fingerprint,
+            "test_case": {
+                "input": test_case.input,
+                "actual_output": test_case.actual_output,
+                "expected_output": test_case.expected_output,
+                "retrieval_context": test_case.retrieval_context,
+            },
+        }
+        return hashlib.sha256(json.dumps(payload, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.root, key[:2], f"{key}.json")
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        try:
+            with open(self._path(key), "r", encoding="utf-8") as f:
+                result = json.load(f)
+        except FileNotFoundError:
+            self.misses += 1
+            return None
+        except (OSError, ValueError) as e:
+            logger.warning(f"Ignoring unreadable judge cache entry {key[:12]}: {e}")
+            self.misses += 1
+            return None
+        self.hits += 1
+        return result
+
+    def set(self, key: str, result: Dict[str, Any]):
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(result, f, ensure_ascii=False)
+        os.replace(tmp_path, path)
+
 class Eval:
     """
     This class encapsulates the evaluation of the RAG pipeline
 
+    Questions are evaluated concurrently, and so are the metrics of each question, with
+    judge calls bounded by a semaphore and retried with backoff when rate limited. Every
+    evaluated question is appended to the results file (JSON lines) as soon as it is done,
+    so an interrupted run resumes from the questions it has not finished.
+
     Attributes:
         data_path (str): Directory path of the knowledge base.
         results_file__path (str): Directory path where evaluation results are saved.
     """
-    def __init__(self, data_path: str, results_file_path: str):
+    def __init__(self, data_path: str, results_file_path: str, concurrency: int = 8,
+                 question_concurrency: int = 4, max_retries: int = 5, judge_cache_dir: Optional[str] = None):
         """
         Initializes the Evaluation instance with the data and result paths.
 
         Args:
             data_path: Path to the data directory.
             results_file_path: Path to output results file.
+            concurrency: Maximum number of metric measurements (judge calls) in flight.
+            question_concurrency: Maximum number of questions being answered by the RAG pipeline at once.
+            max_retries: Retries of a metric measurement that failed with a rate limit or a transient error.
+            judge_cache_dir: Directory of the judge cache, metric results are not cached when None.
         """
         self.data_path = data_path
         self.mobj = MetricsEvaluator()
@@ -47,7 +113,16 @@ class Eval:
         if self.data_path:
             self.rag_pipeline.if_eval_mode=True
             self.rag_pipeline.data_path = self.data_path
-        self.metric_scores = {self.mobj.get_metric_name(self.mobj.metrics[metric_name]): [] for metric_name in metrics_to_evaluate}
+        self.metric_names = {metric_name: self.mobj.get_metric_name(self.mobj.metrics[metric_name]) for metric_name in metrics_to_evaluate}
+        self.metric_scores = {name: [] for name in self.metric_names.values()}
+        for result in self.results.values():
+            for metric_result in result.get("metrics", []):
+                if metric_result and metric_result.get("score") is not None and metric_result.get("name") in self.metric_scores:
+                    self.metric_scores[metric_result["name"]].append(metric_result["score"])
+        self.judge_semaphore = asyncio.Semaphore(concurrency)
+        self.question_semaphore = asyncio.Semaphore(question_concurrency)
+        self.max_retries = max_retries
+        self.judge_cache = JudgeCache(judge_cache_dir) if judge_cache_dir else None
         # Setup signal handlers to save results on interruption
         self.config=config
         signal.signal(signal.SIGINT, self.signal_handler)
@@ -69,32 +144,86 @@ class Eval:
         except Exception as e:
             logger.error(f"Failed to initialize RAG pipeline: {e}")
             raise
-    
-    async def evaluate(self, idx: int, input_query: str, ground_truth: str=None) -> None:
-        response_object = await self.rag_pipeline.perform_query_async(input_query)
-        if response_object is None:
-            logger.error("Failed to retrieve response from query application.")
-            return
-        actual_output = response_object.response
-        retrieval_context = [node.get_content() for node in response_object.source_nodes]
-        logger.info("Evaluating ....")
-        metrics_results = []
-        if actual_output and retrieval_context:
-            for metric_name in metrics_to_evaluate:
-                metric_result = self._evaluate_metric(input_query, actual_output, retrieval_context, ground_truth, self.mobj.metrics[metric_name])
-                metrics_results.append(metric_result)
-
-        # Append the result for this evaluation to the results list
-        self.results.append({
+
+    async def aclose(self) -> None:
+        """Closes the connection pools of custom judge models."""
+        for metric_config in self.mobj.config_loader.config['metrics'].values():
+            if hasattr(metric_config.get('model'), 'aclose'):
+                await metric_config['model'].aclose()
+
+    def _pending_metrics(self, result: Dict[str, Any]) -> List[str]:
+        """
+        Metrics of a checkpointed result that have no score yet.
+
+        A result without an answer or context is complete: its metrics cannot be measured.
+        """
+        if not (result.get("es_answer") and result.get("context")):
+            return []
+        scored = {metric_result["name"] for metric_result in result.get("metrics", [])
+                  if metric_result and metric_result.get("score") is not None}
+        return [metric_name for metric_name in metrics_to_evaluate if self.metric_names[metric_name] not in scored]
+
+    async def evaluate_all(self, questions: List[tuple], save_results_flag: bool) -> None:
+        """
+        Evaluates (id, question, ground truth) tuples concurrently, skipping those already in the results file.
+
+        Args:
+            questions: The questions to evaluate.
+            save_results_flag: Append each evaluated question to the results file.
+        """
+        pending = [question for question in questions
+                   if question[0] not in self.results or self._pending_metrics(self.results[question[0]])]
+        if len(pending) < len(questions):
+            logger.info(f"Resuming: {len(questions) - len(pending)} of {len(questions)} question(s) already evaluated in {self.results_file_path}")
+
+        async def run(idx, input_query, ground_truth):
+            logger.info(f"Evaluating: ID {idx} | Question: {input_query} | Ground Truth: {ground_truth}")
+            result = await self.evaluate(idx, input_query, ground_truth)
+            if result is not None and save_results_flag:
+                await self.save_results(result)
+
+        await asyncio.gather(*(run(*question) for question in pending))
+
+    async def evaluate(self, idx: int, input_query: str, ground_truth: str=None) -> Optional[Dict[str, Any]]:
+        previous = self.results.get(idx)
+        if previous is not None:
+            # Answered in an earlier run, only the metrics that failed are measured again
+            actual_output = previous["es_answer"]
+            retrieval_context = previous["context"]
+            metric_names = self._pending_metrics(previous)
+            metrics_results = [metric_result for metric_result in previous["metrics"]
+                               if metric_result and metric_result.get("score") is not None]
+        else:
+            async with self.question_semaphore:
+                response_object = await self.rag_pipeline.perform_query_async(input_query)
+            if response_object is None:
+                logger.error("Failed to retrieve response from query application.")
+                return None
+            actual_output = response_object.response
+            retrieval_context = [node.get_content() for node in response_object.source_nodes]
+            metric_names = metrics_to_evaluate
+            metrics_results = []
+        logger.info(f"Evaluating {len(metric_names)} metric(s) for question {idx}....")
+        if not (actual_output and retrieval_context):
+            logger.warning(f"Question {idx} has no answer or no retrieved context, its metrics are not measured")
+        else:
+            metrics_results += await asyncio.gather(*(
+                self._evaluate_metric(input_query, actual_output, retrieval_context, ground_truth, metric_name)
+                for metric_name in metric_names
+            ))
+
+        result = {
             "id": idx,
             "question": input_query,
             "ground_truth": ground_truth,
             "es_answer": actual_output,
             "metrics": metrics_results,
             "context": retrieval_context
-        })
+        }
+        self.results[idx] = result
+        return result
 
-    def _evaluate_metric(self, input: str, output: str, retrieval_context: List[str], ground_truth: str, metric) -> None:
+    async def _evaluate_metric(self, input: str, output: str, retrieval_context: List[str], ground_truth: str, metric_name: str) -> Dict[str, Any]:
         """
         Evaluates the given metric for the test case.
 
@@ -102,15 +231,27 @@ class Eval:
             input: The input query string.
             output: The actual output response from the query application.
             retrieval_context: The retrieval context fetched from vector db as per the query.
-            metric: The metric evaluator object to be used for evaluation.
+            metric_name: Key of the metric to evaluate, a new metric instance is created for the test case.
+
+        Returns:
+            The metric name, score and reason, with score None and the error if the measurement failed.
         """
         test_case = LLMTestCase(input=input, actual_output=output, retrieval_context=retrieval_context)
         if ground_truth:
             test_case = LLMTestCase(input=input, expected_output=ground_truth, actual_output=output, retrieval_context=retrieval_context)
+        cache_key = None
+        if self.judge_cache is not None:
+            cache_key = self.judge_cache.key(self._metric_fingerprint(metric_name), test_case)
+            cached = await asyncio.to_thread(self.judge_cache.get, cache_key)
+            if cached is not None:
+                logger.info(f"Metric: {cached['name']} (cached) | Score: {cached['score']}")
+                self.metric_scores[cached['name']].append(cached['score'])
+                return cached
+        metric = self.mobj.create_metric(metric_name)
+        name = self.mobj.get_metric_name(metric)
         try:
-            metric.measure(test_case)
-            metric_name = self.mobj.get_metric_name(metric)
-            logger.info(f"Metric: {metric_name}")
+            await self._measure_with_retries(metric, test_case, name)
+            logger.info(f"Metric: {name}")
             logger.info(f"Actual Output: {output}")
             score = getattr(metric, 'score', -1)
             if score is not None:
@@ -118,10 +259,37 @@ class Eval:
             reason = getattr(metric, 'reason', '-')
             if reason is not None:
                 logger.info(f"Metric Reason: {reason}")
-            self.metric_scores[metric_name].append(score)
-            return {"name": self.mobj.get_metric_name(metric), "score": score, "reason": reason}
+            self.metric_scores[name].append(score)
+            result = {"name": name, "score": score, "reason": reason}
+            if cache_key is not None and score is not None:
+                await asyncio.to_thread(self.judge_cache.set, cache_key, result)
+            return result
         except Exception as e:
-            logger.error(f"Error evaluating metric {self.mobj.get_metric_name(metric)}: {e}")
+            logger.error(f"Error evaluating metric {name}: {e}")
+            return {"name": name, "score": None, "reason": None, "error": str(e)}
+
+    def _metric_fingerprint(self, metric_name: str) -> Dict[str, Any]:
+        """What determines a metric's judgement besides the test case: its configuration, judge model and deepeval's prompts."""
+        metric_config = dict(self.mobj.config_loader.config['metrics'][metric_name])
+        model = metric_config.get('model')
+        if hasattr(model, 'get_model_name'):
+            # Custom judge models are instances, identify them by name
+            metric_config['model'] = f"{type(model).__name__}:{model.get_model_name()}"
+        return {"metric": metric_name, "config": metric_config, "deepeval": getattr(deepeval, "__version__", None)}
+
+    async def _measure_with_retries(self, metric, test_case: LLMTestCase, name: str) -> None:
+        for attempt in range(self.max_retries + 1):
+            try:
+                # Only the call itself holds a slot, not the backoff
+                async with self.judge_semaphore:
+                    await metric.a_measure(test_case, _show_indicator=False)
+                return
+            except Exception as e:
+                if attempt == self.max_retries or not is_retryable(e):
+                    raise
+                delay = retry_delay(e, attempt)
+                logger.warning(f"Metric {name} failed ({type(e).__name__}), retrying in {delay:.1f}s ({attempt + 1}/{self.max_retries})")
+                await asyncio.sleep(delay)
     
     def load_csv_to_dict(self, csv_path: str) -> List[Dict[str, Any]]:
         """
@@ -151,27 +319,38 @@ class Eval:
                 data = json.load(json_data)
             return data
 
-    def load_existing_results(self) -> List[Dict[str, Any]]:
-        """Loads existing results from the results file if it exists."""
+    def load_existing_results(self) -> Dict[Any, Dict[str, Any]]:
+        """
+        Loads the results of an earlier run from the results file if it exists, by question id.
+
+        A question evaluated more than once keeps its last result. A truncated last line, from
+        a run killed mid-write, is ignored.
+        """
+        results = {}
         if os.path.isfile(self.results_file_path):
             with open(self.results_file_path, 'r', encoding='utf-8') as f:
-                return json.load(f)
-        return []
+                for line in f:
+                    try:
+                        result = json.loads(line)
+                    except json.JSONDecodeError:
+                        logger.warning(f"Skipping unreadable line in {self.results_file_path}")
+                        continue
+                    results[result["id"]] = result
+        return results
 
-    async def save_results(self) -> None:
-        """Saves the accumulated results to the specified results file."""
-        with open(self.results_file_path, 'w', encoding='utf-8') as f:
-            json.dump(self.results, f, ensure_ascii=False, indent=4)
-        logger.info(f"Results saved to {self.results_file_path}")
+    async def save_results(self, result: Dict[str, Any]) -> None:
+        """Appends the result of one question to the results file."""
+        with open(self.results_file_path, 'a', encoding='utf-8') as f:
+            f.write(json.dumps(result, ensure_ascii=False) + "\n")
+        logger.info(f"Result of question {result['id']} saved to {self.results_file_path}")
 
     def signal_handler(self, signum, frame):
-        """Signal handler to save results upon receiving interruption signals."""
-        logger.info("Interrupt signal received. Saving results...")
-        self.save_results()
+        """Signal handler upon receiving interruption signals, results are already saved per question."""
+        logger.info(f"Interrupt signal received. Completed questions are saved in {self.results_file_path}")
         self.display_stats()
         exit(1)
 
-    async def display_stats(self):
+    def display_stats(self):
         """
         Display statistics for each metric evaluated.
         Prints the mean, median, and standard deviation for the metric scores using logger.info in a single line.
@@ -187,16 +366,22 @@ class Eval:
         # Join all metric summaries into a single line and log it
         logger.info(" | ".join(stats_summary))
 
-async def main(data_path: str, qa_json_path: str,output_filename:str, limit:str, save_results_flag: bool):
+async def main(data_path: str, qa_json_path: str,output_filename:str, limit:str, save_results_flag: bool,
+               concurrency: int = 8, question_concurrency: int = 4, max_retries: int = 5, judge_cache: bool = True):
     """
     Main function to run the evaluation process.
     
     Args:
         data_path: Path to the data directory.
         qa_json_path: Path to the QA CSV file.
-        output_file_name: A flag when set , results in evaluation results to be named 'eval_results.json'. Else the file could be timestamped.
+        output_file_name: A flag when set , results in evaluation results to be named 'evaluation_result_metrics.jsonl'
+            and a rerun resumes from it. Else the file could be timestamped.
         limit: Indicates a limit of the number of questions to be evaluated.
         save: Flag indicating whether to save results to a file.
+        concurrency: Maximum number of judge calls in flight.
+        question_concurrency: Maximum number of questions answered by the RAG pipeline at once.
+        max_retries: Retries of a rate limited judge call.
+        judge_cache: Reuse metric results of unchanged test cases from earlier runs.
 
     """
     results_dir = "./data/eval_results"
@@ -204,38 +389,65 @@ async def main(data_path: str, qa_json_path: str,output_filename:str, limit:str,
         os.makedirs(results_dir)
     output_path=f"evaluation_result_metrics"
     timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-    results_file_path = os.path.join(results_dir, f"{output_path}_{timestamp}.json")
+    results_file_path = os.path.join(results_dir, f"{output_path}_{timestamp}.jsonl")
     logger.info(output_filename)
     if output_filename:
-        results_file_path = os.path.join(results_dir, f"{output_path}.json")
+        results_file_path = os.path.join(results_dir, f"{output_path}.jsonl")
+    eval_instance = None
     try:
         logger.info("Initialising the pipeline for evaluation....")
-        eval_instance = Eval(data_path, results_file_path)
+        judge_cache_dir = os.path.join(results_dir, "judge_cache") if judge_cache else None
+        eval_instance = Eval(data_path, results_file_path, concurrency, question_concurrency, max_retries, judge_cache_dir)
         await eval_instance.init_rag_pipeline()
         print("-"*120)
         json_content = eval_instance.load_json(qa_json_path)
-        for idx, (key,query) in enumerate(json_content['queries'].items()):
-            if idx<int(limit):
-                input_query = query
-                ground_truth = json_content['responses'][key]
-                logger.info(f"Evaluating: ID {key} | Question: {input_query} | Ground Truth: {ground_truth}")
-                await eval_instance.evaluate(key, input_query, ground_truth)
-                if save_results_flag:
-                    await eval_instance.save_results()
-                await eval_instance.display_stats()
-                print("-"*120)
+        questions = [
+            (key, query, json_content['responses'][key])
+            for idx, (key, query) in enumerate(json_content['queries'].items())
+            if idx < int(limit)
+        ]
+        await eval_instance.evaluate_all(questions, save_results_flag)
+        if eval_instance.judge_cache is not None:
+            logger.info(f"Judge cache: {eval_instance.judge_cache.hits} hit(s), {eval_instance.judge_cache.misses} miss(es)")
+        eval_instance.display_stats()
+        print("-"*120)
     except Exception as e:
         logger.error(f"Error during evaluation: {e}")
     finally:
+            if eval_instance is not None:
+                await eval_instance.aclose()
             logger.info("Evaluation completed.")
 
+def is_retryable(error: Exception) -> bool:
+    """Rate limits, timeouts, connection errors and 5xx responses from the judge model."""
+    status = getattr(error, "status_code", None) or getattr(getattr(error, "response", None), "status_code", None)
+    if status is not None:
+        return status == 429 or status >= 500
+    if isinstance(error, (asyncio.TimeoutError, ConnectionError)):
+        return True
+    return type(error).__name__ in ("RateLimitError", "APITimeoutError", "APIConnectionError") or "rate limit" in str(error).lower()
+
+def retry_delay(error: Exception, attempt: int, base: float = 2.0, cap: float = 60.0) -> float:
+    """Seconds to wait, the server's Retry-After if it sent one, else exponential backoff with jitter."""
+    headers = getattr(getattr(error, "response", None), "headers", None) or {}
+    try:
+        retry_after = float(headers.get("retry-after"))
+        return min(retry_after, cap)
+    except (TypeError, ValueError):
+        return min(cap, base * 2 ** attempt) * random.uniform(0.5, 1.0)
+
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="Evaluate LLaMA Index Questions and Answers.")
     parser.add_argument("--data_path", required=True, help="Path to the data directory.")
     parser.add_argument("--qa_json_path", required=True, help="Path to the QA CSV file.")
-    parser.add_argument("--output_file_name",action="store_true", help="Filename to Output.")
+    parser.add_argument("--output_file_name",action="store_true", help="Filename to Output, a rerun with it resumes the previous run.")
     parser.add_argument("--limit", required=True,help="limit no. of  evaluation")
     parser.add_argument("--save", action="store_true", help="Flag to save the evaluation results.")
+    parser.add_argument("--concurrency", type=int, default=8, help="Maximum number of judge calls in flight.")
+    parser.add_argument("--question_concurrency", type=int, default=4, help="Maximum number of questions answered at once.")
+    parser.add_argument("--max_retries", type=int, default=5, help="Retries of a rate limited judge call.")
+    parser.add_argument("--no_judge_cache", action="store_true", help="Call the judge for every metric, ignoring cached results.")
     args = parser.parse_args()
     nest_asyncio.apply()
-    asyncio.run(main(args.data_path, args.qa_json_path, args.output_file_name, args.limit, args.save))
+    asyncio.run(main(args.data_path, args.qa_json_path, args.output_file_name, args.limit, args.save,
+                     args.concurrency, args.question_concurrency, args.max_retries, not args.no_judge_cache))
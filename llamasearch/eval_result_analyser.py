@@ -8,10 +8,17 @@ import matplotlib.pyplot as plt
 
 
 def read_json(file_path):
-    """Read JSON file and return the data."""
+    """Read a JSON file, or the JSON lines written by llamasearch.eval, and return the results."""
     with open(file_path, 'r') as f:
-        data = json.load(f)
-    return data
+        if not file_path.endswith('.jsonl'):
+            return json.load(f)
+        # A question evaluated again (resumed run) keeps its last result
+        results = {}
+        for line in f:
+            if line.strip():
+                result = json.loads(line)
+                results[result['id']] = result
+        return list(results.values())
 
 def analyse(data):
     """Extract and organize metrics data."""
@@ -27,7 +34,7 @@ def analyse(data):
     for result in data:
         metrics = result.get('metrics', [])
         for metric in metrics:
-            if metric is None:
+            if metric is None or metric.get('score') is None:
                 continue
             name = metric.get('name')
             score = metric.get('score', 0)
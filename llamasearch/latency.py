@@ -1,11 +1,108 @@
 import time
 import asyncio
+import math
+from collections import Counter, deque
 from contextlib import contextmanager, asynccontextmanager
 import threading
 from tabulate import tabulate
-import statistics
 from llamasearch.settings import config
 from llamasearch.logger import logger
+from llamasearch import tracing
+from llamasearch.prometheus_metrics import METHOD_LATENCY
+
+# Bucket i holds latencies in [MIN_LATENCY * GROWTH**i, MIN_LATENCY * GROWTH**(i+1)),
+# ~180 buckets cover 0.1ms to an hour with percentiles accurate to within ~5%
+MIN_LATENCY = 1e-4
+GROWTH = 1.1
+WINDOW_SLICES = 10
+
+def _bucket(latency: float) -> int:
+    if latency <= MIN_LATENCY:
+        return 0
+    return int(math.log(latency / MIN_LATENCY, GROWTH))
+
+def _bucket_value(bucket: int) -> float:
+    # Geometric midpoint of the bucket
+    return MIN_LATENCY * GROWTH ** (bucket + 0.5)
+
+class LatencyHistogram:
+    """
+    Latency distribution of one method over a rolling time window.
+
+    The window is split into WINDOW_SLICES slices, each a sparse log-scale histogram, and
+    whole slices expire as time moves on. Lifetime counters are kept alongside.
+    """
+    def __init__(self, window_seconds: float):
+        self.window_seconds = window_seconds
+        self.slice_seconds = window_seconds / WINDOW_SLICES
+        self.count = 0
+        self.errors = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.last = None
+        # (slice index, bucket counts, count, total, max)
+        self._slices = deque()
+
+    def _current_slice(self, now: float) -> list:
+        index = int(now // self.slice_seconds)
+        if not self._slices or self._slices[-1][0] != index:
+            self._slices.append([index, Counter(), 0, 0.0, 0.0])
+        self._expire(index)
+        return self._slices[-1]
+
+    def _expire(self, index: int):
+        while self._slices and self._slices[0][0] <= index - WINDOW_SLICES:
+            self._slices.popleft()
+
+    def record(self, latency: float, error: bool = False, now: float = None):
+        self.count += 1
+        self.errors += error
+        self.total += latency
+        self.max = max(self.max, latency)
+        self.last = latency
+        current = self._current_slice(time.time() if now is None else now)
+        current[1][_bucket(latency)] += 1
+        current[2] += 1
+        current[3] += latency
+        current[4] = max(current[4], latency)
+
+    def snapshot(self, now: float = None) -> dict:
+        self._expire(int((time.time() if now is None else now) // self.slice_seconds))
+        buckets = Counter()
+        count, total, window_max = 0, 0.0, 0.0
+        for _, slice_buckets, slice_count, slice_total, slice_max in self._slices:
+            buckets.update(slice_buckets)
+            count += slice_count
+            total += slice_total
+            window_max = max(window_max, slice_max)
+        window = {"seconds": self.window_seconds, "count": count}
+        if count:
+            window.update(
+                mean=total / count,
+                p50=self._percentile(buckets, count, 0.50, window_max),
+                p90=self._percentile(buckets, count, 0.90, window_max),
+                p99=self._percentile(buckets, count, 0.99, window_max),
+                max=window_max,
+            )
+        return {
+            "count": self.count,
+            "errors": self.errors,
+            "total_seconds": self.total,
+            "max": self.max,
+            "last": self.last,
+            "window": window,
+        }
+
+    @staticmethod
+    def _percentile(buckets: Counter, count: int, quantile: float, upper: float) -> float:
+        rank = math.ceil(quantile * count)
+        seen = 0
+        for bucket in sorted(buckets):
+            seen += buckets[bucket]
+            if seen >= rank:
+                # The bucket midpoint can overshoot the largest value actually seen
+                return min(_bucket_value(bucket), upper)
+        return upper
 
 class LatencyTracker:
     _instance = None
@@ -16,68 +113,87 @@ class LatencyTracker:
             with cls._lock:
                 if cls._instance is None:
                     cls._instance = super(LatencyTracker, cls).__new__(cls)
-                    cls._instance.latencies = {}
-                    if config.application.enable_prometheus:
-                        from prometheus_client import Summary, start_http_server
-                        cls._instance.prometheus_summary = Summary('method_latency', 'Latency of pipeline calls', ['method'])
-                        start_http_server(8000)  # Start Prometheus metrics server
+                    cls._instance.histograms = {}
+                    cls._instance.window_seconds = config.application.latency_window_seconds
+                    cls._instance._record_lock = threading.Lock()
         return cls._instance
 
     @contextmanager
     def track(self, method_name):
-        start_time = time.time()
+        start_time = time.perf_counter()
+        error = False
         try:
-            yield
+            with tracing.span(method_name):
+                yield
+        except Exception:
+            error = True
+            raise
         finally:
-            end_time = time.time()
-            latency = end_time - start_time
-            self.record_latency(method_name, latency)
+            self.record_latency(method_name, time.perf_counter() - start_time, error)
 
     @asynccontextmanager
     async def track_async(self, method_name):
-        start_time = time.time()
+        start_time = time.perf_counter()
+        error = False
         try:
-            yield
+            with tracing.span(method_name):
+                yield
+        except Exception:
+            error = True
+            raise
         finally:
-            end_time = time.time()
-            latency = end_time - start_time
-            self.record_latency(method_name, latency)
+            self.record_latency(method_name, time.perf_counter() - start_time, error)
 
-    def record_latency(self, method_name, latency):
-        self.latencies[method_name] = latency
+    def record_latency(self, method_name, latency, error=False):
+        # Tracked methods also run in worker threads
+        with self._record_lock:
+            histogram = self.histograms.get(method_name)
+            if histogram is None:
+                histogram = self.histograms[method_name] = LatencyHistogram(self.window_seconds)
+            histogram.record(latency, error)
         if config.application.enable_prometheus:
-            self.prometheus_summary.labels(method=method_name).observe(latency)
+            METHOD_LATENCY.labels(method=method_name).observe(latency)
 
     def get_latency(self, method_name):
-        return self.latencies.get(method_name)
+        """Latency of the most recent call."""
+        histogram = self.histograms.get(method_name)
+        return histogram.last if histogram else None
+
+    def snapshot(self) -> dict:
+        """Per-method counters and rolling-window percentiles, in seconds."""
+        with self._record_lock:
+            return {method: histogram.snapshot() for method, histogram in sorted(self.histograms.items())}
 
     def print_summary(self):
-        headers = ["Method", "Latency (seconds)"]
-        table_data = [[method, f"{latency:.4f}"] for method, latency in self.latencies.items()]
+        headers = ["Method", "Last (s)", "Calls", "p50 (s)", "p99 (s)"]
+        table_data = [
+            [method, f"{stats['last']:.4f}", stats["count"], _format(stats["window"].get("p50")), _format(stats["window"].get("p99"))]
+            for method, stats in self.snapshot().items()
+        ]
         logger.info("\nLatency Summary:")
         print(tabulate(table_data, headers=headers, tablefmt="grid"))
 
     def report_stats(self):
-        if not self.latencies:
+        stats = self.snapshot()
+        if not stats:
             logger.info("No latency data available.")
             return
-        latencies = list(self.latencies.values())
-        stats = {
-            "Total Methods": len(latencies),
-            "Total Time": f"{sum(latencies):.4f}s",
-            "Average": f"{statistics.mean(latencies):.4f}s",
-            "Median": f"{statistics.median(latencies):.4f}s",
-            "Min": f"{min(latencies):.4f}s",
-            "Max": f"{max(latencies):.4f}s",
-            "Standard Deviation": f"{statistics.stdev(latencies):.4f}s" if len(latencies) > 1 else "N/A"
-        }
-        headers = ["Statistic", "Value"]
-        table_data = [[stat, value] for stat, value in stats.items()]
-        logger.info("\nLatency Statistics:")
+        headers = ["Method", "Calls", "Errors", "Mean (s)", "p50 (s)", "p90 (s)", "p99 (s)", "Max (s)"]
+        table_data = []
+        for method, method_stats in stats.items():
+            window = method_stats["window"]
+            table_data.append([
+                method, window["count"], method_stats["errors"], _format(window.get("mean")),
+                _format(window.get("p50")), _format(window.get("p90")), _format(window.get("p99")), _format(window.get("max")),
+            ])
+        logger.info(f"\nLatency Statistics (last {self.window_seconds}s):")
         print(tabulate(table_data, headers=headers, tablefmt="grid"))
 
+def _format(value):
+    return f"{value:.4f}" if value is not None else "N/A"
+
 def track_latency(func):
-    tracker = LatencyTracker()    
+    tracker = LatencyTracker()
     if asyncio.iscoroutinefunction(func):
         async def wrapper(*args, **kwargs):
             async with tracker.track_async(func.__name__):
@@ -86,5 +202,5 @@ def track_latency(func):
         def wrapper(*args, **kwargs):
             with tracker.track(func.__name__):
                 return func(*args, **kwargs)
-    
+
     return wrapper
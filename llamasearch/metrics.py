@@ -24,17 +24,32 @@ class MetricsEvaluator:
         self.config_loader.update_model_in_config()
         self.metrics = self.initialize_metrics()
 
-    def initialize_metrics(self) -> Dict[str, Any]:
-        """Initialize evaluation metrics using the configuration."""
+    def _initializers(self) -> Dict[str, Any]:
         return {
-            'answer_relevancy': self._init_answer_relevancy_metric(),
-            'faithfulness': self._init_faithfulness_metric(),
-            'contextual_precision': self._init_contextual_precision_metric(),
-            'contextual_recall': self._init_contextual_recall_metric(),
-            'contextual_relevancy': self._init_contextual_relevancy_metric(),
-            'coherence': self._init_coherence_metric(),
+            'answer_relevancy': self._init_answer_relevancy_metric,
+            'faithfulness': self._init_faithfulness_metric,
+            'contextual_precision': self._init_contextual_precision_metric,
+            'contextual_recall': self._init_contextual_recall_metric,
+            'contextual_relevancy': self._init_contextual_relevancy_metric,
+            'coherence': self._init_coherence_metric,
         }
 
+    def initialize_metrics(self) -> Dict[str, Any]:
+        """Initialize evaluation metrics using the configuration."""
+        return {metric_name: init() for metric_name, init in self._initializers().items()}
+
+    def create_metric(self, metric_name: str):
+        """
+        Creates a new instance of a metric.
+
+        Metrics keep the score and reason of their last measurement on the instance, so
+        measurements running concurrently each need their own.
+
+        Args:
+            metric_name: Key of the metric in the configuration, e.g. 'faithfulness'.
+        """
+        return self._initializers()[metric_name]()
+
     def _init_answer_relevancy_metric(self) -> AnswerRelevancyMetric:
         """Initializes the AnswerRelevancyMetric."""
         config = self.config_loader.config['metrics']['answer_relevancy']
@@ -1,5 +1,5 @@
 
-from typing import Any, List, Tuple, Dict, Optional
+from typing import Any, AsyncIterator, List, Tuple, Dict, Optional
 from tabulate import tabulate
 import asyncio
 from copy import deepcopy
@@ -9,18 +9,23 @@ from functools import partial
 
 from llamasearch.logger import logger
 from llamasearch.latency import track_latency, LatencyTracker
+from llamasearch import tracing
+from llamasearch.prometheus_metrics import PIPELINE_POOL_SIZE
 from llamasearch.utils import load_yaml_file, ensure_dummy_csv
 from llamasearch.settings import config
 from llamasearch.qdrant_hybrid_search import QdrantHybridSearch
+from llamasearch.cache import corpus_versions, retrieval_cache, answer_cache, normalize_query
+from llamasearch.content_store import content_store
 
 from llama_index.postprocessor.flag_embedding_reranker import (
     FlagEmbeddingReranker,
 )
 from llama_index.storage.docstore.redis import RedisDocumentStore
 from llama_index.core.node_parser import SentenceSplitter
-from llama_index.core import PromptTemplate
+from llama_index.core import PromptTemplate, QueryBundle
+from llama_index.core.schema import NodeWithScore
 from llama_index.llms.ollama import Ollama
-from llama_index.core import SimpleDirectoryReader, Settings
+from llama_index.core import SimpleDirectoryReader, Settings, Document
 from llama_index.core.ingestion import (
     DocstoreStrategy,
     IngestionPipeline,
@@ -83,6 +88,7 @@ class Pipeline:
         self.multi_tenancy = getattr(self.config.vector_store_config, 'multi_tenancy', False)
         self.if_eval_mode=False
         self.global_embed_model = global_embed_model
+        self.retrieval_signature = None
 
     async def setup(self):
         if self.is_setup_complete:
@@ -113,6 +119,8 @@ class Pipeline:
                     nodes = await self.ingest_documents(self.documents)
                     logger.info(f"Ingesting {len(nodes)} nodes for {len(self.ingestion.docstore.docs)} chunks")
                     await self.qdrant_search.add_nodes_to_index_async(nodes, self.tenant_id)
+                    if nodes:
+                        await self.bump_corpus_version()
                     logger.info("Ingestion pipeline setup completed.")
                 else:
                     await step_func()
@@ -125,6 +133,8 @@ class Pipeline:
             nodes = await self.ingest_documents(self.documents)
             logger.info(f"Ingesting {len(nodes)} nodes for {len(self.ingestion.docstore.docs)} chunks")
             await self.qdrant_search.add_nodes_to_index_async(nodes, self.tenant_id)
+            if nodes:
+                await self.bump_corpus_version()
             logger.info("Ingestion pipeline setup completed.")
 
         self.is_setup_complete = True
@@ -239,14 +249,115 @@ class Pipeline:
         self.query_engine.update_prompts(
             {"response_synthesizer:text_qa_template": qa_prompt_tmpl}
         )
+        # Same retriever and prompts, but the synthesizer streams tokens from the LLM
+        self.streaming_query_engine = self.qdrant_search.index.as_query_engine(streaming=True, **query_engine_kwargs)
+        self.streaming_query_engine.update_prompts(
+            {"response_synthesizer:text_qa_template": qa_prompt_tmpl}
+        )
+        # Anything that changes which nodes come back must be part of the retrieval cache key
+        self.retrieval_signature = (
+            self.config.vector_store_config.collection_name,
+            self.config.embedding.model,
+            top_k,
+            enable_hybrid,
+            self.config.vector_store_config.alpha,
+            self.multi_tenancy,
+        )
 
     @track_latency
-    async def perform_query_async(self, query: str):
+    async def perform_query_async(self, query: str, query_embedding: Optional[List[float]] = None):
         if not self.is_setup_complete:
             raise RuntimeError("Pipeline setup is not complete. Call setup() first.")
-        response = await self.query_engine.aquery(query)
+        # A precomputed embedding (e.g. from the answer cache lookup) saves re-embedding the query
+        query_bundle = QueryBundle(query, embedding=query_embedding)
+        nodes = await self.retrieve_async(query_bundle)
+        with tracing.span("synthesize", nodes=len(nodes)):
+            response = await self.query_engine.asynthesize(query_bundle, nodes)
         return response
 
+    @track_latency
+    async def astream_query_async(self, query: str, query_embedding: Optional[List[float]] = None):
+        """
+        Retrieves context and starts a streaming synthesis.
+
+        Returns the streaming response as soon as retrieval finishes; tokens are generated
+        while iterating it with aiter_response_tokens.
+        """
+        if not self.is_setup_complete:
+            raise RuntimeError("Pipeline setup is not complete. Call setup() first.")
+        query_bundle = QueryBundle(query, embedding=query_embedding)
+        nodes = await self.retrieve_async(query_bundle)
+        return await self.streaming_query_engine.asynthesize(query_bundle, nodes)
+
+    @staticmethod
+    async def aiter_response_tokens(response) -> AsyncIterator[str]:
+        if hasattr(response, "async_response_gen"):
+            async for token in response.async_response_gen():
+                yield token
+        else:
+            # Older llama-index StreamingResponse only exposes a sync generator, which blocks
+            # while the LLM generates, so each token is pulled on a worker thread
+            iterator = iter(response.response_gen)
+            end = object()
+            while True:
+                token = await asyncio.to_thread(next, iterator, end)
+                if token is end:
+                    return
+                yield token
+
+    @track_latency
+    async def retrieve_async(self, query_bundle: QueryBundle) -> List[NodeWithScore]:
+        """
+        Runs the query engine retrieval step, serving repeated queries from the retrieval cache.
+
+        Cache keys include the corpus version, so entries stop matching as soon as
+        documents are inserted or deleted in the corpus this pipeline searches.
+        """
+        if not self.config.cache.enable_retrieval_cache:
+            return await self.query_engine.aretrieve(query_bundle)
+        version = await corpus_versions.get(self.corpus_id)
+        if version is None:
+            return await self.query_engine.aretrieve(query_bundle)
+
+        cache_key = (self.tenant_id, version, normalize_query(query_bundle.query_str), self.retrieval_signature)
+        cached = retrieval_cache.get(cache_key)
+        if cached is not None:
+            nodes = await self._load_cached_nodes(cached)
+            if nodes is not None:
+                logger.debug(f"Retrieval cache hit for tenant {self.tenant_id}")
+                return nodes
+        nodes = await self.query_engine.aretrieve(query_bundle)
+        retrieval_cache.set(cache_key, [(node.node.node_id, node.score) for node in nodes])
+        return nodes
+
+    async def _load_cached_nodes(self, cached: List[Tuple[str, float]]) -> Optional[List[NodeWithScore]]:
+        """Rebuilds scored nodes from cached ids, returns None if any node can no longer be found."""
+        docstore = self.qdrant_search.index.docstore
+        nodes = {node_id: docstore.get_node(node_id, raise_error=False) for node_id, _ in cached}
+        missing = [node_id for node_id, node in nodes.items() if node is None]
+        if missing:
+            # Nodes indexed by an earlier process live only in Qdrant
+            for node in await self.qdrant_search.vector_store.aget_nodes(node_ids=missing):
+                nodes[node.node_id] = node
+        if any(node is None for node in nodes.values()):
+            return None
+        return [NodeWithScore(node=nodes[node_id], score=score) for node_id, score in cached]
+
+    @track_latency
+    async def aget_query_embedding(self, query: str) -> List[float]:
+        return await Settings.embed_model.aget_query_embedding(query)
+
+    @property
+    def corpus_id(self) -> Optional[str]:
+        """Whose corpus version guards the caches, None when all tenants search one shared collection."""
+        return self.tenant_id if self.multi_tenancy else None
+
+    async def bump_corpus_version(self):
+        if await corpus_versions.bump(self.corpus_id) is None:
+            # Without a new version, old entries would still match, drop them all instead
+            retrieval_cache.clear()
+            answer_cache.clear()
+
     async def insert_documents(self, file_paths):
         documents = await self.load_documents_async(input_files=file_paths)  
         for doc in documents:
@@ -255,6 +366,7 @@ class Pipeline:
         logger.info(f"Insertion :: Ingesting {len(nodes)} nodes for {len(self.ingestion.docstore.docs)} chunks")
         #await self.qdrant_search.add_nodes_to_index_async(nodes)
         await self.qdrant_search.add_nodes_to_index_async(nodes, self.tenant_id)
+        await self.bump_corpus_version()
         await self.setup_query_engine()
         return nodes
 
@@ -278,9 +390,43 @@ class Pipeline:
             reader_kwargs["input_files"] = [input_files] if isinstance(input_files, str) else input_files
         else:
             raise ValueError("Please provide either data_path or input_files.")
-        documents = SimpleDirectoryReader(**reader_kwargs).load_data()
+        if self.config.cache.enable_document_cache:
+            documents = await self._load_documents_cached(reader_kwargs)
+        else:
+            documents = SimpleDirectoryReader(**reader_kwargs).load_data()
+        for document in documents:
+            # The per-user path would make identical content embed differently for every user
+            if "file_path" not in document.excluded_embed_metadata_keys:
+                document.excluded_embed_metadata_keys.append("file_path")
         return documents
 
+    async def _load_documents_cached(self, reader_kwargs) -> List[Document]:
+        """Loads documents, reusing the stored parse of files whose content was parsed before."""
+        reader = SimpleDirectoryReader(**reader_kwargs)
+        file_paths = [str(path) for path in reader.input_files]
+        digests = await asyncio.gather(*(asyncio.to_thread(content_store.digest_for, path) for path in file_paths))
+
+        documents, misses = {}, []
+        for path, digest in zip(file_paths, digests):
+            cached = await asyncio.to_thread(content_store.load_documents, digest, path)
+            if cached is None:
+                misses.append((path, digest))
+            else:
+                documents[path] = cached
+        logger.info(f"Document cache: {len(documents)} of {len(file_paths)} file(s) already parsed")
+
+        if misses:
+            parsed = defaultdict(list)
+            miss_kwargs = {key: value for key, value in reader_kwargs.items() if key not in ("input_dir", "recursive")}
+            miss_kwargs["input_files"] = [path for path, _ in misses]
+            for document in SimpleDirectoryReader(**miss_kwargs).load_data():
+                parsed[os.path.abspath(document.metadata.get("file_path", ""))].append(document)
+            for path, digest in misses:
+                documents[path] = parsed.get(os.path.abspath(path), [])
+                if documents[path]:
+                    await asyncio.to_thread(content_store.save_documents, digest, documents[path])
+        return [document for path in file_paths for document in documents[path]]
+
     @staticmethod
     def get_context_from_response(response_object):
         """
@@ -362,10 +508,13 @@ class Pipeline:
 
         # Group document IDs by filename
         filename_to_doc_ids = defaultdict(list)
+        file_paths = set()
         for doc_id, doc in documents.items():
             filename = doc.metadata.get('file_name')
             if filename in filenames_to_delete:
                 filename_to_doc_ids[filename].append(doc_id)
+                if doc.metadata.get('file_path'):
+                    file_paths.add(doc.metadata['file_path'])
 
         # Prepare batch deletion tasks
         vector_store_tasks = []
@@ -386,11 +535,20 @@ class Pipeline:
             for filename in filename_to_doc_ids.keys():
                 deletion_results[filename] = "Deleted successfully"
                 logger.info(f"Successfully deleted all nodes for {filename}")
+            # Drop the uploaded files' links into the content store, collecting unreferenced blobs
+            for file_path in file_paths:
+                try:
+                    await asyncio.to_thread(content_store.release, file_path)
+                except OSError as e:
+                    logger.warning(f"Unable to release stored content of {file_path}: {e}")
         except Exception as e:
             logger.error(f"Error during batch deletion: {str(e)}")
             for filename in filename_to_doc_ids.keys():
                 deletion_results[filename] = f"Error: {str(e)}"
 
+        if filename_to_doc_ids:
+            await self.bump_corpus_version()
+
         # Handle filenames not found in the documents
         for filename in filenames_to_delete:
             if filename not in deletion_results:
@@ -406,6 +564,8 @@ class PipelineFactory:
         self.config = deepcopy(config)
         self.is_api_server = is_api_server
         self.global_embed_model= None
+        # Concurrent first queries for a user must not each build a pipeline
+        self._creation_locks: Dict[str, asyncio.Lock] = {}
 
     async def initialize_common_resources(self):
         # # TODO :: Initialize any shared resources here
@@ -420,8 +580,15 @@ class PipelineFactory:
         # without having wait during the first query call (will remove later)
         ensure_dummy_csv(user_dir)
         logger.info("User upload directory updated to: " + user_dir)
-        # Overriding the local config path to user specific directory for file uploads
-        self.config.application.data_path = user_dir
+        return user_dir
+
+    async def _pipeline_config(self, user_id: str):
+        """A copy of the factory config, with the user's upload directory as data path on the API server."""
+        config = deepcopy(self.config)
+        if self.is_api_server:
+            # The factory config keeps the shared data path, the next user's directory is built from it
+            config.application.data_path = await self.override_user_data_path(user_id)
+        return config
 
     async def create_pipeline_async(self, user_id: str, tenant_id: str) -> Pipeline:
         if user_id in self.pipelines:
@@ -429,12 +596,11 @@ class PipelineFactory:
             return self.pipelines[user_id]
 
         logger.info(f"Creating new pipeline for user {user_id} and tenant {tenant_id}")
-        if self.is_api_server:
-            await self.override_user_data_path(user_id)
-        pipeline = Pipeline(deepcopy(self.config), tenant_id, self.global_embed_model)
+        pipeline = Pipeline(await self._pipeline_config(user_id), tenant_id, self.global_embed_model)
         try:
             await pipeline.setup()
             self.pipelines[user_id] = pipeline
+            PIPELINE_POOL_SIZE.set(len(self.pipelines))
             logger.info(f"Pipeline setup completed successfully for user {user_id}")
             return pipeline
         except Exception as e:
@@ -442,19 +608,23 @@ class PipelineFactory:
             await self.cleanup_pipeline(user_id, pipeline)
             raise
 
+    @track_latency
     async def get_or_create_pipeline_async(self, user_id: str, tenant_id: str) -> Pipeline:
-        if user_id not in self.pipelines:
-            if self.is_api_server:
-                await self.override_user_data_path(user_id)
-            pipeline = Pipeline(deepcopy(self.config), tenant_id, self.global_embed_model)
-            await pipeline.setup()
-            self.pipelines[user_id] = pipeline
-            logger.info(f"Pipeline setup completed successfully for new user {user_id}")
+        if user_id in self.pipelines:
+            return self.pipelines[user_id]
+        async with self._creation_locks.setdefault(user_id, asyncio.Lock()):
+            if user_id not in self.pipelines:
+                pipeline = Pipeline(await self._pipeline_config(user_id), tenant_id, self.global_embed_model)
+                await pipeline.setup()
+                self.pipelines[user_id] = pipeline
+                PIPELINE_POOL_SIZE.set(len(self.pipelines))
+                logger.info(f"Pipeline setup completed successfully for new user {user_id}")
         return self.pipelines[user_id]
 
     async def cleanup_pipeline(self, user_id: str, pipeline: Pipeline = None):
         if pipeline is None:
             pipeline = self.pipelines.pop(user_id, None)
+            PIPELINE_POOL_SIZE.set(len(self.pipelines))
         if pipeline:
             try:
                 await pipeline.cleanup()
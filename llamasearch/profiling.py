@@ -0,0 +1,91 @@
+import cProfile
+import io
+import pstats
+import sys
+import threading
+import time
+from collections import Counter
+from typing import Optional
+
+# One sampling session and one cProfile session at a time per process
+_sampling_lock = threading.Lock()
+_cprofile_lock = threading.Lock()
+
+# Innermost Python frames of threads blocked waiting: Condition.wait, the event loop's
+# selector, idle ThreadPoolExecutor workers
+_IDLE_FRAMES = {"wait", "select", "poll", "_worker"}
+
+class ProfilerBusy(RuntimeError):
+    pass
+
+def _frame_label(frame) -> str:
+    code = frame.f_code
+    return f"{code.co_name} ({code.co_filename}:{code.co_firstlineno})"
+
+def sample_stacks(duration: float, interval: float = 0.005, include_idle: bool = False) -> Counter:
+    """
+    Samples the stacks of every other thread in the process for duration seconds.
+
+    Runs in the calling thread, so call it from a worker thread (asyncio.to_thread) to
+    profile the event loop. Returns collapsed stacks ("thread;outer;...;inner") -> samples.
+    Idle threads, whose innermost frame is a wait, are skipped unless include_idle.
+    """
+    if not _sampling_lock.acquire(blocking=False):
+        raise ProfilerBusy("A sampling profile is already running")
+    try:
+        own_id = threading.get_ident()
+        stacks = Counter()
+        deadline = time.monotonic() + duration
+        while time.monotonic() < deadline:
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own_id:
+                    continue
+                if not include_idle and frame.f_code.co_name in _IDLE_FRAMES:
+                    continue
+                labels = []
+                while frame is not None:
+                    labels.append(_frame_label(frame))
+                    frame = frame.f_back
+                labels.append(names.get(thread_id, str(thread_id)))
+                stacks[";".join(reversed(labels))] += 1
+            time.sleep(interval)
+        return stacks
+    finally:
+        _sampling_lock.release()
+
+def collapsed(stacks: Counter) -> str:
+    """Brendan Gregg's collapsed format, input for flamegraph.pl, speedscope or inferno."""
+    return "\n".join(f"{stack} {count}" for stack, count in stacks.most_common())
+
+class RequestProfile:
+    """
+    cProfile over a block of code, for profiling a single request.
+
+    cProfile follows the thread, not the task: on the event loop it also records whatever
+    other requests run while this one awaits. If another request is already being
+    profiled, the block runs unprofiled and report() says so.
+    """
+    def __init__(self, sort_by: str = "cumulative", limit: int = 40):
+        self.sort_by = sort_by
+        self.limit = limit
+        self.profiler: Optional[cProfile.Profile] = None
+
+    def __enter__(self):
+        if _cprofile_lock.acquire(blocking=False):
+            self.profiler = cProfile.Profile()
+            self.profiler.enable()
+        return self
+
+    def __exit__(self, *exc_info):
+        if self.profiler is not None:
+            self.profiler.disable()
+            _cprofile_lock.release()
+        return False
+
+    def report(self) -> str:
+        if self.profiler is None:
+            return "Not profiled: another request was being profiled"
+        stream = io.StringIO()
+        pstats.Stats(self.profiler, stream=stream).sort_stats(self.sort_by).print_stats(self.limit)
+        return stream.getvalue()
@@ -0,0 +1,54 @@
+"""
+Prometheus metrics for the API server and the pipeline, served at /metrics on the API app.
+
+With several uvicorn workers, set PROMETHEUS_MULTIPROC_DIR to an empty directory shared
+by the workers (docker/entrypoint.sh clears it on start). Each worker then writes its
+samples there and any worker's /metrics aggregates all of them.
+"""
+import os
+from typing import Tuple
+
+from prometheus_client import CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, Counter, Gauge, Histogram, generate_latest, multiprocess
+
+MULTIPROCESS = bool(os.environ.get("PROMETHEUS_MULTIPROC_DIR"))
+
+LATENCY_BUCKETS = (.005, .01, .025, .05, .1, .25, .5, 1, 2.5, 5, 10, 30, 60, 120)
+
+HTTP_REQUESTS = Counter(
+    "http_requests_total", "HTTP requests by route and status", ["method", "route", "status"]
+)
+HTTP_REQUEST_LATENCY = Histogram(
+    "http_request_duration_seconds", "HTTP request latency by route", ["method", "route"], buckets=LATENCY_BUCKETS
+)
+HTTP_REQUESTS_IN_PROGRESS = Gauge(
+    "http_requests_in_progress", "HTTP requests being served", ["method", "route"], multiprocess_mode="livesum"
+)
+METHOD_LATENCY = Histogram(
+    "method_latency_seconds", "Latency of pipeline calls", ["method"], buckets=LATENCY_BUCKETS
+)
+PIPELINE_POOL_SIZE = Gauge(
+    "pipeline_pool_size", "Per-user pipelines held in memory", multiprocess_mode="livesum"
+)
+CACHE_REQUESTS = Counter(
+    "cache_requests_total", "Cache lookups by cache and outcome", ["cache", "result"]
+)
+INGESTION_QUEUE_DEPTH = Gauge(
+    "ingestion_queue_depth", "Embedded batches waiting to be upserted into the vector store", multiprocess_mode="livesum"
+)
+WEBSOCKET_CONNECTIONS = Gauge(
+    "websocket_connections", "Open WebSocket connections", multiprocess_mode="livesum"
+)
+
+def render() -> Tuple[bytes, str]:
+    """Returns the exposition payload and its content type."""
+    if MULTIPROCESS:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    return generate_latest(registry), CONTENT_TYPE_LATEST
+
+def mark_process_dead():
+    """Drops this worker's live gauges from the aggregate, call on shutdown."""
+    if MULTIPROCESS:
+        multiprocess.mark_process_dead(os.getpid())
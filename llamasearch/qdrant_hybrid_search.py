@@ -2,6 +2,8 @@ from typing import List, Tuple, Optional
 from collections import OrderedDict
 from llamasearch.logger import logger
 from llamasearch.latency import track_latency
+from llamasearch.bulk_indexer import BulkUpsertEngine
+from llamasearch.cache import embedding_cache
 
 import torch
 from qdrant_client import QdrantClient, AsyncQdrantClient, models
@@ -12,14 +14,18 @@ from llama_index.vector_stores.qdrant import QdrantVectorStore
 
 class QdrantHybridSearch:
     """Manages Qdrant vector store operations for hybrid search."""
-    def __init__(self, config):
+    def __init__(self, config, sparse_doc_fn=None, sparse_query_fn=None):
         self.latency_profile = {}
         self.vector_store = None
         self.index = None
         self.vectordb_config = config.vector_store_config
         self.vectordb_client_config = config.qdrant_client_config
+        self.enable_embedding_cache = config.cache.enable_embedding_cache
         self._client = None
         self._aclient = None
+        # Sparse encoders for hybrid search, llama-index's default sparse model when None
+        self.sparse_doc_fn = sparse_doc_fn
+        self.sparse_query_fn = sparse_query_fn
         self.multi_tenancy = getattr(self.vectordb_config, 'multi_tenancy', False)
         logger.info(f"Multi tenancy: {self.multi_tenancy}")
 
@@ -35,6 +41,15 @@ class QdrantHybridSearch:
     async def initialize_qdrant_client_async(self):
         """Initialize the Qdrant client connection asynchronously."""
         try:
+            location = self.vectordb_client_config.location
+            if location:
+                # A sync and an async local client would each hold their own points (or
+                # contend for the directory lock), so in-process Qdrant is async only
+                if location == ":memory:":
+                    self._aclient = AsyncQdrantClient(location=location)
+                else:
+                    self._aclient = AsyncQdrantClient(path=location)
+                return
             self._aclient = AsyncQdrantClient(
                 url=self.vectordb_client_config.url,
                 prefer_grpc=self.vectordb_client_config.prefer_grpc
@@ -109,12 +124,17 @@ class QdrantHybridSearch:
             print(f"Creating vector store for collection {collection_name}")
             vector_store_config = {
                 "collection_name": collection_name,
-                "client": self.client,
+                "client": self._client,
                 "aclient": self.aclient,
                 "enable_hybrid": True,
                 "batch_size": self.vectordb_config.batch_size,
                 "hybrid_fusion_fn": self.relative_score_fusion,
             }
+            if self.sparse_doc_fn is not None:
+                vector_store_config.update({
+                    "sparse_doc_fn": self.sparse_doc_fn,
+                    "sparse_query_fn": self.sparse_query_fn or self.sparse_doc_fn,
+                })
             if self.multi_tenancy and tenant_id:
                 vector_store_config.update({
                     "metadata_payload_key": "tenant_id" if tenant_id else None
@@ -139,11 +159,14 @@ class QdrantHybridSearch:
         if self.multi_tenancy and tenant_id:
             for node in nodes:
                 node.metadata["tenant_id"] = tenant_id
-        await self.index._async_add_nodes_to_index(
-            self.index.index_struct,
-            nodes,
-            show_progress = True
+                # Filter-only metadata, keep it out of the embedded text
+                if "tenant_id" not in node.excluded_embed_metadata_keys:
+                    node.excluded_embed_metadata_keys.append("tenant_id")
+        engine = BulkUpsertEngine(
+            self.index, self.vector_store, self.aclient, self.vectordb_config,
+            embedding_cache=embedding_cache if self.enable_embedding_cache else None
         )
+        await engine.run(nodes)
 
     def sparse_doc_vectors(
         self,
@@ -1,3 +1,4 @@
+from typing import Optional
 from pydantic import BaseModel, Field
 from dotenv import load_dotenv
 import yaml
@@ -18,6 +19,11 @@ class VectorStoreConfig(BaseModel):
     vector_size: int = 1536
     distance: str = "Cosine"
     batch_size: int = 30
+    upsert_parallelism: int = 4
+    adaptive_batch_size: bool = True
+    min_batch_size: int = 8
+    max_batch_size: int = 256
+    target_batch_latency: float = 2.0
     alpha: float = 0.5
     top_k: int = 10
     use_async: bool = False
@@ -27,11 +33,25 @@ class VectorStoreConfig(BaseModel):
 class QdrantClientConfig(BaseModel):
     url: str = "http://localhost:6333"
     prefer_grpc: bool = False
+    location: Optional[str] = None # ":memory:" or a directory runs Qdrant in-process instead of connecting to url
 
 class RedisConfig(BaseModel):
     host: str = "localhost"
     port: int = 6379
 
+class CacheConfig(BaseModel):
+    enable_retrieval_cache: bool = True
+    retrieval_cache_size: int = 2048
+    retrieval_cache_ttl: int = 3600
+    enable_answer_cache: bool = True
+    answer_cache_size: int = 1024
+    answer_cache_size_per_tenant: int = 256
+    answer_cache_ttl: int = 3600
+    answer_similarity_threshold: float = 0.95
+    enable_document_cache: bool = True
+    enable_embedding_cache: bool = True
+    embedding_cache_ttl: int = 7 * 24 * 3600
+
 class Embedding(BaseModel):
     # model: str = "local:BAAI/bge-small-en-v1.5"
     model: str = "Alibaba-NLP/gte-Qwen2-1.5B-instruct" # 13048 MiB memory
@@ -57,7 +77,9 @@ class ApplicationConfig(BaseModel):
     data_path: str = Field(default="data/sample-docs/", env="DATA_PATH")
     log_dir: str = Field(default="data/app/logs", env="LOG_DIR")
     upload_subdir: str = "uploads"
+    blob_subdir: str = ".blobs"
     enable_prometheus: bool = False
+    latency_window_seconds: int = 300
     eval_data_path: str = Field(default="data/eval/document/", env="DATA_PATH")
 
     def __init__(self, **data):
@@ -75,6 +97,14 @@ class ApplicationConfig(BaseModel):
     def get_log_dir(self):
         return get_path(self.log_dir)
 
+class TracingConfig(BaseModel):
+    # Export every API request's span tree; ?debug_timing=1 on /query/ works regardless
+    enable: bool = False
+    exporter: str = "json"  # json | otlp
+    json_path: str = "data/app/traces.jsonl"
+    otlp_endpoint: str = "http://localhost:4318/v1/traces"
+    service_name: str = "llamasearch"
+
 class DatasetGeneration(BaseModel):
     model: str = "gpt-4o"
     use_openai: bool = True
@@ -84,6 +114,8 @@ class Config(BaseModel):
     qdrant_client_config: QdrantClientConfig = QdrantClientConfig()
     vector_store_config: VectorStoreConfig = VectorStoreConfig()
     redis_config: RedisConfig = RedisConfig()
+    cache: CacheConfig = CacheConfig()
+    tracing: TracingConfig = TracingConfig()
     embedding: Embedding = Embedding()
     reranker: Reranker = Reranker()
     llm: Llm = Llm()
@@ -1,25 +1,49 @@
-import cProfile
-import pstats
+import asyncio
 import tempfile
 import shutil
 import os, streamlit as st
 from typing import List
-from llamasearch.pipeline import query_app
+from llamasearch.pipeline import PipelineFactory
+from llamasearch.profiling import RequestProfile
+from llamasearch.settings import config
 
-def profile_app(config_path: str, query: str) -> None:
+async def query_files(query: str, file_paths: List[str], user_id: str = "streamlit", tenant_id: str = "streamlit") -> str:
     """
-    Profiles the performance of the query_app function.
+    Indexes the files into a pipeline and answers the query over them.
 
     Args:
-        config_path: The path to the configuration file.
         query: The query string to search the index.
+        file_paths: The files to index before querying.
+
+    Returns:
+        The generated answer.
+    """
+    factory = PipelineFactory(config)
+    try:
+        await factory.initialize_common_resources()
+        pipeline = await factory.get_or_create_pipeline_async(user_id, tenant_id)
+        await pipeline.insert_documents(file_paths)
+        response = await pipeline.perform_query_async(query)
+        return response.response
+    finally:
+        await factory.cleanup_all()
+
+def profile_app(query: str, file_paths: List[str], limit: int = 30) -> str:
+    """
+    Profiles query_files and prints the functions with the highest cumulative time.
+
+    Args:
+        query: The query string to search the index.
+        file_paths: The files to index before querying.
+        limit: The number of functions to print.
+
+    Returns:
+        The generated answer.
     """
-    profiler = cProfile.Profile()
-    profiler.enable()
-    query_app(config_path, query)
-    profiler.disable()
-    stats = pstats.Stats(profiler).sort_stats('cumulative')
-    stats.print_stats(10)
+    with RequestProfile(limit=limit) as request_profile:
+        answer = asyncio.run(query_files(query, file_paths))
+    print(request_profile.report())
+    return answer
 
 def save_uploaded_files(directory: str, uploaded_files: List) -> List[str]:
     """
@@ -43,7 +67,7 @@ def save_uploaded_files(directory: str, uploaded_files: List) -> List[str]:
     return file_paths
 
 if __name__ == "__main__":
-    # profile_app(config_path='config.yml')
+    # profile_app("What is this document about?", ["data/test_docs/paul_graham_essay.txt"])
     st.title("Ask Enterprise Search..")
     uploaded_files = st.file_uploader("Choose a file to upload", type=['txt', 'pdf', 'docx', 'xlsx'], accept_multiple_files=True)
     # Check if files were uploaded successfully
@@ -51,11 +75,10 @@ if __name__ == "__main__":
         # Create a temporary directory to store the uploaded files
         temp_dir = tempfile.mkdtemp()
         # Save the uploaded files to the temporary directory
-        save_uploaded_files(temp_dir, uploaded_files)
+        file_paths = save_uploaded_files(temp_dir, uploaded_files)
         st.success(f"Uploaded {len(uploaded_files)} files.")
     
     query = st.text_input("What would you like to ask?")
-    config_path='config.yml'
     
     if st.button("Submit"):
         if not query.strip():
@@ -64,7 +87,7 @@ if __name__ == "__main__":
             st.error("Please upload a file.")
         else:
             try:
-                response = query_app(config_path, query, temp_dir)
+                response = asyncio.run(query_files(query, file_paths))
                 st.success(f"Response: {response}")
             except Exception as e:
                 st.error(f"An error occurred: {e}")
@@ -0,0 +1,255 @@
+import json
+import os
+import queue
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Dict, List, Optional
+
+import requests
+
+from llamasearch.settings import config, get_path
+from llamasearch.logger import logger
+
+_current_trace: ContextVar[Optional["Trace"]] = ContextVar("current_trace", default=None)
+_current_span: ContextVar[Optional["Span"]] = ContextVar("current_span", default=None)
+
+class Span:
+    __slots__ = ("name", "span_id", "parent_id", "tags", "start_ns", "_start", "_end", "error")
+
+    def __init__(self, name: str, parent: Optional["Span"] = None, **tags):
+        self.name = name
+        self.span_id = uuid.uuid4().hex[:16]
+        self.parent_id = parent.span_id if parent else None
+        self.tags = tags
+        self.start_ns = time.time_ns()
+        self._start = time.perf_counter()
+        self._end = None
+        self.error = None
+
+    def finish(self, error: Optional[BaseException] = None):
+        self._end = time.perf_counter()
+        if error is not None:
+            self.error = f"{type(error).__name__}: {error}"
+
+    @property
+    def duration(self) -> float:
+        """Seconds, up to now if the span is still open."""
+        return (self._end if self._end is not None else time.perf_counter()) - self._start
+
+    def to_dict(self) -> Dict[str, Any]:
+        data = {
+            "name": self.name,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "start_ns": self.start_ns,
+            "duration_ms": round(self.duration * 1000, 3),
+        }
+        if self._end is None:
+            data["open"] = True
+        if self.tags:
+            data["tags"] = self.tags
+        if self.error:
+            data["error"] = self.error
+        return data
+
+class Trace:
+    """One request: a root span plus every span opened while it was the current trace."""
+    def __init__(self, name: str, **tags):
+        self.trace_id = uuid.uuid4().hex
+        self.tags = tags
+        self.root = Span(name)
+        # Appended from the event loop and from worker threads; list.append is atomic
+        self.spans: List[Span] = [self.root]
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "trace_id": self.trace_id,
+            "tags": self.tags,
+            "duration_ms": round(self.root.duration * 1000, 3),
+            "spans": [span.to_dict() for span in self.spans],
+        }
+
+def current_trace() -> Optional[Trace]:
+    return _current_trace.get()
+
+def tag(**tags):
+    """Adds tags (e.g. tenant_id once the user is known) to the current trace."""
+    trace = _current_trace.get()
+    if trace is not None:
+        trace.tags.update({k: v for k, v in tags.items() if v is not None})
+
+@contextmanager
+def start_trace(name: str, export: bool = True, **tags):
+    trace = Trace(name, **tags)
+    trace_token = _current_trace.set(trace)
+    span_token = _current_span.set(trace.root)
+    error = None
+    try:
+        yield trace
+    except BaseException as e:
+        error = e
+        raise
+    finally:
+        trace.root.finish(error)
+        _current_span.reset(span_token)
+        _current_trace.reset(trace_token)
+        if export and exporter is not None:
+            exporter.submit(trace)
+
+@contextmanager
+def span(name: str, **tags):
+    """Times a nested span of the current trace, a no-op outside of one."""
+    trace = _current_trace.get()
+    if trace is None:
+        yield None
+        return
+    current = Span(name, _current_span.get(), **tags)
+    trace.spans.append(current)
+    token = _current_span.set(current)
+    error = None
+    try:
+        yield current
+    except BaseException as e:
+        error = e
+        raise
+    finally:
+        current.finish(error)
+        _current_span.reset(token)
+
+class JsonFileExporter:
+    """Appends one JSON line per trace."""
+    def __init__(self, path: str):
+        self.path = path
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+
+    def export(self, traces: List[Trace]):
+        with open(self.path, "a") as f:
+            for trace in traces:
+                f.write(json.dumps(trace.to_dict(), default=str) + "\n")
+
+class OTLPExporter:
+    """Posts traces as OTLP/HTTP JSON, to a collector or anything that accepts the format."""
+    def __init__(self, endpoint: str, service_name: str):
+        self.endpoint = endpoint
+        self.service_name = service_name
+
+    @staticmethod
+    def _attributes(tags: Dict[str, Any]) -> List[Dict[str, Any]]:
+        return [{"key": key, "value": {"stringValue": str(value)}} for key, value in tags.items()]
+
+    def _span(self, trace: Trace, span: Span) -> Dict[str, Any]:
+        data = {
+            "traceId": trace.trace_id,
+            "spanId": span.span_id,
+            "name": span.name,
+            "kind": 1,
+            "startTimeUnixNano": str(span.start_ns),
+            "endTimeUnixNano": str(span.start_ns + int(span.duration * 1e9)),
+            "attributes": self._attributes({**trace.tags, **span.tags}),
+            # STATUS_CODE_ERROR / STATUS_CODE_UNSET
+            "status": {"code": 2, "message": span.error} if span.error else {"code": 0},
+        }
+        if span.parent_id:
+            data["parentSpanId"] = span.parent_id
+        return data
+
+    def export(self, traces: List[Trace]):
+        payload = {"resourceSpans": [{
+            "resource": {"attributes": self._attributes({"service.name": self.service_name})},
+            "scopeSpans": [{
+                "scope": {"name": "llamasearch.tracing"},
+                "spans": [self._span(trace, span) for trace in traces for span in trace.spans],
+            }],
+        }]}
+        response = requests.post(self.endpoint, json=payload, timeout=10)
+        response.raise_for_status()
+
+class BackgroundExporter:
+    """Exports finished traces from a daemon thread so requests never wait on file or network I/O."""
+    def __init__(self, exporter, max_queue_size: int = 10000, batch_size: int = 100):
+        self.exporter = exporter
+        self.batch_size = batch_size
+        self._queue: "queue.Queue[Trace]" = queue.Queue(maxsize=max_queue_size)
+        self._thread = threading.Thread(target=self._run, name="trace-exporter", daemon=True)
+        self._thread.start()
+
+    def submit(self, trace: Trace):
+        try:
+            self._queue.put_nowait(trace)
+        except queue.Full:
+            logger.warning(f"Trace export queue full, dropping trace {trace.trace_id}")
+
+    def _run(self):
+        while True:
+            batch = [self._queue.get()]
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            try:
+                self.exporter.export(batch)
+            except Exception as e:
+                logger.warning(f"Failed to export {len(batch)} traces: {str(e)}")
+
+def _create_exporter(tracing_config) -> Optional[BackgroundExporter]:
+    if not tracing_config.enable:
+        return None
+    if tracing_config.exporter == "otlp":
+        return BackgroundExporter(OTLPExporter(tracing_config.otlp_endpoint, tracing_config.service_name))
+    if tracing_config.exporter == "json":
+        return BackgroundExporter(JsonFileExporter(get_path(tracing_config.json_path)))
+    raise ValueError(f"Unknown trace exporter: {tracing_config.exporter}")
+
+exporter = _create_exporter(config.tracing)
+
+def instrument_llama_index() -> bool:
+    """
+    Records llama-index's own instrumentation spans (embedding, retrieval, synthesis, LLM
+    calls) as spans of the current trace.
+    """
+    try:
+        from llama_index.core.instrumentation import get_dispatcher
+        from llama_index.core.instrumentation.span import BaseSpan
+        from llama_index.core.instrumentation.span_handlers import BaseSpanHandler
+    except ImportError:
+        logger.debug("llama-index instrumentation not available, pipeline internals will not be traced")
+        return False
+
+    class TracedSpan(BaseSpan):
+        span: Any = None
+
+    class TraceSpanHandler(BaseSpanHandler[TracedSpan]):
+        @classmethod
+        def class_name(cls) -> str:
+            return "TraceSpanHandler"
+
+        def new_span(self, id_: str, bound_args, instance=None, parent_span_id=None, tags=None, **kwargs):
+            trace = _current_trace.get()
+            if trace is None:
+                return None
+            parent = self.open_spans.get(parent_span_id) if parent_span_id else None
+            # Span ids are "<qualified method name>-<uuid>"
+            traced = Span(id_.partition("-")[0], parent.span if parent else _current_span.get())
+            trace.spans.append(traced)
+            return TracedSpan(id_=id_, parent_id=parent_span_id, span=traced)
+
+        def prepare_to_exit_span(self, id_: str, bound_args, instance=None, result=None, **kwargs):
+            traced = self.open_spans.get(id_)
+            if traced is not None:
+                traced.span.finish()
+            return traced
+
+        def prepare_to_drop_span(self, id_: str, bound_args, instance=None, err=None, **kwargs):
+            traced = self.open_spans.get(id_)
+            if traced is not None:
+                traced.span.finish(err)
+            return traced
+
+    dispatcher = get_dispatcher()
+    if not any(handler.class_name() == TraceSpanHandler.class_name() for handler in dispatcher.span_handlers):
+        dispatcher.add_span_handler(TraceSpanHandler())
+    return True
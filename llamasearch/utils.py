@@ -1,4 +1,3 @@
-from prometheus_client import Summary
 from llamasearch.logger import logger
 from typing import Dict, Any
 from functools import lru_cache
@@ -7,15 +6,6 @@ import traceback
 import sys
 import csv
 
-# Metrics dictionary to hold all metrics instances
-metrics = {}
-
-def get_function_metric(func_name):
-    """Retrieve or create a Summary metric for a specific function."""
-    if func_name not in metrics:
-        metrics[func_name] = Summary(f'{func_name}_query_time_seconds', f'Time spent executing {func_name}')
-    return metrics[func_name]
-
 @lru_cache(maxsize=1000)
 def dummy_file_checked(directory: str) -> bool:
     return os.path.exists(os.path.join(directory, "dummy.csv"))
@@ -3,7 +3,10 @@ import pytest
 import websockets
 import json
 import base64
+import hashlib
 import os
+import struct
+import uuid
 from .base_api_test import BaseAPITest
 
 class TestWebSocketAPI(BaseAPITest):
@@ -109,6 +112,44 @@ class TestWebSocketAPI(BaseAPITest):
         self.assert_valid_response(response2, 1)
         assert len(response2['metadata']['file_upload']) == 0
 
+    @pytest.mark.asyncio
+    async def test_query_with_chunked_upload(self, authenticated_websocket, test_files):
+        file_path = test_files['file1']
+        with open(file_path, 'rb') as file:
+            content = file.read()
+        await authenticated_websocket.send(json.dumps({
+            "type": "upload_begin",
+            "filename": os.path.basename(file_path),
+            "size": len(content),
+            "sha256": hashlib.sha256(content).hexdigest()
+        }))
+        ready = await self.receive_type(authenticated_websocket, "upload_ready")
+        upload_id = uuid.UUID(ready['upload_id'])
+
+        for offset in range(ready['offset'], len(content), 64 * 1024):
+            header = struct.pack(">16sQ", upload_id.bytes, offset)
+            await authenticated_websocket.send(header + content[offset:offset + 64 * 1024])
+        await authenticated_websocket.send(json.dumps({"type": "upload_end", "upload_id": str(upload_id)}))
+        complete = await self.receive_type(authenticated_websocket, "upload_complete")
+        assert complete['result']['status'] == "success"
+
+        await authenticated_websocket.send(json.dumps({
+            "type": "query",
+            "query": self.test_qa_dict[2]['query'],
+            "upload_ids": [str(upload_id)],
+            "session_id": "test_session"
+        }))
+        response = await self.receive_response(authenticated_websocket)
+        self.assert_valid_response(response, 2)
+        assert len(response['metadata']['file_upload']) == 1
+
+    async def receive_type(self, websocket, message_type):
+        while True:
+            data = json.loads(await websocket.recv())
+            if data["type"] == message_type:
+                return data
+            assert data["type"] not in ("error", "upload_error"), data
+
     async def send_and_receive_query(self, websocket, query, files=None):
         query_message = {
             "type": "query",
@@ -0,0 +1,11 @@
+import shutil
+import tempfile
+
+from llamasearch import settings
+
+# llamasearch.logger opens its log file on import, keep test runs out of the app's data/app/logs
+LOG_DIR = tempfile.mkdtemp(prefix="llamasearch-unit-logs-")
+settings.config.application.log_dir = LOG_DIR
+
+def pytest_unconfigure(config):
+    shutil.rmtree(LOG_DIR, ignore_errors=True)
@@ -0,0 +1,39 @@
+from argparse import Namespace
+
+import pytest
+from llama_index.core import Settings
+
+from benchmarks import bench_ingestion, bench_retrieval
+
+@pytest.fixture(autouse=True)
+def restore_embed_model(monkeypatch):
+    # The benchmarks set the global embedding model
+    monkeypatch.setattr(Settings, "_embed_model", Settings._embed_model)
+
+class TestIngestionBenchmark:
+    async def test_reports_every_stage(self, tmp_path):
+        source_dir = tmp_path / "docs"
+        source_dir.mkdir()
+        rows = [f"{i},Hybrid search combines dense and sparse retrieval over chunk {i} of the corpus" for i in range(200)]
+        (source_dir / "notes.csv").write_text("id,text\n" + "\n".join(rows), encoding="utf-8")
+        args = Namespace(source_dir=str(source_dir), replicas=2, workers=[1, 2], chunk_size=128, chunk_overlap=16,
+                         embed_batch_size=8, embed_model="hash", embedding_dim=32, sparse="hash",
+                         document_cache=False, qdrant_url=None)
+        report = await bench_ingestion.main(args)
+        assert report["files"] == 2
+        for result in report["results"]:
+            stages = result["stages"]
+            assert list(stages) == ["load", "split", "embed", "upsert"]
+            assert stages["upsert"]["points"] == stages["split"]["chunks"] > 0
+
+class TestRetrievalBenchmark:
+    async def test_reports_every_mode(self):
+        args = Namespace(sizes=[200], queries=10, top_k=5, alphas=[0.2, 0.8], chunk_words=30, query_words=6,
+                         vocabulary_size=2000, embed_model="hash", embedding_dim=32, sparse="hash", qdrant_url=None,
+                         hnsw_m=None, hnsw_ef_construct=None, hnsw_ef=None, quantization=None)
+        report = await bench_retrieval.main(args)
+        [result] = report["results"]
+        # Queries are words of a known chunk, the benchmark is only meaningful if those come back
+        assert result["sparse"]["hit_rate@5"] > 0.5
+        assert result["dense"]["recall@5"] > 0.5
+        assert [hybrid["alpha"] for hybrid in result["hybrid"]] == [0.2, 0.8]
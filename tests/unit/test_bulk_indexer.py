@@ -0,0 +1,92 @@
+import uuid
+import zlib
+from types import SimpleNamespace
+
+import pytest
+from llama_index.core import Settings, VectorStoreIndex
+from llama_index.core.embeddings import MockEmbedding
+from llama_index.core.schema import TextNode
+from llama_index.vector_stores.qdrant import QdrantVectorStore
+from qdrant_client import AsyncQdrantClient, models
+
+from llamasearch.bulk_indexer import AdaptiveBatchSizer, BulkUpsertEngine
+
+EMBED_DIM = 8
+COLLECTION = "bulk"
+
+def hash_sparse_vectors(texts):
+    indices, values = [], []
+    for text in texts:
+        tokens = sorted({zlib.crc32(token.encode()) % 1000 for token in text.split()})
+        indices.append(tokens)
+        values.append([1.0] * len(tokens))
+    return indices, values
+
+def vectordb_config(**overrides):
+    config = dict(upsert_parallelism=2, batch_size=4, min_batch_size=1, max_batch_size=16,
+                  target_batch_latency=1.0, adaptive_batch_size=False)
+    config.update(overrides)
+    return SimpleNamespace(**config)
+
+@pytest.fixture
+def embed_model(monkeypatch):
+    model = MockEmbedding(embed_dim=EMBED_DIM)
+    monkeypatch.setattr(Settings, "_embed_model", model)
+    return model
+
+@pytest.fixture
+async def aclient():
+    client = AsyncQdrantClient(location=":memory:")
+    yield client
+    await client.close()
+
+def make_engine(aclient, embed_model, **config):
+    # Async-only client, as QdrantHybridSearch sets up for a local location
+    vector_store = QdrantVectorStore(
+        collection_name=COLLECTION, aclient=aclient, enable_hybrid=True,
+        sparse_doc_fn=hash_sparse_vectors, sparse_query_fn=hash_sparse_vectors,
+    )
+    index = VectorStoreIndex.from_vector_store(vector_store, embed_model, store_nodes_override=True)
+    return BulkUpsertEngine(index, vector_store, aclient, vectordb_config(**config))
+
+def make_nodes(count: int):
+    return [TextNode(text=f"chunk {i} about topic {i % 3}", id_=str(uuid.UUID(int=i + 1))) for i in range(count)]
+
+class TestBulkUpsertEngine:
+    async def test_upserts_into_existing_collection(self, aclient, embed_model):
+        # Created the way QdrantHybridSearch.create_collection_async does, with the older sparse vector name
+        await aclient.create_collection(
+            collection_name=COLLECTION,
+            vectors_config={"text-dense": models.VectorParams(size=EMBED_DIM, distance=models.Distance.COSINE)},
+            sparse_vectors_config={"text-sparse": models.SparseVectorParams(index=models.SparseIndexParams())},
+        )
+        engine = make_engine(aclient, embed_model)
+        nodes = make_nodes(10)
+        assert await engine.run(nodes) == 10
+        assert engine.vector_store.sparse_vector_name == "text-sparse"
+        assert (await aclient.count(COLLECTION)).count == 10
+        assert set(engine.index.index_struct.nodes_dict.values()) == {node.node_id for node in nodes}
+        assert engine.index.docstore.get_node(nodes[3].node_id).embedding is None
+
+    async def test_creates_missing_collection(self, aclient, embed_model):
+        engine = make_engine(aclient, embed_model, upsert_parallelism=3)
+        assert await engine.run(make_nodes(7)) == 7
+        assert (await aclient.count(COLLECTION)).count == 7
+
+    async def test_no_nodes(self, aclient, embed_model):
+        engine = make_engine(aclient, embed_model)
+        assert await engine.run([]) == 0
+        assert not await aclient.collection_exists(COLLECTION)
+
+class TestAdaptiveBatchSizer:
+    def test_grows_and_shrinks_within_bounds(self):
+        sizer = AdaptiveBatchSizer(initial_size=8, min_size=2, max_size=16, target_latency=1.0)
+        sizer.observe(8, 0.1)
+        assert sizer.size == 16
+        sizer.observe(16, 0.1)
+        assert sizer.size == 16
+        sizer.observe(16, 2.0)
+        assert sizer.size == 8
+        # A partial tail batch says nothing about the current size
+        sizer.observe(3, 5.0)
+        assert sizer.size == 8
@@ -0,0 +1,137 @@
+from copy import deepcopy
+from types import SimpleNamespace
+
+import pytest
+from fakeredis import FakeAsyncRedis
+
+from llamasearch import cache
+from llamasearch.cache import LRUCache, SemanticAnswerCache, corpus_versions
+from llamasearch.pipeline import Pipeline
+from llamasearch.settings import config
+
+@pytest.fixture
+def clock(monkeypatch):
+    """Replaces the time module seen by llamasearch.cache with a clock the test moves by hand."""
+    class Clock:
+        now = 1000.0
+
+        def advance(self, seconds: float):
+            self.now += seconds
+
+    fake = Clock()
+    monkeypatch.setattr(cache, "time", SimpleNamespace(time=lambda: fake.now))
+    return fake
+
+class TestLRUCache:
+    def test_evicts_least_recently_used(self):
+        lru = LRUCache(max_entries=2)
+        lru.set("a", 1)
+        lru.set("b", 2)
+        assert lru.get("a") == 1
+        lru.set("c", 3)
+        assert "b" not in lru
+        assert lru.get("a") == 1
+        assert lru.get("c") == 3
+
+    def test_cache_wide_ttl(self, clock):
+        lru = LRUCache(ttl=10)
+        lru.set("a", 1)
+        clock.advance(9)
+        assert lru.get("a") == 1
+        clock.advance(2)
+        assert "a" not in lru
+        assert lru.get("a") is None
+        assert len(lru) == 0
+
+    def test_entry_ttl_overrides_cache_ttl(self, clock):
+        lru = LRUCache(ttl=100)
+        lru.set("short", 1, ttl=5)
+        lru.set("long", 2)
+        clock.advance(6)
+        assert lru.get("short") is None
+        assert lru.get("long") == 2
+
+    def test_no_ttl_never_expires(self, clock):
+        lru = LRUCache()
+        lru.set("a", 1)
+        clock.advance(10 ** 9)
+        assert lru.get("a") == 1
+
+    def test_counts_expired_entries_as_misses(self, clock):
+        lru = LRUCache(ttl=1)
+        lru.set("a", 1)
+        assert lru.get("a") == 1
+        clock.advance(2)
+        assert lru.get("a") is None
+        assert lru.get("missing") is None
+        assert lru.stats() == {"entries": 0, "hits": 1, "misses": 2, "hit_rate": round(1 / 3, 4)}
+
+class TestSemanticAnswerCache:
+    def test_exact_match_normalizes_query(self):
+        answers = SemanticAnswerCache()
+        answers.set("tenant", 1, "What is  RAG?", "answer")
+        assert answers.get_exact("tenant", 1, "what is rag?") == "answer"
+
+    def test_similar_query_above_threshold(self):
+        answers = SemanticAnswerCache(similarity_threshold=0.9)
+        answers.set("tenant", 1, "q", "answer", embedding=[1.0, 0.0])
+        assert answers.get_similar("tenant", 1, [0.99, 0.05]) == "answer"
+        assert answers.get_similar("tenant", 1, [0.0, 1.0]) is None
+
+    def test_isolated_by_tenant_and_version(self):
+        answers = SemanticAnswerCache()
+        answers.set("tenant", 1, "q", "answer", embedding=[1.0, 0.0])
+        assert answers.get_exact("other", 1, "q") is None
+        assert answers.get_exact("tenant", 2, "q") is None
+        assert answers.get_similar("other", 1, [1.0, 0.0]) is None
+        assert answers.get_similar("tenant", 2, [1.0, 0.0]) is None
+
+    def test_expired_entry_does_not_shadow_fresh_one(self, clock):
+        answers = SemanticAnswerCache(ttl=10, similarity_threshold=0.9)
+        answers.set("tenant", 1, "old", "stale answer", embedding=[1.0, 0.0])
+        clock.advance(8)
+        answers.set("tenant", 1, "new", "fresh answer", embedding=[0.95, 0.31])
+        clock.advance(5)
+        # The expired entry is the closer match, the fresh one still qualifies
+        assert answers.get_similar("tenant", 1, [1.0, 0.0]) == "fresh answer"
+        assert len(answers) == 1
+
+    def test_per_tenant_bound(self):
+        answers = SemanticAnswerCache(max_entries_per_tenant=2)
+        for query in ("a", "b", "c"):
+            answers.set("tenant", 1, query, query)
+        answers.set("other", 1, "a", "a")
+        assert answers.get_exact("tenant", 1, "a") is None
+        assert answers.get_exact("tenant", 1, "c") == "c"
+        assert answers.get_exact("other", 1, "a") == "a"
+
+    def test_new_corpus_version_drops_older_entries(self):
+        answers = SemanticAnswerCache()
+        answers.set("tenant", 1, "q", "v1")
+        answers.set("tenant", 2, "q", "v2")
+        assert len(answers) == 1
+        assert answers.get_exact("tenant", 2, "q") == "v2"
+
+class TestCorpusVersions:
+    @pytest.fixture(autouse=True)
+    def redis(self, monkeypatch):
+        monkeypatch.setattr(corpus_versions, "_client", FakeAsyncRedis())
+
+    def pipelines(self, multi_tenancy: bool):
+        pipeline_config = deepcopy(config)
+        pipeline_config.vector_store_config.multi_tenancy = multi_tenancy
+        return Pipeline(pipeline_config, "tenant-1", None), Pipeline(pipeline_config, "tenant-2", None)
+
+    async def test_tenants_of_a_shared_collection_share_a_version(self):
+        first, second = self.pipelines(multi_tenancy=False)
+        before = await corpus_versions.get(second.corpus_id)
+        await first.bump_corpus_version()
+        # The other tenant retrieves from the same points, its cached results are stale too
+        assert await corpus_versions.get(second.corpus_id) == before + 1
+
+    async def test_tenants_of_a_multi_tenant_collection_are_versioned_apart(self):
+        first, second = self.pipelines(multi_tenancy=True)
+        await first.bump_corpus_version()
+        assert await corpus_versions.get(first.corpus_id) == 1
+        assert await corpus_versions.get(second.corpus_id) == 0
+        assert await corpus_versions.get(None) == 0
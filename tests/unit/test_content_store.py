@@ -0,0 +1,80 @@
+import hashlib
+import multiprocessing
+import os
+
+import pytest
+from llama_index.core import Document
+
+from llamasearch.content_store import ContentStore
+
+CONTENT = b"the same report, uploaded by several users"
+DIGEST = hashlib.sha256(CONTENT).hexdigest()
+
+def upload(store: ContentStore, tmp_dir, location) -> str:
+    tmp_path = os.path.join(tmp_dir, f".{os.getpid()}.{os.path.basename(location)}.part")
+    with open(tmp_path, "wb") as f:
+        f.write(CONTENT)
+    store.store(tmp_path, DIGEST, str(location))
+    return str(location)
+
+def upload_and_release(root: str, user_dir: str, rounds: int):
+    store = ContentStore(root)
+    for i in range(rounds):
+        store.release(upload(store, user_dir, os.path.join(user_dir, f"report-{i % 3}.pdf")))
+
+@pytest.fixture
+def store(tmp_path):
+    return ContentStore(str(tmp_path / "blobs"))
+
+@pytest.fixture
+def user_dirs(tmp_path):
+    paths = [tmp_path / "user-1", tmp_path / "user-2"]
+    for path in paths:
+        path.mkdir()
+    return paths
+
+class TestContentStore:
+    def test_identical_uploads_share_one_blob(self, store, user_dirs):
+        first = upload(store, user_dirs[0], user_dirs[0] / "report.pdf")
+        second = upload(store, user_dirs[1], user_dirs[1] / "copy.pdf")
+        blob_path = store.blob_path(DIGEST)
+        assert os.path.samefile(first, blob_path) and os.path.samefile(second, blob_path)
+        assert os.stat(blob_path).st_nlink == 3
+        # The second temporary upload was dropped in favour of the stored blob
+        assert os.listdir(user_dirs[1]) == ["copy.pdf"]
+
+    def test_blob_is_collected_with_its_last_link(self, store, user_dirs):
+        first = upload(store, user_dirs[0], user_dirs[0] / "report.pdf")
+        second = upload(store, user_dirs[1], user_dirs[1] / "report.pdf")
+        store.save_documents(DIGEST, [Document(text="parsed report")])
+        blob_path = store.blob_path(DIGEST)
+
+        assert store.release(first)
+        assert not os.path.exists(first)
+        assert os.path.exists(blob_path)
+        assert store.load_documents(DIGEST, second) is not None
+
+        assert store.release(second)
+        assert not os.path.exists(blob_path)
+        assert store.load_documents(DIGEST, second) is None
+
+    def test_release_leaves_files_outside_the_store_alone(self, store, user_dirs):
+        path = user_dirs[0] / "notes.pdf"
+        path.write_bytes(CONTENT)
+        assert not store.release(str(path))
+        assert path.exists()
+        assert not store.release(str(user_dirs[0] / "missing.pdf"))
+
+    def test_concurrent_processes(self, store, user_dirs):
+        # Separate processes, as with several API workers, only share the blob directory
+        context = multiprocessing.get_context("fork")
+        processes = [
+            context.Process(target=upload_and_release, args=(store.root, str(user_dir), 30))
+            for user_dir in user_dirs * 2
+        ]
+        for process in processes:
+            process.start()
+        for process in processes:
+            process.join(timeout=60)
+        assert [process.exitcode for process in processes] == [0] * len(processes)
+        assert not os.path.exists(store.blob_path(DIGEST))
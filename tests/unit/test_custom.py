@@ -0,0 +1,116 @@
+import json
+
+import httpx
+import pytest
+
+from llamasearch.custom import CustomModel
+
+def ndjson(*chunks) -> bytes:
+    return b"".join(json.dumps(chunk).encode() + b"\n" for chunk in chunks)
+
+class StubServer:
+    """Answers /api/chat with the queued responses in turn and records the requests."""
+    def __init__(self, *responses):
+        self.responses = list(responses)
+        self.requests = []
+
+    def __call__(self, request: httpx.Request) -> httpx.Response:
+        self.requests.append(json.loads(request.content))
+        response = self.responses.pop(0)
+        if isinstance(response, Exception):
+            raise response
+        return response
+
+@pytest.fixture(autouse=True)
+def no_backoff(monkeypatch):
+    monkeypatch.setattr(CustomModel, "_backoff", staticmethod(lambda attempt: 0))
+
+def model_for(server: StubServer, **kwargs) -> CustomModel:
+    return CustomModel(model="judge", base_url="http://ollama", transport=httpx.MockTransport(server), **kwargs)
+
+class TestGenerate:
+    def test_returns_message_content(self):
+        server = StubServer(httpx.Response(200, json={"message": {"content": "yes"}, "done": True}))
+        model = model_for(server)
+        assert model.generate("question", model_params={"temperature": 0}) == "yes"
+        assert server.requests[0]["stream"] is False
+        assert server.requests[0]["model"] == "judge"
+        assert server.requests[0]["temperature"] == 0
+
+    def test_returns_whole_body(self):
+        body = {"message": {"content": "yes"}, "done": True, "eval_count": 3}
+        model = model_for(StubServer(httpx.Response(200, json=body)))
+        assert model.generate("question", only_message=False) == body
+
+    def test_retries_server_errors_and_connection_errors(self):
+        server = StubServer(
+            httpx.Response(503),
+            httpx.ConnectError("connection refused"),
+            httpx.Response(200, json={"message": {"content": "yes"}}),
+        )
+        assert model_for(server, max_retries=3).generate("question") == "yes"
+        assert len(server.requests) == 3
+
+    def test_gives_up_after_max_retries(self):
+        server = StubServer(*[httpx.Response(429) for _ in range(3)])
+        assert model_for(server, max_retries=2).generate("question") is None
+        assert not server.responses
+
+    def test_does_not_retry_client_errors(self):
+        server = StubServer(httpx.Response(400), httpx.Response(200, json={"message": {"content": "yes"}}))
+        assert model_for(server).generate("question") is None
+        assert len(server.requests) == 1
+
+class TestAsyncGenerate:
+    async def test_joins_streamed_content(self):
+        server = StubServer(httpx.Response(200, content=ndjson(
+            {"message": {"content": "Hello"}},
+            {"message": {"content": ", world"}},
+            {"message": {"content": ""}, "done": True},
+        )))
+        model = model_for(server)
+        assert await model.a_generate("question") == "Hello, world"
+        assert server.requests[0]["stream"] is True
+        await model.aclose()
+
+    async def test_retries_before_first_token(self):
+        server = StubServer(
+            httpx.Response(502),
+            httpx.ReadTimeout("timed out"),
+            httpx.Response(200, content=ndjson({"message": {"content": "yes"}, "done": True})),
+        )
+        model = model_for(server, max_retries=3)
+        assert await model.a_generate("question") == "yes"
+        assert len(server.requests) == 3
+        await model.aclose()
+
+    async def test_does_not_retry_after_first_token(self):
+        async def broken_stream():
+            yield ndjson({"message": {"content": "partial"}})
+            raise httpx.ReadError("connection reset")
+
+        server = StubServer(
+            httpx.Response(200, content=broken_stream()),
+            httpx.Response(200, content=ndjson({"message": {"content": "again"}, "done": True})),
+        )
+        model = model_for(server)
+        # A retry would repeat the tokens already yielded
+        streamed = []
+        with pytest.raises(httpx.ReadError):
+            async for content in model.astream("question"):
+                streamed.append(content)
+        assert streamed == ["partial"]
+        assert len(server.requests) == 1
+        await model.aclose()
+
+    async def test_error_chunk_fails_the_request(self):
+        server = StubServer(httpx.Response(200, content=ndjson({"error": "model not found"})))
+        model = model_for(server)
+        assert await model.a_generate("question") is None
+        await model.aclose()
+
+    async def test_empty_stream(self):
+        server = StubServer(httpx.Response(200, content=ndjson({"message": {"content": ""}, "done": True})))
+        model = model_for(server)
+        assert await model.a_generate("question") == "Empty response from LLM"
+        await model.aclose()
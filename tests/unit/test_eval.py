@@ -0,0 +1,134 @@
+import asyncio
+import json
+import os
+from types import SimpleNamespace
+
+import httpx
+import pytest
+from deepeval.test_case import LLMTestCase
+
+from llamasearch.eval import Eval, JudgeCache, is_retryable, metrics_to_evaluate, retry_delay
+
+def status_error(status_code: int, headers=None) -> httpx.HTTPStatusError:
+    request = httpx.Request("POST", "http://judge/v1/chat/completions")
+    response = httpx.Response(status_code, headers=headers, request=request)
+    return httpx.HTTPStatusError(f"HTTP {status_code}", request=request, response=response)
+
+class TestLoadExistingResults:
+    def test_missing_file(self, tmp_path):
+        evaluation = SimpleNamespace(results_file_path=str(tmp_path / "results.jsonl"))
+        assert Eval.load_existing_results(evaluation) == {}
+
+    def test_skips_truncated_last_line(self, tmp_path):
+        path = tmp_path / "results.jsonl"
+        lines = [json.dumps({"id": 1, "metrics": []}), json.dumps({"id": 2, "metrics": []})]
+        # A run killed while appending leaves half a line behind
+        path.write_text("\n".join(lines) + '\n{"id": 3, "metr', encoding="utf-8")
+        evaluation = SimpleNamespace(results_file_path=str(path))
+        assert sorted(Eval.load_existing_results(evaluation)) == [1, 2]
+
+    def test_last_result_of_a_question_wins(self, tmp_path):
+        path = tmp_path / "results.jsonl"
+        lines = [json.dumps({"id": 1, "metrics": []}), json.dumps({"id": 1, "metrics": [{"name": "Faithfulness", "score": 1.0}]})]
+        path.write_text("\n".join(lines) + "\n", encoding="utf-8")
+        evaluation = SimpleNamespace(results_file_path=str(path))
+        assert Eval.load_existing_results(evaluation)[1]["metrics"][0]["score"] == 1.0
+
+class TestPendingMetrics:
+    @pytest.fixture
+    def evaluation(self):
+        return SimpleNamespace(metric_names={metric_name: metric_name.title() for metric_name in metrics_to_evaluate})
+
+    def test_unscored_metrics_are_pending(self, evaluation):
+        result = {"es_answer": "answer", "context": ["context"], "metrics": [
+            {"name": "Faithfulness", "score": 0.8},
+            {"name": "Coherence", "score": None},
+            None,
+        ]}
+        pending = Eval._pending_metrics(evaluation, result)
+        assert "faithfulness" not in pending
+        assert "coherence" in pending
+        assert len(pending) == len(metrics_to_evaluate) - 1
+
+    @pytest.mark.parametrize("result", [
+        {"es_answer": "", "context": ["context"], "metrics": []},
+        {"es_answer": "answer", "context": [], "metrics": []},
+    ])
+    def test_result_without_answer_or_context_is_complete(self, evaluation, result):
+        assert Eval._pending_metrics(evaluation, result) == []
+
+class TestRetry:
+    @pytest.mark.parametrize("error", [
+        status_error(429),
+        status_error(503),
+        asyncio.TimeoutError(),
+        ConnectionResetError(),
+        type("RateLimitError", (Exception,), {})("slow down"),
+        Exception("Rate limit reached for requests"),
+    ])
+    def test_retryable(self, error):
+        assert is_retryable(error)
+
+    @pytest.mark.parametrize("error", [status_error(400), status_error(401), ValueError("bad metric output")])
+    def test_not_retryable(self, error):
+        assert not is_retryable(error)
+
+    def test_uses_retry_after(self):
+        assert retry_delay(status_error(429, {"Retry-After": "7"}), attempt=0) == 7.0
+        assert retry_delay(status_error(429, {"Retry-After": "600"}), attempt=0, cap=60.0) == 60.0
+
+    def test_exponential_backoff_with_jitter(self):
+        for attempt in range(4):
+            delay = retry_delay(status_error(503), attempt, base=2.0, cap=60.0)
+            assert 2.0 * 2 ** attempt * 0.5 <= delay <= 2.0 * 2 ** attempt
+        assert retry_delay(asyncio.TimeoutError(), attempt=10, base=2.0, cap=60.0) <= 60.0
+
+class TestJudgeCache:
+    @pytest.fixture
+    def test_case(self):
+        return LLMTestCase(input="question", actual_output="answer", expected_output="truth", retrieval_context=["a", "b"])
+
+    def test_key_covers_metric_and_test_case(self, test_case):
+        fingerprint = {"metric": "FaithfulnessMetric", "threshold": 0.5, "model": "judge"}
+        key = JudgeCache.key(fingerprint, test_case)
+        assert key == JudgeCache.key(dict(reversed(fingerprint.items())), test_case)
+        assert key != JudgeCache.key({**fingerprint, "threshold": 0.7}, test_case)
+        changed = LLMTestCase(input="question", actual_output="answer", expected_output="truth", retrieval_context=["a", "c"])
+        assert key != JudgeCache.key(fingerprint, changed)
+
+    def test_round_trip(self, tmp_path, test_case):
+        judge_cache = JudgeCache(str(tmp_path))
+        key = JudgeCache.key({"metric": "CoherenceMetric"}, test_case)
+        assert judge_cache.get(key) is None
+        result = {"name": "Coherence", "score": 0.9, "reason": "Réponse cohérente"}
+        judge_cache.set(key, result)
+        assert judge_cache.get(key) == result
+        assert (judge_cache.hits, judge_cache.misses) == (1, 1)
+
+    def test_write_is_atomic(self, tmp_path, test_case, monkeypatch):
+        judge_cache = JudgeCache(str(tmp_path))
+        key = JudgeCache.key({"metric": "CoherenceMetric"}, test_case)
+        judge_cache.set(key, {"score": 0.1})
+        replaced = []
+
+        def failing_replace(src, dst):
+            replaced.append(src)
+            raise OSError("disk full")
+
+        monkeypatch.setattr(os, "replace", failing_replace)
+        with pytest.raises(OSError):
+            judge_cache.set(key, {"score": 0.9})
+        # The new entry is written to a temporary file, the old one is replaced whole or not at all
+        assert replaced[0].endswith(".tmp")
+        assert judge_cache.get(key) == {"score": 0.1}
+
+    def test_unreadable_entry_is_a_miss(self, tmp_path, test_case):
+        judge_cache = JudgeCache(str(tmp_path))
+        key = JudgeCache.key({"metric": "CoherenceMetric"}, test_case)
+        path = tmp_path / key[:2] / f"{key}.json"
+        path.parent.mkdir()
+        path.write_text('{"score": 0.', encoding="utf-8")
+        assert judge_cache.get(key) is None
+        assert judge_cache.misses == 1
+        judge_cache.set(key, {"score": 0.5})
+        assert judge_cache.get(key) == {"score": 0.5}
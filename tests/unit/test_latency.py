@@ -0,0 +1,51 @@
+import pytest
+
+from llamasearch.latency import WINDOW_SLICES, LatencyHistogram
+
+class TestLatencyHistogram:
+    def test_percentiles_within_bucket_accuracy(self):
+        histogram = LatencyHistogram(window_seconds=60)
+        latencies = [(i + 1) / 1000 for i in range(1000)]  # 1ms .. 1s
+        for latency in latencies:
+            histogram.record(latency, now=100.0)
+        window = histogram.snapshot(now=100.0)["window"]
+        assert window["count"] == 1000
+        assert window["mean"] == pytest.approx(sum(latencies) / 1000)
+        assert window["max"] == pytest.approx(1.0)
+        # Log-scale buckets grow by 10%, the midpoint is within ~5% of the true value
+        assert window["p50"] == pytest.approx(0.5, rel=0.06)
+        assert window["p90"] == pytest.approx(0.9, rel=0.06)
+        assert window["p99"] == pytest.approx(0.99, rel=0.06)
+
+    def test_percentile_never_exceeds_max(self):
+        histogram = LatencyHistogram(window_seconds=60)
+        histogram.record(0.25, now=0.0)
+        window = histogram.snapshot(now=0.0)["window"]
+        assert window["p99"] <= 0.25
+
+    def test_window_expires_old_slices(self):
+        histogram = LatencyHistogram(window_seconds=60)
+        histogram.record(1.0, now=0.0)
+        histogram.record(0.01, now=55.0)
+        assert histogram.snapshot(now=59.0)["window"]["count"] == 2
+        window = histogram.snapshot(now=61.0)["window"]
+        assert window["count"] == 1
+        assert window["max"] == pytest.approx(0.01)
+
+    def test_lifetime_counters_outlive_window(self):
+        histogram = LatencyHistogram(window_seconds=60)
+        histogram.record(0.5, now=0.0)
+        histogram.record(0.1, error=True, now=1.0)
+        snapshot = histogram.snapshot(now=1000.0)
+        assert snapshot["window"] == {"seconds": 60, "count": 0}
+        assert snapshot["count"] == 2
+        assert snapshot["errors"] == 1
+        assert snapshot["total_seconds"] == pytest.approx(0.6)
+        assert snapshot["max"] == 0.5
+        assert snapshot["last"] == 0.1
+
+    def test_keeps_at_most_one_window_of_slices(self):
+        histogram = LatencyHistogram(window_seconds=10)
+        for second in range(100):
+            histogram.record(0.01, now=float(second))
+        assert len(histogram._slices) <= WINDOW_SLICES
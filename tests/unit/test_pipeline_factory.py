@@ -0,0 +1,40 @@
+import os
+from copy import deepcopy
+
+import pytest
+
+from llamasearch import pipeline as pipeline_module
+from llamasearch.pipeline import PipelineFactory
+from llamasearch.settings import config
+
+class RecordingPipeline:
+    """Stands in for Pipeline, whose setup needs Qdrant and Redis."""
+    def __init__(self, config, tenant_id, global_embed_model):
+        self.config = config
+        self.tenant_id = tenant_id
+
+    async def setup(self):
+        pass
+
+@pytest.fixture
+def factory(tmp_path, monkeypatch):
+    monkeypatch.setattr(pipeline_module, "Pipeline", RecordingPipeline)
+    factory_config = deepcopy(config)
+    factory_config.application.data_path = str(tmp_path)
+    return PipelineFactory(factory_config, is_api_server=True)
+
+class TestPipelineFactory:
+    async def test_each_user_gets_their_own_upload_directory(self, factory, tmp_path):
+        first = await factory.get_or_create_pipeline_async("user-1", "tenant")
+        second = await factory.create_pipeline_async("user-2", "tenant")
+        upload_dir = tmp_path / config.application.upload_subdir
+        assert first.config.application.data_path == str(upload_dir / "user-1")
+        assert second.config.application.data_path == str(upload_dir / "user-2")
+        assert os.path.isfile(upload_dir / "user-2" / "dummy.csv")
+        # The shared data path is left alone for the next user
+        assert factory.config.application.data_path == str(tmp_path)
+
+    async def test_pipeline_is_created_once_per_user(self, factory):
+        first = await factory.get_or_create_pipeline_async("user-1", "tenant")
+        assert await factory.get_or_create_pipeline_async("user-1", "tenant") is first
+        assert await factory.create_pipeline_async("user-1", "tenant") is first
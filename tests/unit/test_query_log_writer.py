@@ -0,0 +1,64 @@
+import asyncio
+
+import pytest
+from sqlalchemy import event, func, select
+
+from llamasearch.api.db.models import QueryLog
+from llamasearch.api.db.session import Base, sessionmanager
+from llamasearch.api.tasks import QueryLogWriter
+
+@pytest.fixture
+async def database(tmp_path):
+    """A SQLite database for sessionmanager, with a list of the INSERT statements run on it."""
+    sessionmanager.init(f"sqlite+aiosqlite:///{tmp_path / 'query_logs.db'}")
+    async with sessionmanager.engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    inserts = []
+
+    def on_execute(conn, cursor, statement, *args):
+        if statement.lstrip().upper().startswith("INSERT"):
+            inserts.append(statement)
+
+    event.listen(sessionmanager.engine.sync_engine, "before_cursor_execute", on_execute)
+    yield inserts
+    await sessionmanager.close()
+
+async def count_rows() -> int:
+    async with sessionmanager.session_factory() as db:
+        return await db.scalar(select(func.count()).select_from(QueryLog))
+
+class TestQueryLogWriter:
+    async def test_submit_before_start_is_refused(self):
+        writer = QueryLogWriter()
+        assert not writer.submit("uid", "query", [], "answer")
+
+    async def test_writes_in_batches(self, database):
+        writer = QueryLogWriter(batch_size=10, flush_interval=5, max_queue_size=100)
+        writer.start()
+        for i in range(25):
+            assert writer.submit("uid", f"query {i}", [{"file_name": "a.pdf"}], "answer")
+        await writer.stop()
+        assert await count_rows() == 25
+        # Two full batches, the rest written on stop
+        assert len(database) == 3
+
+    async def test_flushes_partial_batch_after_interval(self, database):
+        writer = QueryLogWriter(batch_size=100, flush_interval=0.05, max_queue_size=100)
+        writer.start()
+        writer.submit("uid", "query", [], "answer")
+        await asyncio.sleep(0.5)
+        assert writer.running
+        assert await count_rows() == 1
+        await writer.stop()
+
+    async def test_drops_rows_when_queue_is_full(self, database):
+        writer = QueryLogWriter(batch_size=10, flush_interval=5, max_queue_size=2)
+        writer.start()
+        # The writer task has not run yet, nothing leaves the queue
+        assert writer.submit("uid", "q1", [], "a")
+        assert writer.submit("uid", "q2", [], "a")
+        assert not writer.submit("uid", "q3", [], "a")
+        assert writer.dropped == 1
+        await writer.stop()
+        assert await count_rows() == 2
+        assert not writer.submit("uid", "q4", [], "a")
@@ -0,0 +1,107 @@
+import asyncio
+import json
+from datetime import datetime
+
+import pytest
+
+from llamasearch.api.core.config import settings
+from llamasearch.api.schemas.user import User
+from llamasearch.api.websocket_manager import ConnectionManager, coalesce_tokens
+
+class FakeWebSocket:
+    def __init__(self):
+        self.frames = []
+        self.closed = False
+
+    async def send_text(self, frame: str):
+        self.frames.append(json.loads(frame))
+
+    async def close(self, code: int = 1000):
+        self.closed = True
+
+def make_user(firebase_uid: str = "user-1") -> User:
+    now = datetime.now()
+    return User(id=1, email="user@example.com", firebase_uid=firebase_uid, tenant_id="tenant", created_at=now, updated_at=now)
+
+async def drain():
+    # Lets the writers' sender tasks flush their queues
+    for _ in range(5):
+        await asyncio.sleep(0)
+
+async def token_stream(tokens, delays=None):
+    for token, delay in zip(tokens, delays or [0] * len(tokens)):
+        await asyncio.sleep(delay)
+        yield token
+
+async def collect(chunks):
+    return [chunk async for chunk in chunks]
+
+class TestCoalesceTokens:
+    async def test_first_token_is_sent_alone(self):
+        chunks = await collect(coalesce_tokens(token_stream(["Hello", " wor", "ld"]), max_bytes=1024, max_interval=10))
+        assert chunks == ["Hello", " world"]
+
+    async def test_flushes_at_max_bytes(self):
+        chunks = await collect(coalesce_tokens(token_stream(["a", "bb", "cc", "dd", "e"]), max_bytes=4, max_interval=10))
+        assert chunks == ["a", "bbcc", "dde"]
+
+    async def test_flushes_when_the_stream_stalls(self):
+        tokens = token_stream(["a", "b", "c", "d"], delays=[0, 0, 0, 0.3])
+        chunks = await collect(coalesce_tokens(tokens, max_bytes=1024, max_interval=0.05))
+        # "bc" is sent after max_interval instead of waiting for the slow "d"
+        assert chunks == ["a", "bc", "d"]
+
+@pytest.fixture
+async def manager():
+    manager = ConnectionManager()
+    yield manager
+    for client_id in list(manager.active_connections):
+        await manager.disconnect(client_id)
+
+class TestConnectionManager:
+    async def test_two_sockets_of_one_user_are_kept_apart(self, manager):
+        user = make_user()
+        first_socket, second_socket = FakeWebSocket(), FakeWebSocket()
+        first_id = await manager.connect(first_socket, user)
+        second_id = await manager.connect(second_socket, user)
+        assert first_id != second_id
+        first_writer, second_writer = manager.get_writer(first_id), manager.get_writer(second_id)
+        assert first_writer.websocket is first_socket
+        assert second_writer.websocket is second_socket
+
+        await first_writer.send({"type": "chunk", "content": "first tab"})
+        await second_writer.send({"type": "chunk", "content": "second tab"})
+        await drain()
+        assert first_socket.frames == [{"type": "chunk", "content": "first tab"}]
+        assert second_socket.frames == [{"type": "chunk", "content": "second tab"}]
+
+        # Closing the first tab leaves the second one streaming
+        await manager.disconnect(first_id, first_socket)
+        assert first_writer.closed
+        assert not second_writer.closed
+        assert manager.get_writer(second_id) is second_writer
+        assert manager.get_connection(user.firebase_uid) == (second_socket, user)
+        await manager.disconnect(second_id, second_socket)
+        assert manager.get_connection(user.firebase_uid) is None
+        assert manager.user_connections == {}
+
+    async def test_reauth_on_the_same_socket_keeps_its_writer(self, manager):
+        websocket = FakeWebSocket()
+        client_id = await manager.connect(websocket, make_user())
+        writer = manager.get_writer(client_id)
+        assert await manager.connect(websocket, make_user("user-2"), client_id) == client_id
+        assert manager.get_writer(client_id) is writer
+        assert manager.get_user(client_id).firebase_uid == "user-2"
+        assert list(manager.user_connections) == ["user-2"]
+
+    async def test_query_slots_are_shared_by_the_user_connections(self, manager, monkeypatch):
+        monkeypatch.setattr(settings, "WS_MAX_CONCURRENT_QUERIES", 2)
+        user = make_user()
+        await manager.connect(FakeWebSocket(), user)
+        await manager.connect(FakeWebSocket(), user)
+        assert manager.try_acquire_query_slot(user.firebase_uid)
+        assert manager.try_acquire_query_slot(user.firebase_uid)
+        assert not manager.try_acquire_query_slot(user.firebase_uid)
+        assert manager.try_acquire_query_slot("user-2")
+        manager.release_query_slot(user.firebase_uid)
+        assert manager.try_acquire_query_slot(user.firebase_uid)
@@ -0,0 +1,133 @@
+import asyncio
+import json
+import uuid
+from contextlib import asynccontextmanager
+from datetime import datetime
+from types import SimpleNamespace
+
+import pytest
+
+from llamasearch.api import ws_routes
+from llamasearch.api.schemas.user import User
+from llamasearch.api.websocket_manager import ConnectionManager
+
+class ClientWebSocket:
+    """Feeds the endpoint scripted messages and collects the frames it sends back."""
+    def __init__(self):
+        self.incoming: asyncio.Queue = asyncio.Queue()
+        self.frames: asyncio.Queue = asyncio.Queue()
+
+    async def accept(self):
+        pass
+
+    async def receive(self):
+        return await self.incoming.get()
+
+    async def send_text(self, frame: str):
+        await self.frames.put(json.loads(frame))
+
+    async def send_json(self, payload):
+        await self.frames.put(payload)
+
+    async def close(self, code: int = 1000):
+        pass
+
+    def send_message(self, payload):
+        self.incoming.put_nowait({"type": "websocket.receive", "text": json.dumps(payload)})
+
+    def send_bytes(self, payload: bytes):
+        self.incoming.put_nowait({"type": "websocket.receive", "bytes": payload})
+
+    def disconnect(self):
+        self.incoming.put_nowait({"type": "websocket.disconnect"})
+
+    async def next_frame(self, frame_type: str):
+        while True:
+            frame = await asyncio.wait_for(self.frames.get(), timeout=5)
+            if frame["type"] == frame_type:
+                return frame
+
+@pytest.fixture
+def user():
+    now = datetime.now()
+    return User(id=1, email="user@example.com", firebase_uid="user-1", tenant_id="tenant", created_at=now, updated_at=now)
+
+@pytest.fixture
+def query_started():
+    return asyncio.Event()
+
+@pytest.fixture
+def endpoint(monkeypatch, tmp_path, user, query_started):
+    manager = ConnectionManager()
+    monkeypatch.setattr(ws_routes, "get_websocket_manager", lambda: manager)
+
+    async def handle_auth(websocket, db, data):
+        await websocket.send_json({"type": "authentication_success", "session_id": "session"})
+        return user, "session"
+
+    @asynccontextmanager
+    async def session_factory():
+        yield None
+
+    async def stream_query(**kwargs):
+        async def tokens():
+            yield "first"
+            query_started.set()
+            # Generation only ends by being cancelled
+            await asyncio.Event().wait()
+            yield "never"
+        return {"query": kwargs["query"]}, tokens()
+
+    async def get_or_create_pipeline_async(firebase_uid, tenant_id):
+        return SimpleNamespace(config=SimpleNamespace(application=SimpleNamespace(data_path=str(tmp_path))))
+
+    monkeypatch.setattr(ws_routes, "handle_auth", handle_auth)
+    monkeypatch.setattr(ws_routes, "sessionmanager", SimpleNamespace(session_factory=session_factory))
+    monkeypatch.setattr(ws_routes, "stream_query", stream_query)
+    pipeline_factory = SimpleNamespace(get_or_create_pipeline_async=get_or_create_pipeline_async)
+
+    @asynccontextmanager
+    async def connect():
+        websocket = ClientWebSocket()
+        task = asyncio.create_task(ws_routes.websocket_endpoint(websocket, db=None, pipeline_factory=pipeline_factory))
+        try:
+            websocket.send_message({"type": "auth", "token": "token"})
+            yield websocket
+        finally:
+            websocket.disconnect()
+            await asyncio.wait_for(task, timeout=5)
+
+    return SimpleNamespace(connect=connect, manager=manager)
+
+class TestWebSocketEndpoint:
+    async def test_cancel_by_query_id(self, endpoint, user, query_started):
+        async with endpoint.connect() as websocket:
+            websocket.send_message({"type": "query", "query": "question", "session_id": "session", "query_id": "q1"})
+            assert (await websocket.next_frame("query_accepted"))["query_id"] == "q1"
+            assert (await websocket.next_frame("metadata"))["content"] == {"query": "question", "file_upload": []}
+            await asyncio.wait_for(query_started.wait(), timeout=5)
+            assert endpoint.manager.query_slots == {user.firebase_uid: 1}
+
+            websocket.send_message({"type": "cancel", "query_id": "q1"})
+            assert (await websocket.next_frame("cancelled"))["query_id"] == "q1"
+            websocket.send_message({"type": "cancel", "query_id": "q1"})
+            error = await websocket.next_frame("error")
+            assert error == {"type": "error", "query_id": "q1", "content": {"error": "Unknown query_id"}}
+            # The cancelled query no longer counts towards the user's limit
+            assert endpoint.manager.query_slots == {}
+
+    async def test_rejected_chunk_is_reported_on_its_own_connection(self, endpoint):
+        async with endpoint.connect() as first, endpoint.connect() as second:
+            await first.next_frame("authentication_success")
+            await second.next_frame("authentication_success")
+            first.send_bytes(uuid.uuid4().bytes + bytes(8) + b"data")
+            assert (await first.next_frame("upload_error"))["content"]["error"]
+            assert second.frames.empty()
+
+    async def test_query_before_auth(self, endpoint):
+        websocket = ClientWebSocket()
+        task = asyncio.create_task(ws_routes.websocket_endpoint(websocket, db=None, pipeline_factory=None))
+        websocket.send_message({"type": "query", "query": "question", "session_id": "session"})
+        assert await websocket.next_frame("error") == {"type": "error", "content": "Not authenticated"}
+        websocket.disconnect()
+        await asyncio.wait_for(task, timeout=5)
@@ -0,0 +1,126 @@
+import hashlib
+import os
+import uuid
+
+import pytest
+
+from llamasearch.api.core.config import settings
+from llamasearch.api.ws_uploads import CHUNK_HEADER, ChunkedUploadManager
+from llamasearch.content_store import content_store
+
+def frame(upload_id: str, offset: int, payload: bytes) -> bytes:
+    return CHUNK_HEADER.pack(uuid.UUID(upload_id).bytes, offset) + payload
+
+@pytest.fixture
+def upload_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(content_store, "root", str(tmp_path / "blobs"))
+    path = tmp_path / "user"
+    path.mkdir()
+    return str(path)
+
+@pytest.fixture
+def sent():
+    return []
+
+@pytest.fixture
+def manager(sent):
+    async def send(message):
+        sent.append(message)
+    return ChunkedUploadManager(send=send)
+
+async def upload(manager, upload_dir, filename: str, content: bytes, chunk_size: int = 4) -> str:
+    upload_id = str(uuid.uuid4())
+    await manager.begin({"filename": filename, "size": len(content), "upload_id": upload_id}, upload_dir)
+    for offset in range(0, len(content), chunk_size):
+        await manager.receive_chunk(frame(upload_id, offset, content[offset:offset + chunk_size]))
+    await manager.end({"upload_id": upload_id})
+    return upload_id
+
+class TestChunkedUpload:
+    async def test_upload_is_stored_and_claimable(self, manager, upload_dir, sent):
+        content = b"chunked upload content"
+        upload_id = await upload(manager, upload_dir, "report.pdf", content)
+        assert sent[0] == {"type": "upload_ready", "upload_id": upload_id, "offset": 0}
+        assert sent[-1]["type"] == "upload_complete"
+        result = sent[-1]["result"]
+        assert result["sha256"] == hashlib.sha256(content).hexdigest()
+        with open(os.path.join(upload_dir, "report.pdf"), "rb") as f:
+            assert f.read() == content
+        assert manager.claim([upload_id]) == [result]
+        # A completed upload can only be attached to one query
+        with pytest.raises(ValueError):
+            manager.claim([upload_id])
+
+    async def test_out_of_order_chunk_is_answered_with_offset(self, manager, upload_dir, sent):
+        upload_id = str(uuid.uuid4())
+        await manager.begin({"filename": "a.pdf", "size": 8, "upload_id": upload_id}, upload_dir)
+        await manager.receive_chunk(frame(upload_id, 0, b"abcd"))
+        await manager.receive_chunk(frame(upload_id, 6, b"gh"))
+        assert sent[-1] == {"type": "upload_ready", "upload_id": upload_id, "offset": 4}
+        await manager.receive_chunk(frame(upload_id, 4, b"efgh"))
+        await manager.end({"upload_id": upload_id})
+        with open(os.path.join(upload_dir, "a.pdf"), "rb") as f:
+            assert f.read() == b"abcdefgh"
+
+    async def test_resumes_after_reconnect(self, manager, upload_dir, sent):
+        content = b"0123456789"
+        upload_id = str(uuid.uuid4())
+        begin = {"filename": "a.pdf", "size": len(content), "upload_id": upload_id, "sha256": hashlib.sha256(content).hexdigest()}
+        await manager.begin(begin, upload_dir)
+        await manager.receive_chunk(frame(upload_id, 0, content[:6]))
+        await manager.suspend_all()
+
+        resumed = ChunkedUploadManager(send=manager._send)
+        await resumed.begin(begin, upload_dir)
+        assert sent[-1] == {"type": "upload_ready", "upload_id": upload_id, "offset": 6}
+        await resumed.receive_chunk(frame(upload_id, 6, content[6:]))
+        await resumed.end({"upload_id": upload_id})
+        # The checksum covers the bytes received before the reconnect
+        assert sent[-1]["result"]["sha256"] == begin["sha256"]
+
+    async def test_checksum_mismatch_discards_upload(self, manager, upload_dir):
+        upload_id = str(uuid.uuid4())
+        await manager.begin({"filename": "a.pdf", "size": 4, "upload_id": upload_id, "sha256": "0" * 64}, upload_dir)
+        await manager.receive_chunk(frame(upload_id, 0, b"abcd"))
+        with pytest.raises(ValueError, match="Checksum mismatch"):
+            await manager.end({"upload_id": upload_id})
+        assert upload_id not in manager.active
+        assert not os.path.exists(os.path.join(upload_dir, "a.pdf"))
+
+    async def test_rejects_data_beyond_declared_size(self, manager, upload_dir):
+        upload_id = str(uuid.uuid4())
+        await manager.begin({"filename": "a.pdf", "size": 4, "upload_id": upload_id}, upload_dir)
+        with pytest.raises(ValueError, match="exceeds its declared size"):
+            await manager.receive_chunk(frame(upload_id, 0, b"abcdef"))
+        await manager.suspend_all()
+
+class TestChunkedUploadManagerLimits:
+    async def test_rejects_unsupported_file_type(self, manager, upload_dir):
+        with pytest.raises(ValueError, match="not supported"):
+            await manager.begin({"filename": "script.sh", "size": 4}, upload_dir)
+        assert not manager.active
+
+    async def test_limits_uploads_not_yet_claimed(self, manager, upload_dir, monkeypatch):
+        monkeypatch.setattr(settings, "MAX_FILES", 2)
+        first = await upload(manager, upload_dir, "a.pdf", b"aaaa")
+        second_id = str(uuid.uuid4())
+        second = {"filename": "b.pdf", "size": 4, "upload_id": second_id}
+        await manager.begin(second, upload_dir)
+        with pytest.raises(ValueError, match="exceeds the allowed limit"):
+            await manager.begin({"filename": "c.pdf", "size": 4}, upload_dir)
+        # Resuming an upload already counted is allowed
+        await manager.begin(second, upload_dir)
+        # Claimed uploads no longer count
+        manager.claim([first])
+        await manager.begin({"filename": "c.pdf", "size": 4}, upload_dir)
+        await manager.suspend_all()
+
+    async def test_failed_claim_keeps_every_upload(self, manager, upload_dir):
+        first = await upload(manager, upload_dir, "a.pdf", b"aaaa")
+        second = await upload(manager, upload_dir, "b.pdf", b"bbbb")
+        with pytest.raises(ValueError, match="Unknown or incomplete"):
+            manager.claim([first, str(uuid.uuid4()), second])
+        with pytest.raises(ValueError, match="Duplicate"):
+            manager.claim([first, first])
+        results = manager.claim([first, second])
+        assert [result["filename"] for result in results] == ["a.pdf", "b.pdf"]